@@ -1,10 +1,45 @@
-import MySQLdb
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from datetime import datetime
+import json
 import sys
-from hierarchyBuilder import translateList
+import urlparse
+from hierarchyBuilder import translateList, readConfigFile, extractOptions
+from umlsSource import openDataSource, readRelationFilter
+from nameResolver import openNameResolver
+from closureIndex import loadClosureIndex
+from relationHarvester import harvestCache
+from pathFinder import findShortestPath, fetchAncestorGraph, pruneToRoot, \
+    findAllPaths, findShortestPaths, DEFAULTMAXDEPTH, DEFAULTMAXPATHS
 
 """This program takes two nodes as input and returns the pathway (if it exists)
 between the two nodes. Can be used for identifying problematic loops, etc.
 
+The relationships followed are those kept by the connectionSources,
+connectionTypes and connectionSuppressed configuration attributes, by default
+every RN and CHD relationship of MTH.
+
+The shortest pathway from leafCUI up to rootCUI is found by searching upward
+from leafCUI and downward from rootCUI at once, one level at a time, and is
+given up on past --maxDepth relationships (by default 50).
+
+To diagnose loops, --paths=all lists every pathway from leafCUI up to rootCUI
+that does not go through a CUI twice, up to the --maxPaths shortest pathways
+(by default 100), and --paths=K lists the K shortest of them. Both gather the ancestors of
+leafCUI up to --maxDepth levels once and search them in memory, and print the
+time taken by each step.
+
+With --pairs=FILE, the pathways of every "leafCUI rootCUI" line of FILE (or of
+the standard input when FILE is -) are found through the same connection and
+remembered relationships, and the names of all of them are looked up at once.
+With --serve=PORT, the program keeps the connection, relationships and names
+it looked up and answers HTTP requests such as
+http://localhost:PORT/?leaf=leafCUI&root=rootCUI[&paths=all|K][&maxDepth=N]
+[&maxPaths=N] on the local machine with the pathways in JSON.
+
+When the closureIndexFile configuration attribute names the closure index of
+these relationships compiled by closureIndex.py, pairs whose rootCUI is not
+an ancestor of their leafCUI are answered from it without any query.
+
 This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
 
 Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
@@ -36,100 +71,350 @@ Permission to make commercial use of this software may be obtained by contacting
 """
 
 DEBUGMODE = False
+CONFIGURATIONFILE = 'config.txt'
+SERVICEADDRESS = '127.0.0.1' # Only answer requests from the local machine
+
+
+# Finds the pathways between two CUIs
+def findPathways(leafCUI, rootCUI, dataSource, options, chunkSize, \
+                 logFile=None, closure=None):
+    """Returns (pathways, report), where pathways is the list of pathways
+    from leafCUI up to rootCUI selected by the options and report is a
+    dictionary describing the search. Without a paths option, pathways holds
+    the shortest pathway, if any. Raises ValueError for an invalid option,
+    including a number of paths below 1.
+    When a closure index is given, whether rootCUI is an ancestor of leafCUI
+    is saved in the report as 'connected' and no search is made when it is
+    not.
+
+    Input:
+        leafCUI: The CUI the pathways start from
+        rootCUI: The CUI the pathways lead up to
+        dataSource: Data source answering parentRelations and childRelations
+        options: Dictionary of the paths, maxDepth and maxPaths options
+        chunkSize: Maximum number of CUIs per query
+        logFile: [Optional] File the progress of the search is written to
+        closure: [Optional] closureIndex of the relationships searched
+    """
+
+    maxDepth = int(options.get('maxDepth', DEFAULTMAXDEPTH))
+    maxPaths = int(options.get('maxPaths', DEFAULTMAXPATHS))
+    if options.get('paths', 'all') != 'all':
+        k = int(options['paths'])
+        if k < 1:
+            raise ValueError("paths must be at least 1")
+        k = min(k, maxPaths)
+
+    report = {'maxDepth': maxDepth}
+
+    if closure is not None:
+        report['connected'] = closure.reaches(rootCUI, leafCUI)
+        if not report['connected']:
+            return [], report
+
+    if 'paths' not in options:
+        pathway = findShortestPath(leafCUI, rootCUI, dataSource, maxDepth, \
+                                   chunkSize, logFile)
+        if pathway is None:
+            return [], report
+        return [pathway], report
+
+    # Count the queries reaching the data source, not those answered from
+    # relationships remembered from earlier pairs
+    startTime = datetime.now()
+    queryCount = dataSource.queryCount
+    parents = fetchAncestorGraph(leafCUI, rootCUI, dataSource, maxDepth, \
+                                 chunkSize)[0]
+    report['queries'] = dataSource.queryCount - queryCount
+    report['ancestors'] = len(parents)
+    report['fetchTime'] = datetime.now() - startTime
+
+    startTime = datetime.now()
+    parents = pruneToRoot(parents, rootCUI)
+
+    if options['paths'] == 'all':
+        pathways = findAllPaths(parents, leafCUI, rootCUI, maxPaths)
+        report['truncated'] = len(pathways) == maxPaths
+    else:
+        pathways = findShortestPaths(parents, leafCUI, rootCUI, k)
+        report['truncated'] = False
+
+    report['searched'] = len(parents)
+    report['searchTime'] = datetime.now() - startTime
+
+    return pathways, report
+
+
+# Prints the pathways found between two CUIs
+def printPathways(leafCUI, rootCUI, pathways, report, resolver, numbered):
+    """Prints the translated pathways, preceded by the time taken to find
+    them when they were searched in the ancestors of leafCUI.
+
+    Input:
+        leafCUI: The CUI the pathways start from
+        rootCUI: The CUI the pathways lead up to
+        pathways: List of the pathways found
+        report: Dictionary describing the search, as returned by findPathways
+        resolver: The nameResolver translating the CUIs
+        numbered: True to number the pathways and give their length
+    """
+
+    if 'fetchTime' in report:
+        print "Gathered the parents of {} CUI(s) with {} queries in {}".format(\
+            report['ancestors'], report['queries'], report['fetchTime'])
+        print "Found {} pathway(s) through {} CUI(s) in {}".format(\
+            len(pathways), report['searched'], report['searchTime'])
+
+    if report.get('connected') is False:
+        print "No pathway from {} up to {}: {} is not an ancestor of {}".\
+            format(leafCUI, rootCUI, rootCUI, leafCUI)
+        return
+
+    if not pathways:
+        print "No pathway from {} up to {} within {} relationships".format(\
+            leafCUI, rootCUI, report['maxDepth'])
+        return
 
-# Recursively Searches parents for a specific node. Saves the pathway taken.
-def findNode (current, toFind, path, dbCursor):
+    if report.get('truncated'):
+        print "Stopped at the {} shortest pathways (--maxPaths)".format(\
+            len(pathways))
 
-    if current in path:
+    if not numbered:
+        print "Relationship Pathway FOUND!"
+        print "Pathway: {}".format(translateList(pathways[0], resolver))
         return
 
-    path = list(path)
-    path.append(current)
+    print "Relationship Pathways FOUND!"
+    for number, pathway in enumerate(pathways):
+        print "Pathway {} ({} relationships): {}".format(number + 1, \
+            len(pathway) - 1, translateList(pathway, resolver))
 
 
-    # Base Case
-    if current == toFind:
-        print "Relationship Pathway FOUND!"
-        print "Pathway: {}".format(translateList(path, dbCursor))
-        sys.exit()
+# Reads the pairs of CUIs of a batch
+def readPairs(pairFile):
+    """Returns the list of (leafCUI, rootCUI) pairs of the pair file, one
+    pair per line separated by whitespace. Blank lines and lines starting
+    with '#' are skipped. Raises ValueError for any other line.
 
+    Input:
+        pairFile: The file listing the pairs
+    """
 
-    # Establish string for queries
-    query = "SELECT CUI1, REL, CUI2, SAB from MRREL where CUI2 = '{}'" \
-            "AND SAB = 'MTH' AND (REL = 'RN' OR REL = 'CHD')"
+    pairs = []
 
-    # Establish connection and query MySQL database
-    try:
+    for lineNumber, line in enumerate(pairFile):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
 
-        # Executue a query serach
-        dbCursor.execute (query.format(current))
+        if len(fields) != 2:
+            raise ValueError("line {} does not hold a leafCUI and a " \
+                             "rootCUI".format(lineNumber + 1))
 
-    # Catch errors from MySQL
-    except MySQLdb.Error, e:
-        try:
-            # Prints the error
-            print "MySQL Error [{}]: {} --- while querying {}".format(\
-                                                e.args[0], e.args[1], current)
+        pairs.append((fields[0], fields[1]))
 
-        except IndexError:
-            # Prints the 1 argument error
-            print "MySQL Error: {} --- while querying {}".format(str(e),\
-                                                                current)
+    return pairs
 
-        sys.exit()
 
-    # Fetch results of query
-    rows = dbCursor.fetchall()
+class pathServer(HTTPServer):
+    """HTTP server answering pathway requests from a data source, name
+    resolver and remembered relationships kept between requests. Requests
+    are answered one at a time since the data source is not shared between
+    threads."""
+
+    # Initialize the server with what it answers requests from
+    def __init__(self, address, dataSource, resolver, chunkSize, \
+                 closure=None):
+        """Initialize the server.
 
-    # Process the resulting query
-    for parent in rows:
-        parentCUI = parent[0]
-        rel = parent[1]
-        childCUI = parent[2]
-        sab = parent[3]
+        Input:
+            address: (host, port) the server listens on
+            dataSource: Data source answering parentRelations and
+                        childRelations
+            resolver: The nameResolver translating the CUIs
+            chunkSize: Maximum number of CUIs per query
+            closure: [Optional] closureIndex of the relationships searched
+        """
 
-        if DEBUGMODE:
-            print "Processing parentCUI ({}) and childCUI ({}) with REL ({}) and\
-                SAB ({})".format (parentCUI, childCUI, rel, sab)
+        HTTPServer.__init__(self, address, pathRequestHandler)
+        self.dataSource = dataSource
+        self.resolver = resolver
+        self.chunkSize = chunkSize
+        self.closure = closure
 
-        findNode (parentCUI, toFind, path, dbCursor)
 
+class pathRequestHandler(BaseHTTPRequestHandler):
+    """Answers GET /?leaf=leafCUI&root=rootCUI[&paths=all|K][&maxDepth=N]
+    [&maxPaths=N] with the pathways found in JSON."""
 
+    # Answers a pathway request
+    def do_GET(self):
+        query = dict((name, values[-1]) for name, values in \
+                     urlparse.parse_qs(urlparse.urlparse(self.path).query).items())
+
+        if 'leaf' not in query or 'root' not in query:
+            self.sendJSON(400, {'error': "leaf and root are required"})
+            return
+
+        options = dict((name, query[name]) for name in \
+                       ('paths', 'maxDepth', 'maxPaths') if name in query)
+        dataSource = self.server.dataSource
+        resolver = self.server.resolver
+        startTime = datetime.now()
+        queryCount = dataSource.queryCount
+
+        try:
+            pathways, report = findPathways(query['leaf'], query['root'], \
+                dataSource, options, self.server.chunkSize, \
+                closure=self.server.closure)
+        except ValueError:
+            self.sendJSON(400, {'error': "paths must be all or a number of " \
+                                "at least 1, maxDepth and maxPaths numbers"})
+            return
+
+        resolver.prefetch(cui for pathway in pathways for cui in pathway)
+
+        self.sendJSON(200, {'leaf': query['leaf'], 'root': query['root'], \
+            'pathways': [[{'cui': cui, 'name': resolver.preferredName(cui)} \
+                          for cui in pathway] for pathway in pathways], \
+            'truncated': report.get('truncated', False), \
+            'connected': report.get('connected'), \
+            'queries': dataSource.queryCount - queryCount, \
+            'milliseconds': (datetime.now() - startTime).total_seconds() * \
+                1000})
+
+    # Sends a JSON response
+    def sendJSON(self, status, body):
+        """Sends the body encoded as JSON with the HTTP status.
+
+        Input:
+            status: The HTTP status code
+            body: The object to encode
+        """
+
+        content = json.dumps(body, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+arguments, options = extractOptions(sys.argv)
 
 # Usage Message
-if len(sys.argv) != 3:
-    print "Usage: NodeConnectionFinder.py [leafCUI][rootCUI]"
+if not ((len(arguments) == 3 and 'pairs' not in options and \
+         'serve' not in options) or \
+        (len(arguments) == 1 and ('pairs' in options) != ('serve' in options))):
+    print "Usage: NodeConnectionFinder.py [leafCUI][rootCUI] [--maxDepth=N] " \
+        "[--paths=all|K] [--maxPaths=N]"
+    print "       NodeConnectionFinder.py --pairs=FILE [--maxDepth=N] " \
+        "[--paths=all|K] [--maxPaths=N]"
+    print "       NodeConnectionFinder.py --serve=PORT"
     sys.exit()
-else:
-    leafCUI = sys.argv[1]
-    rootCUI = sys.argv[2]
 
-# Establish a connection and cursor to MySQL UMLS database
-# Connect to MySQL server
+# Open configuration file for accessing the UMLS
 try:
-    cnx = MySQLdb.connect (host='localhost', user='umls1',\
-                           port=3306, passwd='Umls12',\
-                           db='UMLS')
+    configFile = open(CONFIGURATIONFILE,'r')
+except IOError:
+    print "\nIOError when trying to open configuration file ({}).".format(\
+                                                        CONFIGURATIONFILE)
+    sys.exit()
 
-# Catch errors from MySQL
-except MySQLdb.Error, e:
+configs = readConfigFile(configFile)
+configFile.close()
+
+# Open the UMLS data source for the relationships kept by the connection
+# filter (by default MTH), either a connection to the MySQL UMLS database or
+# the RRF files of a UMLS release
+connectionSpec = readRelationFilter(configs, 'connection')
+dataSource = openDataSource(configs, connectionSpec)
+chunkSize = int(configs.get('harvestChunkSize', 500))
+resolver = openNameResolver(dataSource, configs)
+
+# Read the closure index answering whether the CUIs of a pair are connected
+if configs.get('closureIndexFile'):
+    closure = loadClosureIndex(configs['closureIndexFile'], \
+                               configs.get('umlsRelease', ''), connectionSpec)
+else:
+    closure = None
+
+if DEBUGMODE:
+    logFile = sys.stdout
+else:
+    logFile = None
+
+# Find the pathways of a single pair
+if len(arguments) == 3:
     try:
-        # Prints the error
-        print "MySQL Error [{}]: {}".format(e.args[0], e.args[1])
+        pathways, report = findPathways(arguments[1], arguments[2], \
+            dataSource, options, chunkSize, logFile, closure)
+    except ValueError:
+        print "\nError: --paths must be all or a number of at least 1, " \
+            "--maxDepth and --maxPaths numbers."
+        sys.exit()
 
-    except IndexError:
-        # Prints the 1 argument error
-        print "MySQL Error: {}".format(str(e))
+    printPathways(arguments[1], arguments[2], pathways, report, resolver, \
+                  'paths' in options)
 
-    sys.exit()
+# Find the pathways of every pair of a file, remembering the relationships
+# looked up for the next pairs
+elif 'pairs' in options:
+    try:
+        if options['pairs'] == '-':
+            pairs = readPairs(sys.stdin)
+        else:
+            pairFile = open(options['pairs'], 'r')
+            pairs = readPairs(pairFile)
+            pairFile.close()
+    except IOError:
+        print "\nAn Error occurred while trying to open {}".format(\
+            options['pairs'])
+        sys.exit()
+    except ValueError as error:
+        print "\nError in {}: {}".format(options['pairs'], error)
+        sys.exit()
+
+    cache = harvestCache(dataSource)
+    startTime = datetime.now()
+    results = []
 
+    try:
+        for leafCUI, rootCUI in pairs:
+            results.append(findPathways(leafCUI, rootCUI, cache, options, \
+                                        chunkSize, logFile, closure))
+    except ValueError:
+        print "\nError: --paths must be all or a number of at least 1, " \
+            "--maxDepth and --maxPaths numbers."
+        sys.exit()
 
-# Establish cursor for queries
-cur = cnx.cursor()
+    # Look up the names of every pathway at once
+    resolver.prefetch(cui for pathways, report in results \
+                      for pathway in pathways for cui in pathway)
 
-pathway = list()
+    for (leafCUI, rootCUI), (pathways, report) in zip(pairs, results):
+        print "\n{} -> {}:".format(leafCUI, rootCUI)
+        printPathways(leafCUI, rootCUI, pathways, report, resolver, \
+                      'paths' in options)
 
-findNode (leafCUI, rootCUI, pathway, cur)
+    print "\n{} pair(s) answered with {} queries in {}".format(len(pairs), \
+        cache.queryCount, datetime.now() - startTime)
+
+# Answer pathway requests until interrupted
+else:
+    server = pathServer((SERVICEADDRESS, int(options['serve'])), \
+                        harvestCache(dataSource), resolver, chunkSize, closure)
+    print "Answering pathway requests on " \
+        "http://{}:{}/?leaf=leafCUI&root=rootCUI".format(SERVICEADDRESS, \
+        server.server_port)
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print "\nStopped answering pathway requests"
 
-print "Leaf CUI {} not found".format(leafCUI)
+    server.server_close()
 
+resolver.close()
+dataSource.close()
@@ -1,11 +1,18 @@
 #!/usr/bin/python
-import MySQLdb
 import sys
 import os
 from datetime import datetime
-from collections import defaultdict
-from hierarchyBuilder import cleanUpRelations, writeToFile, reduceRedundancy, \
-    areValidArguments, translateDictionary, translateList
+from hierarchyBuilder import writeToFile, areValidArguments, \
+    translateDictionary, translateList, readConfigFile, extractOptions, \
+    buildInitialHierarchy, cleanHierarchy, optionalConfigs, MAXREDUNDANT
+from owlwriter import isOutputFormat, OUTPUTFORMATS
+from relationHarvester import harvestRelations, harvestRelationsBatched, \
+    harvestRelationsConcurrent, harvestCache, HARVESTMODES
+from conceptGraph import conceptGraph
+from buildState import stateSignature, loadBuildState, saveBuildState
+from umlsSource import openDataSource, openConnectionPool
+from nameResolver import openNameResolver
+from runMetrics import runMetrics
 
 """This program develops a hierarchy from a set of input CUIs. Outputs the
 hierarchy in OWL format for use with Protege.
@@ -14,7 +21,7 @@ hierarchy in OWL format for use with Protege.
 as well as a "No Redundancy" Policy for relationships.
 
 Usage: UMLSSubsetBuilder.py [inputFile][topTier][finalHierarchyFile][-x DebugMode]
-                            [logfile][dirtyHierarchyFile]
+                            [logfile][dirtyHierarchyFile][--format=FORMAT]
 
 
 Note: If no commandline arguments are given, then the default files specified in
@@ -34,6 +41,9 @@ Input:
     dirtyHierarchyFile = [Optional] When debug mode is enabled, if provided,
                          the file will be used to save the initial hierarchy
                          before it undergoes the clean-up process.
+    --format   = [Optional] The format of the hierarchy files, overriding the
+                 outputFormat configuration attribute: owl, nt, ttl or jsonl,
+                 optionally followed by .gz for gzip compressed files.
 
 This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
 
@@ -67,10 +77,6 @@ Permission to make commercial use of this software may be obtained by contacting
 
 """
 
-# Maximum times to continue clean-up when # of relations removed is the same
-MAXREDUNDANT = 50
-FILENAME = 'UMLSSubsetBuilder.py' # Current file's name
-LINENUMBER = 10 # Line number of MAXREDUNDANT variables
 CONFIGURATIONFILE = 'config.txt'
 debugOn = False # Debug mode default is off
 
@@ -89,16 +95,22 @@ configAttributes = ['username','password','port','databasename','hostname',\
                'dirtyHierarchyFile']
 configs = dict()
 
+# Commandline options and the configuration attributes they override
+commandlineOptions = {'format': 'outputFormat'}
+
+# Separate the --name=value options from the positional arguments
+sys.argv, options = extractOptions(sys.argv)
+
 # Print usage message
 if len(sys.argv) > 1 and sys.argv[1] == '-u':
-    print "Usage: UMLSSubsetBuilder.py [inputFile][topTier][finalHierarchyFile][-x DebugMode][logfile][dirtyHierarchyFile]"
+    print "Usage: UMLSSubsetBuilder.py [inputFile][topTier][finalHierarchyFile][-x DebugMode][logfile][dirtyHierarchyFile][--format=FORMAT]"
     print "See README or .___doc__ for more informations."
     sys.exit()
 
 # Print usage message if incorrect # of command line args
 if not areValidArguments(sys.argv):
     print "Incorrect # of arguments"
-    print """Usage: UMLSSubsetBuilder.py [inputFile][topTier][finalHierarchyFile][-x DebugMode][logfile][dirtyHierarchyFile]
+    print """Usage: UMLSSubsetBuilder.py [inputFile][topTier][finalHierarchyFile][-x DebugMode][logfile][dirtyHierarchyFile][--format=FORMAT]
     Note: either all 3 parameter files must be provided or none at all.
     For example:
         UMLSSubsetBuilder.py inputFile topTier finalHierarchyFile [-x DebugMode][logfile][dirtyHierarchyFile]
@@ -121,26 +133,11 @@ except NameError:
     sys.exit()
 
 # Progress Message
-sys.stdout.write( "Step 1 of 6: Establishing connection to database . . . ")
+sys.stdout.write( "Step 1 of 6: Establishing connection to data source . . . ")
 
 
 # Set the configuration variables for accesing the UMLS
-for configLine in configFile:
-    # Continue when found a comment beginning with '#'
-    if configLine.startswith('#'):
-        continue
-
-    # Find delimiter
-    delimIndex = configLine.find('=')
-
-    # Continue if no configuration attribute is given on this line, -1
-    # indicates that '=' was not found in the line
-    if delimIndex == -1:
-        continue
-
-    # Add the configuration attribute to the config dictionary
-    configs[configLine[:delimIndex].lstrip(' ')] = configLine[delimIndex+1:].\
-        rstrip('\n')
+configs = readConfigFile(configFile)
 
 # check for the presence of all configuration attributes
 for attribute in configAttributes:
@@ -154,6 +151,33 @@ for attribute in configAttributes:
 
         sys.exit()
 
+# Use the default value of any optional attribute not provided
+for attribute, default in optionalConfigs.items():
+    configs.setdefault(attribute, default)
+
+# Override the configuration attributes given as commandline options
+for name, value in options.items():
+    if name not in commandlineOptions:
+        print "\nError: unknown option --{}.".format(name)
+        sys.exit()
+
+    configs[commandlineOptions[name]] = value
+
+if configs['harvestMode'] not in HARVESTMODES:
+    print "\nError: unknown harvest mode {}. Use one of {}.".format(\
+        configs['harvestMode'], ", ".join(HARVESTMODES))
+    sys.exit()
+
+if not isOutputFormat(configs['outputFormat']):
+    print "\nError: unknown output format {}. Use one of {}, optionally " \
+        "followed by .gz.".format(configs['outputFormat'], \
+                                  ", ".join(sorted(OUTPUTFORMATS)))
+    sys.exit()
+
+# Records the time, memory and work of each step for the metrics file
+metrics = runMetrics(configs['metricsFile'], configs['profileDirectory'])
+metrics.beginStage('connect')
+
 
 # Set Debug mode
 if (len(sys.argv) >= 5 and sys.argv[4] == '-x') or (len(sys.argv) >= 2\
@@ -215,38 +239,36 @@ parentList = [line.rstrip('\n').rstrip().lstrip() for line in inFile] # List of
 leaves = list(parentList) # Keeps track of original input CUIs
 
 
-# Tracks the parent CUIs processed (considered to be children post-processing)
-# Prevents redundant traversals and processing CUIs already handled
-childrenSet = set()
-
-# Initialize Relationship defaultDictionary which will hold all the
+# Initialize Relationship graph which will hold all the
 # inititially gathered relationships for the input CUIs. Will contain
 # much excess information irrelevant to the final hierarchy
-relationsDict = defaultdict(list)
-
+relationsDict = conceptGraph()
 
-# Establish a connection and cursor to MySQL UMLS database
-# Connect to MySQL server
-try:
-    cnx = MySQLdb.connect (host=configs['hostname'], user=configs['username'],\
-                           port=int(configs['port']), passwd=configs['password'],\
-                           db=configs['databasename'])
 
-# Catch errors from MySQL
-except MySQLdb.Error, e:
-    try:
-        # Prints the error
-        print "MySQL Error [{}]: {}".format(e.args[0], e.args[1])
+# Open the UMLS data source, either a connection to the MySQL UMLS database,
+# the RRF files of a UMLS release or a compiled snapshot of the relationships
+dataSource = openDataSource(configs)
 
-    except IndexError:
-        # Prints the 1 argument error
-        print "MySQL Error: {}".format(str(e))
+# Counts the lookups made in the data source when writing the metrics file
+meteredSource = metrics.meter(dataSource)
 
-    sys.exit()
+# Resolves the names of the CUIs for every translation of this run, through
+# the persistent name cache when one is configured
+resolver = openNameResolver(meteredSource, configs)
 
+# When rebuilding incrementally, reuse the parents and names looked up by the
+# previous runs so only the CUIs new to this run are looked up
+if configs['stateFile']:
+    signature = stateSignature(configs)
+    state = loadBuildState(configs['stateFile'], signature)
+    harvestSource = harvestCache(meteredSource, state['parentRows'])
+    resolver.names.update(state['names'])
 
-# Establish cursor for queries
-cur = cnx.cursor()
+    # Input CUIs and top level CUIs of this run, saved for the next one
+    stateLeaves = list(leaves)
+    stateTopTier = list(topTier)
+else:
+    harvestSource = meteredSource
 
 # Tracks time taken
 if debugOn:
@@ -258,6 +280,7 @@ else: # Print finish message
 
 # Progress Message
 sys.stdout.write("Step 2 of 6: Gathering Relationships . . . ")
+metrics.beginStage('harvest')
 
 
 # Check the initial parent queue for top level concepts
@@ -268,87 +291,68 @@ for i in range(len(parentList)):
     # Add the parent to the relationsDict with child being "holder" if parent
     # is a top level concept
     if temp in topTier:
-        relationsDict[temp].append("holder")
+        relationsDict.addHolder(temp)
 
     # Else add the parent back into the parentList
     else:
         parentList.append(temp)
 
 
-# Establish string for queries
-query = "SELECT CUI1, REL, CUI2, SAB, SUPPRESS from MRREL where CUI2 = '{}'" \
-        "AND SAB = 'SNOMEDCT_US' AND (REL = 'RN' OR REL = 'CHD')"
-
-
-# Relationship Harvesting: Loops through the Parent Queue making queries until
-# all relationships relevant to the input CUIs are gathered
-while True:
-    if not parentList:
-        break
+# Relationship Harvesting: Queries the Parent Queue until all relationships
+# relevant to the input CUIs are gathered, either one CUI or one level of CUIs
+# per query
+if configs['harvestMode'] == 'serial':
+    queryCount = harvestRelations(parentList, topTier, relationsDict, \
+                                  harvestSource)
 
-    # Establish connection and query MySQL database
-    try:
-        # Obtain CUI of poppedParent to query parents
-        pParent = parentList.pop(0)
-
-        # Executue a query serach
-        cur.execute (query.format(pParent))
-
-    # Catch errors from MySQL
-    except MySQLdb.Error, e:
-        try:
-            # Prints the error
-            print "MySQL Error [{}]: {} --- while querying {}".format(\
-                                                e.args[0], e.args[1], pParent)
-
-        except IndexError:
-            # Prints the 1 argument error
-            print "MySQL Error: {} --- while querying {}".format(str(e),\
-                                                                pParent)
-
-        sys.exit()
-
-    # Add popped Parent (now a child) to the Child set
-    childrenSet.add(pParent)
+# Or one level of CUIs per round of concurrent queries over a pool of
+# connections. The state file's cache is only used by one connection
+elif configs['harvestMode'] == 'concurrent':
+    if configs['stateFile']:
+        harvestSources = [harvestSource]
+    else:
+        harvestSources = [metrics.meter(source) for source in \
+            openConnectionPool(dataSource, configs, \
+                               int(configs['connectionPoolSize']))]
 
-    # Save Results
-    rows = cur.fetchall()
+    queryCount = harvestRelationsConcurrent(parentList, topTier, \
+            relationsDict, harvestSources, int(configs['harvestChunkSize']))
 
-    # Add current node to misc category if it has no parents
-    if not rows:
-        continue
+    # Close the connections opened for the harvest
+    for source in harvestSources[1:]:
+        source.close()
+else:
+    queryCount = harvestRelationsBatched(parentList, topTier, relationsDict, \
+                                  harvestSource, int(configs['harvestChunkSize']))
 
-    # Process the resulting query
-    for result in rows:
-        # Assign information from query
-        cui1 = result[0]
-        rel = result[1]
-        cui2 = result[2]
-        sab = result[3]
-        suppress = result[4]
+# No more relationships are added to the graph
+relationsDict.compact()
 
-        # Skip inactive relationships (obsolete or due to SAB,TTY or editor)
-        if suppress == 'O' or suppress == 'Y' or suppress == 'E':
-            continue
+# Only the queries passed on to the data source were issued
+if configs['stateFile']:
+    queryCount = harvestSource.queryCount
 
-        # Add the relationship to the Relationship Dictionary
-        if (cui2 not in relationsDict[cui1]):
-            relationsDict[cui1].append(cui2)
+metrics.record('harvestQueries', queryCount)
+metrics.record('inputCuis', len(leaves))
+metrics.record('conceptsWithChildren', len(relationsDict))
 
-        # Check if the parent is a top level concept, if it is continue to the
-        # next iteration
-        if cui1 in topTier:
-            continue
+# Log the number of queries issued while harvesting
+if debugOn:
+    logFile.write("Harvest ({}) issued {} queries\n".format(\
+        configs['harvestMode'], queryCount))
 
-        # Check if the potential parent is already in the forest if it is not
-        # then add it to the parentList
-        if cui1 not in childrenSet:
-            parentList.append(cui1)
+    if configs['stateFile']:
+        logFile.write("Incremental rebuild: {} input CUIs added and {} " \
+            "removed, {} top level CUIs changed, parents of {} CUIs reused\n".\
+            format(len(set(stateLeaves) - set(state['leaves'])), \
+                   len(set(state['leaves']) - set(stateLeaves)), \
+                   len(set(stateTopTier) ^ set(state['topTier'])), \
+                   harvestSource.hits))
 
 # Tracks time taken
 if debugOn:
     currentTime = datetime.now()
-    print "Took: {}".format(currentTime - lastTime)
+    print "Took: {} ({} queries)".format(currentTime - lastTime, queryCount)
     lastTime = currentTime
 else:
     print "Done!"
@@ -356,42 +360,41 @@ else:
 # If debugging is on, translate the dictionaries and lists prematurely
 if debugOn:
     sys.stdout.write( "Step 2.5 of 6: Translating Relations (DEBUG MODE) . . . ")
-    topTier = translateList( topTier, cur )
-    relationsDict = translateDictionary( relationsDict, cur )
-    leaves = translateList( leaves, cur )
+    metrics.beginStage('debugTranslation')
+    topTier = translateList( topTier, resolver )
+    relationsDict = translateDictionary( relationsDict, resolver )
+    leaves = translateList( leaves, resolver )
     currentTime = datetime.now()
     print "Took: {}".format(currentTime - lastTime)
     lastTime = currentTime
 
 # Progress Message
 sys.stdout.write("Step 3 of 6: Building Initial Hierarchy . . . ")
+metrics.beginStage('build')
 
 
-# Will hold the hierarchy while being built and cleaned up
-inProgressHier = defaultdict(list)
-
-# Keeps tracks of loops encountered
-loopsDict = defaultdict(list)
-
-
-# Create the initial hierarchy, by following pathways from topTier CUIs
-for parentCui in topTier:
-    # Save parent and child for traversal
-    if (relationsDict.has_key(parentCui)):
-        childList = relationsDict[parentCui]
-    else:
-        continue
+# Build the hierarchy, finding the loops it contains
+inProgressHier, loopsDict, buildReport = buildInitialHierarchy(relationsDict, \
+                                                topTier, leaves, configs)
 
-    # Add the Top Level Concept to the dictionary
-    inProgressHier[parentCui].append("holder")
-    pathSoFar = [parentCui]
-    cleanUpRelations(pathSoFar, leaves, parentCui, inProgressHier,\
-                      relationsDict, parentCui, childList, loopsDict)
+metrics.record('buildNodesVisited', buildReport['nodesVisited'])
+metrics.record('buildSkippedWalks', buildReport['skippedWalks'])
+if buildReport['loops'] is not None:
+    metrics.record('loops', len(buildReport['loops']))
 
 # Save the initial hierarchy created pre-cleanup if debug is on
 if debugOn:
     initialHierarchy = inProgressHier
 
+    loops = buildReport['loops']
+    if loops is not None:
+        logFile.write("Cycle analysis found {} loop(s) involving {} " \
+            "concepts\n".format(len(loops), sum(len(loop) for loop in loops)))
+
+    if buildReport['skippedWalks'] is not None:
+        logFile.write("Initial clean-up skipped {} already walked subtrees\n".\
+            format(buildReport['skippedWalks']))
+
 # Tracks time taken
 if debugOn:
     currentTime = datetime.now()
@@ -402,72 +405,24 @@ else:
 
 # Progress Message
 sys.stdout.write("Step 4 of 6: Cleaning the Hierarchy . . . ")
+metrics.beginStage('clean')
 
-#Tracks the number of time hierarchy cleanup has yielded the same cleanup count
-redundantCleanUpCount = 1
-previousCleanUp = -1 # Tracks last cleanup count
-
-# Loop through and eliminate the redundant relationships then reclean until
-# of relationships eliminated due to redundancy is 0, automatically ends after
-# MAXREDUNDANT loop iterations yield the same # of redundant relations cleaned
-# up to account for situations causing an endless loop
-while True:
-    redundantRelations = 0
-
-    # Eliminate redundant relationships in the hierarchy
-    for cui in topTier:
-        ancestorList = []
-        redundantRelations += reduceRedundancy(ancestorList, inProgressHier, \
-                        cui, inProgressHier[cui], leaves)
-
-
-    finishedHier = defaultdict(list) # will hold the final hierarchy
-
-    # Re clean up relationships
-    for cui in topTier:
-        # Add holder entry to top tier concept
-        if cui not in finishedHier:
-            finishedHier[cui].append("holder")
-
-        pathSoFar = [cui]
-
-        cleanUpRelations(pathSoFar, leaves, cui, finishedHier, \
-                         inProgressHier, cui, inProgressHier[cui] )
-
-    inProgressHier = finishedHier
-
-
-    # Break when no redudnant relations have been removed
-    if redundantRelations is 0:
-        break
-
-    # Debug message that prints the number of relationships cleaned up due to
-    # redundancy for each loop iteration
-    if debugOn:
-        logFile.write("Clean-up {} yielded {} redundant relations\n".format(\
-            redundantCleanUpCount, redundantRelations))
+# Apply both policies, either in a single bottom-up pass over the hierarchy or
+# by alternating redundancy elimination and rebuilds of the hierarchy
+cleanupReport = dict()
+if debugOn:
+    finishedHier = cleanHierarchy(inProgressHier, topTier, leaves, configs, \
+                                  MAXREDUNDANT, logFile, cleanupReport)
+else:
+    finishedHier = cleanHierarchy(inProgressHier, topTier, leaves, configs, \
+                                  MAXREDUNDANT, report=cleanupReport)
 
-    # Keeps track of number of cleanups yielding the same # of relationships
-    # cleaned up.
-    if redundantRelations == previousCleanUp:
-        redundantCleanUpCount += 1
-    else:
-        redundantRelations = 0 # Reset redundant relations count
-
-    # Break out of the loop after MAXREDUNDANT clean ups yielded same # of
-    # removed relations
-    if redundantCleanUpCount >= MAXREDUNDANT:
-        # Print error message
-        print "Error: Last {} clean-ups of the hierarchy removed the same\
-            number of relationships. This most likely occurred due to a problem\
-            with the inherent relationships in the database being used. There\
-            is a chance that forward progress was being made during\
-            these cleanUps; the limit can be increased by changing the\
-            value of the MAXREDUNDANT variable in {} on line {}.".format(\
-                    MAXREDUNDANT, FILENAME, LINENUMBER)
-
-    # Update previousCleanUp count
-    previousCleanUp = redundantRelations
+metrics.record('cleanupRounds', len(cleanupReport['edgesRemoved']))
+metrics.record('edgesRemovedPerRound', cleanupReport['edgesRemoved'])
+if 'nodesVisited' in cleanupReport:
+    metrics.record('cleanupNodesVisited', cleanupReport['nodesVisited'])
+if 'nodesContracted' in cleanupReport:
+    metrics.record('nodesContracted', cleanupReport['nodesContracted'])
 
 # Tracks time taken
 if debugOn:
@@ -479,14 +434,15 @@ else:
 
 # Progress Message
 sys.stdout.write("Step 5 of 6: Translating Final Hierarchy . . . ")
+metrics.beginStage('translate')
 
 # Translate the finished hierarchy, leaves, and topHierarchy before writing
 # it to the output file
 if not debugOn:
-    translatedLeaves = translateList (leaves, cur)
-    translatedFinishedHier = translateDictionary (finishedHier, cur)
-    translatedTopTier = translateList (topTier, cur)
-    translatedLoopsDict = translateDictionary (loopsDict, cur, True)
+    translatedLeaves = translateList (leaves, resolver)
+    translatedFinishedHier = translateDictionary (finishedHier, resolver)
+    translatedTopTier = translateList (topTier, resolver)
+    translatedLoopsDict = translateDictionary (loopsDict, resolver, True)
 else:
     translatedLeaves = leaves
     translatedFinishedHier = finishedHier
@@ -503,19 +459,20 @@ else:
 
 # Progress Message
 sys.stdout.write("Step 6 of 6: Writing Hierarchy to File . . . ")
+metrics.beginStage('write')
 
 # Write the relations to file in OWL format
 writeToFile (translatedLeaves, translatedFinishedHier,\
              configs['finalHierarchyFile'], translatedTopTier,\
-             translatedLoopsDict)
+             translatedLoopsDict, configs['outputFormat'])
 
 # When debug mode is on, also write the initial hierarchy created before
 # cleanup to a separate file
 if debugOn:
-    translatedInitialHierarchy = translateDictionary(initialHierarchy, cur)
+    translatedInitialHierarchy = translateDictionary(initialHierarchy, resolver)
     writeToFile (translatedLeaves, translatedInitialHierarchy,\
                 configs['dirtyHierarchyFile'], translatedTopTier,\
-                translatedLoopsDict)
+                translatedLoopsDict, configs['outputFormat'])
 
 # Tracks time taken
 if debugOn:
@@ -525,11 +482,13 @@ if debugOn:
 else:
     print "Done!"
 
+metrics.beginStage('finish')
+
 # Log results
 if debugOn:
     logFile.write("\nFinal RelationsDict: {}\n".format(str(relationsDict)))
     logFile.write("\nFinal TranslatedRelationsDict: {}\n".format(\
-            str(translateDictionary(relationsDict, cur))))
+            str(translateDictionary(relationsDict, resolver))))
     logFile.write("\nFinal Leaves: {}\n".format(str(leaves)))
     logFile.write("\nFinal TranslatedLeaves: {}\n".format(\
             str(translatedLeaves)))
@@ -538,6 +497,12 @@ if debugOn:
             str(translatedInitialHierarchy)))
     logFile.write("\nFinal FinishedHier: {}\n".format(\
             str(translatedFinishedHier)))
+
+    # Log the use of the persistent name cache
+    if resolver.cache is not None:
+        logFile.write("\nName cache: {} hits, {} misses\n".format(\
+            resolver.cache.hits, resolver.cache.misses))
+
     logFile.write("\n\nLog finished : {}---------------------------------------------------" \
                 "-----------------------------------------\n".format( \
                     datetime.today()))
@@ -549,11 +514,20 @@ topTierFile.close()
 if debugOn:
     logFile.close()
 
-# Close Cursor
-cur.close()
+# Save the parents and names looked up for the next incremental rebuild
+if configs['stateFile']:
+    saveBuildState(configs['stateFile'], signature, harvestSource.parentRows, \
+                   resolver.names, stateLeaves, stateTopTier)
+
+# Save the name cache and close the data source
+resolver.close()
+dataSource.close()
 
-#Close connection
-cnx.close()
+# Write the metrics of the run
+if resolver.cache is not None:
+    metrics.record('nameCacheHits', resolver.cache.hits)
+    metrics.record('nameCacheMisses', resolver.cache.misses)
+metrics.write()
 
 # Tracks time taken
 if debugOn:
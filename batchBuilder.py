@@ -0,0 +1,338 @@
+#!/usr/bin/python
+"""Builds the hierarchies of several UMLS subsets in one run, sharing the
+relationships and names looked up between them and building, cleaning and
+writing the subsets in parallel across a pool of processes.
+
+Usage: batchBuilder.py manifestFile
+
+Each line of the manifest names a job with four whitespace separated fields:
+
+    name inputCUIFile topLevelTierFile finalHierarchyFile
+
+Blank lines and lines starting with '#' are ignored. The relationships of
+every job are harvested through a single cache, so the ancestors shared by
+several subsets are only looked up once, and the names of every CUI are
+resolved once before the jobs are handed to batchProcesses worker processes.
+Every hierarchy written is the same as the one UMLSSubsetBuilder.py builds
+from the job's files.
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from datetime import datetime
+from multiprocessing import Pool
+import sys
+from conceptGraph import conceptGraph
+from hierarchyBuilder import readConfigFile, buildInitialHierarchy, \
+    cleanHierarchy, translateDictionary, translateList, writeToFile, \
+    optionalConfigs, MAXREDUNDANT
+from nameResolver import nameResolver, openNameResolver
+from owlwriter import isOutputFormat, OUTPUTFORMATS
+from relationHarvester import harvestRelations, harvestRelationsBatched, \
+    harvestRelationsConcurrent, harvestCache, HARVESTMODES
+from umlsSource import openDataSource
+
+# CONSTANT DEFINITIONS
+CONFIGURATIONFILE = 'config.txt'
+JOBFIELDS = ('name', 'inputCUIFile', 'topLevelTierFile', 'finalHierarchyFile')
+STAGES = ('harvest', 'build', 'clean', 'translate', 'write')
+
+# Names and configuration shared by the jobs of a worker process, set once by
+# initWorker
+workerState = dict()
+
+
+# Reads the jobs of a manifest file
+def readManifest(manifestFile):
+    """Returns the list of jobs described by the manifest, each a dictionary
+    keyed by the fields of JOBFIELDS. Exits if a line does not have exactly
+    four fields or a job name is used twice.
+
+    Input:
+        manifestFile: The opened manifest file
+    """
+
+    jobs = []
+    names = set()
+
+    for lineNumber, line in enumerate(manifestFile, 1):
+        line = line.strip()
+
+        # Skip blank lines and comments
+        if not line or line.startswith('#'):
+            continue
+
+        fields = line.split()
+        if len(fields) != len(JOBFIELDS):
+            print "\nError: line {} of the manifest should name a job as: " \
+                "{}".format(lineNumber, " ".join(JOBFIELDS))
+            sys.exit()
+
+        if fields[0] in names:
+            print "\nError: job {} is named twice in the manifest.".format(\
+                fields[0])
+            sys.exit()
+
+        names.add(fields[0])
+        jobs.append(dict(zip(JOBFIELDS, fields)))
+
+    return jobs
+
+
+# Reads the input and top level CUIs of a job
+def readJobFiles(job):
+    """Returns (leaves, topTier), the input CUIs and the set of top level CUIs
+    read from the files of the job. Exits if a file cannot be opened.
+
+    Input:
+        job: Dictionary describing the job
+    """
+
+    cuiLists = []
+    for attribute in ('inputCUIFile', 'topLevelTierFile'):
+        try:
+            cuiFile = open(job[attribute], 'r')
+        except IOError:
+            print "\nAn Error occurred while trying to open {}".format(\
+                                                        job[attribute])
+            sys.exit()
+
+        cuiLists.append([line.rstrip('\n').rstrip().lstrip() \
+                         for line in cuiFile])
+        cuiFile.close()
+
+    return cuiLists[0], set(cuiLists[1])
+
+
+# Gathers the relationships relevant to a job's input CUIs
+def harvestJob(leaves, topTier, dataSource, configs):
+    """Returns the conceptGraph of the relationships gathered for the input
+    CUIs, in the same way as Step 2 of UMLSSubsetBuilder.py.
+
+    Input:
+        leaves: List containing the input CUIs
+        topTier: Set containing the top level CUIs
+        dataSource: The data source used for looking up relationships
+        configs: Dictionary containing the harvestMode and harvestChunkSize
+                 configuration attributes
+    """
+
+    relationsDict = conceptGraph()
+    parentList = []
+
+    # Input CUIs that are top level concepts are only given a holder child
+    for cui in leaves:
+        if cui in topTier:
+            relationsDict.addHolder(cui)
+        else:
+            parentList.append(cui)
+
+    if configs['harvestMode'] == 'serial':
+        harvestRelations(parentList, topTier, relationsDict, dataSource)
+
+    # The shared cache is only used by one connection, like a state file's
+    elif configs['harvestMode'] == 'concurrent':
+        harvestRelationsConcurrent(parentList, topTier, relationsDict, \
+                            [dataSource], int(configs['harvestChunkSize']))
+    else:
+        harvestRelationsBatched(parentList, topTier, relationsDict, \
+                                dataSource, int(configs['harvestChunkSize']))
+
+    relationsDict.compact()
+    return relationsDict
+
+
+# Returns every CUI a job's hierarchy can name
+def jobCuis(job):
+    """Returns the set of the CUIs of the relationships, input CUIs and top
+    level CUIs of a harvested job.
+
+    Input:
+        job: Dictionary describing the harvested job
+    """
+
+    cuis = set(job['leaves'])
+    cuis.update(job['topTier'])
+    for parent, childList in job['relationsDict'].items():
+        cuis.add(parent)
+        cuis.update(child for child in childList if child != 'holder')
+
+    return cuis
+
+
+# Sets up a worker process of the pool
+def initWorker(names, configs):
+    """Saves the names and configuration shared by the jobs of the worker.
+
+    Input:
+        names: Dictionary of the preferred name of every CUI of the batch
+        configs: Dictionary containing the configuration attributes
+    """
+
+    workerState['names'] = names
+    workerState['configs'] = configs
+
+
+# Builds, cleans and writes the hierarchy of a harvested job
+def buildSubset(job):
+    """Builds, cleans, translates and writes the hierarchy of the job in a
+    worker process. Returns (name, timings), where timings holds the time
+    taken by each stage.
+
+    Input:
+        job: Dictionary describing the harvested job
+    """
+
+    configs = workerState['configs']
+    leaves = job['leaves']
+    topTier = job['topTier']
+    timings = dict()
+
+    # Every name was resolved before the jobs were handed out
+    resolver = nameResolver(None)
+    resolver.names = workerState['names']
+
+    lastTime = datetime.now()
+    inProgressHier, loopsDict, buildReport = buildInitialHierarchy(\
+                        job['relationsDict'], topTier, leaves, configs)
+    currentTime = datetime.now()
+    timings['build'] = currentTime - lastTime
+    lastTime = currentTime
+
+    finishedHier = cleanHierarchy(inProgressHier, topTier, leaves, configs, \
+                                  MAXREDUNDANT)
+    currentTime = datetime.now()
+    timings['clean'] = currentTime - lastTime
+    lastTime = currentTime
+
+    translatedLeaves = translateList(leaves, resolver)
+    translatedFinishedHier = translateDictionary(finishedHier, resolver)
+    translatedTopTier = translateList(topTier, resolver)
+    translatedLoopsDict = translateDictionary(loopsDict, resolver, True)
+    currentTime = datetime.now()
+    timings['translate'] = currentTime - lastTime
+    lastTime = currentTime
+
+    writeToFile(translatedLeaves, translatedFinishedHier, \
+                job['finalHierarchyFile'], translatedTopTier, \
+                translatedLoopsDict, configs['outputFormat'])
+    timings['write'] = datetime.now() - lastTime
+
+    return job['name'], timings
+
+
+# Run the batch when run as a script
+if __name__ == '__main__':
+    startTime = datetime.now()
+
+    # Print usage message
+    if len(sys.argv) != 2 or sys.argv[1] == '-u':
+        print "Usage: batchBuilder.py manifestFile"
+        sys.exit()
+
+    try:
+        configFile = open(CONFIGURATIONFILE, 'r')
+    except IOError:
+        print "\nIOError when trying to open configuration file ({}).".format(\
+                                                            CONFIGURATIONFILE)
+        sys.exit()
+
+    configs = readConfigFile(configFile)
+    configFile.close()
+
+    # Use the default value of any optional attribute not provided
+    for attribute, default in optionalConfigs.items():
+        configs.setdefault(attribute, default)
+
+    if configs['harvestMode'] not in HARVESTMODES:
+        print "\nError: unknown harvest mode {}. Use one of {}.".format(\
+            configs['harvestMode'], ", ".join(HARVESTMODES))
+        sys.exit()
+
+    if not isOutputFormat(configs['outputFormat']):
+        print "\nError: unknown output format {}. Use one of {}, optionally " \
+            "followed by .gz.".format(configs['outputFormat'], \
+                                      ", ".join(sorted(OUTPUTFORMATS)))
+        sys.exit()
+
+    try:
+        manifestFile = open(sys.argv[1], 'r')
+    except IOError:
+        print "\nAn Error occurred while trying to open {}".format(sys.argv[1])
+        sys.exit()
+
+    jobs = readManifest(manifestFile)
+    manifestFile.close()
+
+    # Harvest every job through the same cache, so the relationships shared
+    # by several subsets are looked up once
+    sys.stdout.write("Gathering relationships of {} subsets . . . ".format(\
+        len(jobs)))
+    dataSource = openDataSource(configs)
+    harvestSource = harvestCache(dataSource)
+
+    for job in jobs:
+        lastTime = datetime.now()
+        job['leaves'], job['topTier'] = readJobFiles(job)
+        job['relationsDict'] = harvestJob(job['leaves'], job['topTier'], \
+                                          harvestSource, configs)
+        job['harvest'] = datetime.now() - lastTime
+
+    print "Done! ({} queries, parents of {} CUIs reused)".format(\
+        harvestSource.queryCount, harvestSource.hits)
+
+    # Resolve the names of every CUI of the batch at once
+    sys.stdout.write("Resolving names . . . ")
+    resolver = openNameResolver(dataSource, configs)
+    allCuis = set()
+    for job in jobs:
+        allCuis.update(jobCuis(job))
+    resolver.prefetch(allCuis)
+    names = resolver.names
+    resolver.close()
+    dataSource.close()
+    print "Done! ({} CUIs)".format(len(names))
+
+    # Build, clean and write the subsets in parallel, one per CPU unless
+    # batchProcesses is set
+    processes = int(configs['batchProcesses']) or None
+    sys.stdout.write("Building {} subsets . . . \n".format(len(jobs)))
+
+    pool = Pool(processes, initializer=initWorker, initargs=(names, configs))
+    jobsByName = dict((job['name'], job) for job in jobs)
+    for name, timings in pool.imap_unordered(buildSubset, jobs):
+        timings['harvest'] = jobsByName[name]['harvest']
+        print "  {}: {} ({})".format(name, \
+            jobsByName[name]['finalHierarchyFile'], ", ".join(\
+            "{} {}".format(stage, timings[stage]) for stage in STAGES))
+    pool.close()
+    pool.join()
+
+    print "Took {} total for {} subsets".format(datetime.now() - startTime, \
+                                                len(jobs))
+    print "Finished!"
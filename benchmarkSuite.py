@@ -0,0 +1,304 @@
+#!/usr/bin/python
+"""Runs every step of the program on synthetic UMLS releases of several
+sizes and records the time and memory each step takes, so that performance
+regressions can be caught without a licensed UMLS installation.
+
+Usage: benchmarkSuite.py [resultsFile] [--scales=N,N,...] [--baseline=FILE]
+                         [--tolerance=R] [--name=value ...]
+
+For each scale (by default 1000, 10000 and 100000 concepts), a release is
+generated by syntheticUMLS.py in a temporary directory and read through the
+rrf data source. The relationships of its input CUIs are then harvested, the
+hierarchy built, cleaned up, translated and written, each scale in a new
+process so the peak memory reported belongs to that scale alone.
+
+The time, peak memory, queries, rows and other counts of each step are
+printed and, when resultsFile is given, written to it as JSON. With
+--baseline, the results are compared to those of an earlier resultsFile and
+every step of a scale taking more than tolerance (by default 0.5, or 50%)
+more time or memory than in the baseline is reported as a regression, in
+which case the suite exits with status 1. Steps taking less than
+MINIMUMSECONDS are not compared for time.
+
+The other --name=value options set either an option of the generator
+(depth, branching, multiParentRate, cycleRate, inputRate or seed) or an
+optional configuration attribute (for example --cleanupAlgorithm=contraction).
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from multiprocessing import Pool
+import json
+import os
+import shutil
+import sys
+import tempfile
+from batchBuilder import harvestJob
+from hierarchyBuilder import buildInitialHierarchy, cleanHierarchy, \
+    translateDictionary, translateList, writeToFile, extractOptions, \
+    optionalConfigs, MAXREDUNDANT
+from nameResolver import nameResolver
+from runMetrics import runMetrics, meteredSource
+from syntheticUMLS import writeSyntheticUMLS, DEFAULTOPTIONS
+from umlsSource import rrfSource
+
+# CONSTANT DEFINITIONS
+DEFAULTSCALES = (1000, 10000, 100000)
+DEFAULTTOLERANCE = 0.5
+MINIMUMSECONDS = 0.05 # Steps taking less are too short to compare for time
+STEPS = ('load', 'harvest', 'build', 'clean', 'translate', 'write')
+SUITEOPTIONS = ('scales', 'baseline', 'tolerance')
+
+
+# Runs every step of the program on a synthetic release
+def benchmarkScale(task):
+    """Generates a synthetic release with the generator options, runs every
+    step of the program on it with the configuration attributes and returns
+    the metrics of the run, as written by runMetrics.
+
+    Input:
+        task: Tuple holding the generator options and the dictionary of
+              configuration attributes
+    """
+
+    options, configs = task
+    directory = tempfile.mkdtemp()
+
+    try:
+        metrics = runMetrics()
+
+        metrics.beginStage('generate')
+        generated = writeSyntheticUMLS(directory, options)
+        leaves = generated['leaves']
+        topTier = set(generated['topTier'])
+
+        # Read the RRF files before timing the lookups made in them
+        metrics.beginStage('load')
+        rrfData = rrfSource(directory)
+        rrfData.loadRelations()
+        rrfData.loadNames()
+        dataSource = meteredSource(rrfData, metrics)
+
+        metrics.beginStage('harvest')
+        relationsDict = harvestJob(leaves, topTier, dataSource, configs)
+
+        metrics.beginStage('build')
+        inProgressHier, loopsDict, buildReport = buildInitialHierarchy(\
+                                    relationsDict, topTier, leaves, configs)
+
+        metrics.beginStage('clean')
+        cleanupReport = dict()
+        finishedHier = cleanHierarchy(inProgressHier, topTier, leaves, \
+                                      configs, MAXREDUNDANT, \
+                                      report=cleanupReport)
+
+        metrics.beginStage('translate')
+        resolver = nameResolver(dataSource, int(configs['nameChunkSize']))
+        translatedLeaves = translateList(leaves, resolver)
+        translatedFinishedHier = translateDictionary(finishedHier, resolver)
+        translatedTopTier = translateList(topTier, resolver)
+        translatedLoopsDict = translateDictionary(loopsDict, resolver, True)
+
+        metrics.beginStage('write')
+        writeToFile(translatedLeaves, translatedFinishedHier, \
+                    os.path.join(directory, 'hierarchy'), translatedTopTier, \
+                    translatedLoopsDict, configs['outputFormat'])
+
+        metrics.record('concepts', generated['concepts'])
+        metrics.record('relationships', generated['relationships'])
+        metrics.record('inputCuis', len(leaves))
+        metrics.record('conceptsWithChildren', len(relationsDict))
+        metrics.record('loops', len(loopsDict.get('loops', ())))
+        metrics.record('buildNodesVisited', buildReport['nodesVisited'])
+        metrics.record('edgesRemovedPerRound', cleanupReport['edgesRemoved'])
+        metrics.record('hierarchyBytes', os.path.getsize(\
+            os.path.join(directory, 'hierarchy')))
+
+        return metrics.write()
+
+    finally:
+        shutil.rmtree(directory)
+
+
+# Returns the steps of a result by name
+def stepsByName(result):
+    """Returns a dictionary of the stages of the metrics of a run, keyed by
+    stage name.
+
+    Input:
+        result: The metrics of a run, as returned by benchmarkScale
+    """
+
+    return dict((stage['name'], stage) for stage in result['stages'])
+
+
+# Compares results to a baseline
+def findRegressions(results, baseline, tolerance):
+    """Returns the list of messages describing the steps of a scale that
+    took more than tolerance more time or memory than in the baseline. Only
+    the scales found in both are compared.
+
+    Input:
+        results: The results of the suite
+        baseline: The results of an earlier run of the suite
+        tolerance: Part of the baseline a step may exceed it by
+    """
+
+    regressions = []
+    baselineScales = dict((result['values']['concepts'], result) \
+                          for result in baseline['scales'])
+
+    for result in results['scales']:
+        concepts = result['values']['concepts']
+        if concepts not in baselineScales:
+            continue
+
+        steps = stepsByName(result)
+        baselineSteps = stepsByName(baselineScales[concepts])
+
+        for name in STEPS:
+            if name not in steps or name not in baselineSteps:
+                continue
+
+            seconds = steps[name]['seconds']
+            baselineSeconds = baselineSteps[name]['seconds']
+            if seconds >= MINIMUMSECONDS and \
+                    seconds > baselineSeconds * (1 + tolerance):
+                regressions.append("{} concepts: {} took {:.3f}s instead of " \
+                    "{:.3f}s".format(concepts, name, seconds, baselineSeconds))
+
+            memory = steps[name]['peakMemoryBytes']
+            baselineMemory = baselineSteps[name]['peakMemoryBytes']
+            if memory and baselineMemory and \
+                    memory > baselineMemory * (1 + tolerance):
+                regressions.append("{} concepts: {} peaked at {:.1f} MB " \
+                    "instead of {:.1f} MB".format(concepts, name, \
+                    memory / 1048576.0, baselineMemory / 1048576.0))
+
+    return regressions
+
+
+# Prints the metrics of a scale
+def printResult(result):
+    """Prints the time taken and peak memory of each step of a scale.
+
+    Input:
+        result: The metrics of a run, as returned by benchmarkScale
+    """
+
+    values = result['values']
+    print "\n{} concepts, {} relationships, {} input CUIs:".format(\
+        values['concepts'], values['relationships'], values['inputCuis'])
+
+    steps = stepsByName(result)
+    for name in STEPS:
+        memory = steps[name]['peakMemoryBytes']
+        print "    {:<10} {:>9.3f}s {:>10} MB".format(name, \
+            steps[name]['seconds'], "-" if memory is None else \
+            "{:.1f}".format(memory / 1048576.0))
+
+    counters = result['counters']
+    print "    {} queries returning {} rows, {} name lookups, {} clean-up " \
+        "round(s)".format(counters.get('parentQueries', 0), \
+        counters.get('parentRows', 0), counters.get('nameQueries', 0), \
+        len(values['edgesRemovedPerRound']))
+
+
+# Run the suite when run as a script
+if __name__ == '__main__':
+    arguments, options = extractOptions(sys.argv)
+
+    # Print usage message
+    if len(arguments) > 2 or (len(arguments) == 2 and arguments[1] == '-u'):
+        print "Usage: benchmarkSuite.py [resultsFile] [--scales=N,N,...] " \
+            "[--baseline=FILE] [--tolerance=R] [--name=value ...]"
+        sys.exit()
+
+    # Sort the options into those of the suite, the generator and the program
+    generatorOptions = dict()
+    configs = dict(optionalConfigs)
+    for name, value in options.items():
+        if name in DEFAULTOPTIONS and name != 'concepts':
+            generatorOptions[name] = value
+        elif name in optionalConfigs:
+            configs[name] = value
+        elif name not in SUITEOPTIONS:
+            print "\nError: unknown option --{}.".format(name)
+            sys.exit()
+
+    if 'scales' in options:
+        scales = [int(scale) for scale in options['scales'].split(',')]
+    else:
+        scales = DEFAULTSCALES
+
+    tasks = []
+    for concepts in scales:
+        scaleOptions = dict(generatorOptions)
+        scaleOptions['concepts'] = concepts
+        tasks.append((scaleOptions, configs))
+
+    results = {'generatorOptions': generatorOptions, 'configs': configs, \
+               'scales': []}
+
+    # Each scale runs in a process of its own
+    pool = Pool(1, maxtasksperchild=1)
+    for result in pool.imap(benchmarkScale, tasks):
+        printResult(result)
+        results['scales'].append(result)
+    pool.close()
+    pool.join()
+
+    if len(arguments) == 2:
+        resultsFile = open(arguments[1], 'w')
+        json.dump(results, resultsFile, indent=2, sort_keys=True, \
+                  separators=(',', ': '))
+        resultsFile.write("\n")
+        resultsFile.close()
+
+    # Report the steps slower or larger than in the baseline
+    if 'baseline' in options:
+        try:
+            baselineFile = open(options['baseline'], 'r')
+        except IOError:
+            print "\nAn Error occurred while trying to open {}".format(\
+                options['baseline'])
+            sys.exit()
+
+        baseline = json.load(baselineFile)
+        baselineFile.close()
+
+        regressions = findRegressions(results, baseline, \
+            float(options.get('tolerance', DEFAULTTOLERANCE)))
+
+        if regressions:
+            print "\nRegressions against {}:".format(options['baseline'])
+            for regression in regressions:
+                print "    " + regression
+            sys.exit(1)
+
+        print "\nNo regressions against {}.".format(options['baseline'])
@@ -0,0 +1,374 @@
+#!/usr/bin/python
+"""Benchmarks for the performance sensitive parts of the UMLSSubsetBuilder.
+
+Usage: benchmarks.py [classCount]
+
+Runs on synthetic data, so neither a UMLS database nor the RRF files are
+needed:
+    owl:     Writes a hierarchy of classCount classes (default 100000) with
+             the ontology and streamingOntology writers, checks that both
+             files are identical and reports the throughput of each.
+    formats: Writes the same hierarchy in every output format, plain and
+             gzip compressed, and reports the time taken and file size.
+    graph:   Gathers the synthetic relationships of classCount concepts into
+             a defaultdict(list) relationsDict and into a conceptGraph, and
+             reports the time taken and memory held by each, before and
+             after compacting the conceptGraph.
+    leaves:  Builds the initial hierarchy of a tenth, half and all of
+             classCount input CUIs (10000, 50000 and 100000 by default) with
+             the input CUIs in a list and in a frozenset, checks that both
+             hierarchies are identical and reports the time taken by each.
+             The list lookups grow with the square of the number of input
+             CUIs, so the largest default run takes several minutes.
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from owlwriter import ontology, streamingOntology, openOntology, OUTPUTFORMATS
+from conceptGraph import conceptGraph
+from hierarchyBuilder import cleanUpRelations, cleanUpMemo
+from collections import defaultdict
+from datetime import datetime
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+
+# CONSTANT DEFINITIONS
+DEFAULTCLASSCOUNT = 100000
+DEFAULTLEAFCOUNTS = (10000, 50000, 100000) # Scaled to classCount by the script
+IRI = "http://www.semanticweb.org/alexrichardson/ontologies/2014/6/UMLS_subset"
+
+
+# Returns a synthetic hierarchy to write
+def syntheticClasses(classCount):
+    """Returns a list of (child, parentList) pairs describing a hierarchy of
+    classCount classes in cui-name format. Every class after the first has
+    one or two parents among the classes before it.
+
+    Input:
+        classCount: Number of classes in the hierarchy
+    """
+
+    names = ["C{:07d}-Synthetic_concept_{}".format(index, index) \
+             for index in range(classCount)]
+
+    classes = [(names[0], ['none'])]
+    for index in range(1, classCount):
+        parents = [names[index // 2]]
+        if index % 3 == 0:
+            parents.append(names[index // 3])
+        classes.append((names[index], parents))
+
+    return classes
+
+
+# Writes a hierarchy with an ontology writer class
+def writeOntology(writerClass, filename, classes):
+    """Writes the classes to filename the way writeToFile does, using
+    writerClass. Returns the time taken.
+
+    Input:
+        writerClass: Class or function returning an ontology object for a
+                     file name
+        filename: String naming the file to write
+        classes: List of (child, parentList) pairs
+    """
+
+    start = datetime.now()
+
+    hierarchy = writerClass(filename)
+    hierarchy.version("1.0")
+    hierarchy.doctype()
+    hierarchy.rdfHeader(IRI)
+    hierarchy.classes()
+    for child, parentList in classes:
+        hierarchy.addClass(child, parentList)
+    hierarchy.end()
+
+    return datetime.now() - start
+
+
+# Compares the throughput of the OWL writers
+def benchmarkOwlWriters(classCount=DEFAULTCLASSCOUNT):
+    """Writes a synthetic hierarchy with each OWL writer and prints the
+    throughput of each. Exits if the files written differ.
+
+    Input:
+        classCount: [Optional] Number of classes in the hierarchy
+    """
+
+    classes = syntheticClasses(classCount)
+    directory = tempfile.mkdtemp()
+
+    try:
+        filenames = []
+        for writerClass in (ontology, streamingOntology):
+            filename = os.path.join(directory, writerClass.__name__ + ".owl")
+            filenames.append(filename)
+
+            elapsed = max(writeOntology(writerClass, filename, \
+                                        classes).total_seconds(), 1e-6)
+            megabytes = os.path.getsize(filename) / 1048576.0
+            print "{:<20} {:>8.3f}s {:>12.0f} classes/s {:>8.1f} MB/s".format(\
+                writerClass.__name__, elapsed, classCount / elapsed, \
+                megabytes / elapsed)
+
+        if not filecmp.cmp(filenames[0], filenames[1], shallow=False):
+            print "\nError: the OWL writers produced different files."
+            sys.exit(1)
+
+    finally:
+        shutil.rmtree(directory)
+
+
+# Compares the output formats
+def benchmarkOutputFormats(classCount=DEFAULTCLASSCOUNT):
+    """Writes a synthetic hierarchy in every output format, plain and gzip
+    compressed, and prints the time taken and size of each file.
+
+    Input:
+        classCount: [Optional] Number of classes in the hierarchy
+    """
+
+    classes = syntheticClasses(classCount)
+    directory = tempfile.mkdtemp()
+
+    try:
+        for outputFormat in sorted(OUTPUTFORMATS):
+            for name in (outputFormat, outputFormat + '.gz'):
+                filename = os.path.join(directory, "hierarchy." + name)
+                writer = lambda filename: openOntology(filename, name)
+
+                elapsed = max(writeOntology(writer, filename, \
+                                            classes).total_seconds(), 1e-6)
+                print "{:<20} {:>8.3f}s {:>12.0f} classes/s {:>8.1f} MB".\
+                    format(name, elapsed, classCount / elapsed, \
+                           os.path.getsize(filename) / 1048576.0)
+
+    finally:
+        shutil.rmtree(directory)
+
+
+# Yields synthetic MRREL rows
+def syntheticRelations(conceptCount):
+    """Yields the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+    parents of conceptCount concepts, with new CUI strings in every row like
+    the rows returned by a database driver. Every concept after the first has
+    one to three parents among the concepts before it, and every fifth
+    relationship is listed both as RN and CHD.
+
+    Input:
+        conceptCount: Number of concepts
+    """
+
+    for index in range(1, conceptCount):
+        parents = set([index // 2, index // 3, (index * 7) // 10])
+        parents.discard(index)
+
+        for parent in sorted(parents)[:1 + index % 3]:
+            cui1 = "C{:07d}".format(parent)
+            cui2 = "C{:07d}".format(index)
+            yield (cui1, 'CHD', cui2, 'SNOMEDCT_US', 'N')
+
+            if (index + parent) % 5 == 0:
+                yield ("C{:07d}".format(parent), 'RN', "C{:07d}".format(index), \
+                       'SNOMEDCT_US', 'N')
+
+
+# Returns the memory held by an object and everything it references
+def deepSize(root):
+    """Returns the number of bytes held by the object and every object it
+    references through containers, __dict__ and __slots__, counting each
+    object once.
+
+    Input:
+        root: The object to measure
+    """
+
+    seen = set()
+    size = 0
+    stack = [root]
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (basestring, int, long, float, array)):
+            continue
+        else:
+            stack.extend(getattr(obj, name) \
+                         for name in getattr(obj, '__slots__', ()))
+            stack.extend(getattr(obj, '__dict__', {}).values())
+
+    return size
+
+
+# Compares the memory held by a relationsDict and a conceptGraph
+def benchmarkGraphMemory(conceptCount=DEFAULTCLASSCOUNT):
+    """Gathers synthetic relationships into a defaultdict(list) the way
+    the harvest used to and into a conceptGraph, and prints the time taken
+    and memory held by each, the conceptGraph both while relationships are
+    added and once compacted. Exits if they hold different relationships.
+
+    Input:
+        conceptCount: [Optional] Number of concepts
+    """
+
+    start = datetime.now()
+    relationsDict = defaultdict(list)
+    for cui1, rel, cui2, sab, suppress in syntheticRelations(conceptCount):
+        if cui2 not in relationsDict[cui1]:
+            relationsDict[cui1].append(cui2)
+    dictTime = max((datetime.now() - start).total_seconds(), 1e-6)
+
+    start = datetime.now()
+    graph = conceptGraph()
+    for cui1, rel, cui2, sab, suppress in syntheticRelations(conceptCount):
+        graph.addRelation(cui1, cui2)
+    buildingTime = max((datetime.now() - start).total_seconds(), 1e-6)
+    buildingSize = deepSize(graph)
+
+    start = datetime.now()
+    graph.compact()
+    graphTime = buildingTime + (datetime.now() - start).total_seconds()
+
+    if dict(graph.items()) != dict(relationsDict):
+        print "\nError: the relationsDict and conceptGraph differ."
+        sys.exit(1)
+
+    dictSize = deepSize(relationsDict)
+    graphSize = deepSize(graph)
+    for name, elapsed, size in (("defaultdict(list)", dictTime, dictSize), \
+                                ("conceptGraph", buildingTime, buildingSize), \
+                                ("compacted", graphTime, graphSize)):
+        print "{:<20} {:>8.3f}s {:>10.1f} MB".format(name, elapsed, \
+                                                   size / 1048576.0)
+    print "The compacted conceptGraph holds {:.0%} of the memory of the " \
+        "defaultdict".format(float(graphSize) / dictSize)
+
+
+# Walks the relationships from the top level concepts like
+# buildInitialHierarchy, with the leaves and relationships looked up as given
+def walkHierarchy(relationsDict, topTier, leaves, indexed):
+    """Builds the initial hierarchy the way buildInitialHierarchy does,
+    passing leaves on unchanged. Returns the hierarchy and the time taken.
+
+    Input:
+        relationsDict: Dictionary containing the relationships
+        topTier: List containing the top level CUIs
+        leaves: Collection containing the input CUIs
+        indexed: When False, the relationships already added are searched
+                 for in the children lists instead of in the memo.
+    """
+
+    start = datetime.now()
+
+    inProgressHier = defaultdict(list)
+    memo = cleanUpMemo(relationsDict)
+    if not indexed:
+        memo.linked = None
+
+    for cui in topTier:
+        inProgressHier[cui].append("holder")
+        cleanUpRelations([cui], leaves, cui, inProgressHier, relationsDict, \
+                         cui, relationsDict[cui], None, memo)
+
+    return inProgressHier, datetime.now() - start
+
+
+# Compares looking the input CUIs up in a list and in a frozenset
+def benchmarkLeafMembership(leafCounts=DEFAULTLEAFCOUNTS):
+    """Builds the initial hierarchy of synthetic relationships for each
+    number of input CUIs, with the input CUIs in a list and the relationships
+    added searched for in the children lists, then with both indexed by sets,
+    and prints the time taken by each. Exits if the hierarchies differ.
+
+    Input:
+        leafCounts: [Optional] Numbers of input CUIs
+    """
+
+    for leafCount in leafCounts:
+        # The second half of the concepts are the input CUIs
+        relationsDict = defaultdict(list)
+        for cui1, rel, cui2, sab, suppress in syntheticRelations(2 * leafCount):
+            if cui2 not in relationsDict[cui1]:
+                relationsDict[cui1].append(cui2)
+        leaves = ["C{:07d}".format(index) \
+                  for index in range(leafCount, 2 * leafCount)]
+        topTier = ["C0000000"]
+
+        listHier, listTime = walkHierarchy(relationsDict, topTier, leaves, \
+                                           False)
+        setHier, setTime = walkHierarchy(relationsDict, topTier, \
+                                         frozenset(leaves), True)
+
+        if listHier != setHier:
+            print "\nError: the hierarchies built differ."
+            sys.exit(1)
+
+        listTime = max(listTime.total_seconds(), 1e-6)
+        setTime = max(setTime.total_seconds(), 1e-6)
+        print "{:>8} leaves  list {:>9.3f}s  frozenset {:>8.3f}s {:>8.1f}x".\
+            format(leafCount, listTime, setTime, listTime / setTime)
+
+
+# Run the benchmarks when run as a script
+if __name__ == '__main__':
+    # Print usage message
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and not sys.argv[1].isdigit()):
+        print "Usage: benchmarks.py [classCount]"
+        sys.exit()
+
+    if len(sys.argv) == 2:
+        classCount = int(sys.argv[1])
+    else:
+        classCount = DEFAULTCLASSCOUNT
+
+    print "OWL writers ({} classes):".format(classCount)
+    benchmarkOwlWriters(classCount)
+
+    print "\nOutput formats ({} classes):".format(classCount)
+    benchmarkOutputFormats(classCount)
+
+    print "\nRelationship graph ({} concepts):".format(classCount)
+    benchmarkGraphMemory(classCount)
+
+    print "\nInput CUI lookups:"
+    benchmarkLeafMembership([max(1, leafCount * classCount // DEFAULTCLASSCOUNT) \
+                             for leafCount in DEFAULTLEAFCOUNTS])
@@ -0,0 +1,118 @@
+"""Supplementary file containing the functions for saving the state of a run
+that later runs reuse to rebuild a hierarchy incrementally
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+import cPickle
+import os
+
+# CONSTANT DEFINITIONS
+STATEVERSION = 1
+# Configuration attributes naming the UMLS data the state was gathered from
+SIGNATUREATTRIBUTES = ('dataSource', 'umlsRelease', 'hostname', 'port', \
+                       'databasename', 'rrfDirectory', 'snapshotBackend', \
+                       'snapshotDirectory', 'relationSources', \
+                       'relationTypes', 'relationSuppressed')
+
+
+# Returns the signature of the UMLS data used by a run
+def stateSignature(configs):
+    """Returns the values of the configuration attributes naming the UMLS data
+    used by the run. A state is only reused by runs with the same signature.
+
+    Input:
+        configs: Dictionary containing the configuration attributes
+    """
+
+    return tuple(configs.get(attribute, '') \
+                 for attribute in SIGNATUREATTRIBUTES)
+
+
+# Reads the state saved by a previous run
+def loadBuildState(filename, signature):
+    """Returns the state saved in filename as a dictionary holding the
+    parentRows, names, leaves and topTier of the previous run. Returns an
+    empty state if the file does not exist, cannot be read or was saved by a
+    run using other UMLS data.
+
+    Input:
+        filename: String naming the state file
+        signature: Signature of the UMLS data used by the current run
+    """
+
+    emptyState = {'parentRows': dict(), 'names': dict(), 'leaves': [], \
+                  'topTier': []}
+
+    try:
+        stateFile = open(filename, 'rb')
+    except IOError:
+        return emptyState
+
+    try:
+        state = cPickle.load(stateFile)
+    except (cPickle.UnpicklingError, EOFError, AttributeError, ImportError, \
+            IndexError, ValueError):
+        print "\nWarning: {} could not be read, rebuilding from scratch.".\
+            format(filename)
+        return emptyState
+    finally:
+        stateFile.close()
+
+    if state.get('version') != STATEVERSION or \
+            state.get('signature') != signature:
+        return emptyState
+
+    return state
+
+
+# Saves the state of the current run
+def saveBuildState(filename, signature, parentRows, names, leaves, topTier):
+    """Saves the state of the run to filename, replacing the previous state
+    only once the new one is completely written.
+
+    Input:
+        filename: String naming the state file
+        signature: Signature of the UMLS data used by the run
+        parentRows: Dictionary of the MRREL rows describing the parents of
+                    each CUI harvested
+        names: Dictionary of the preferred name of each CUI resolved
+        leaves: List containing the input CUIs
+        topTier: Collection containing the top level CUIs
+    """
+
+    state = {'version': STATEVERSION, 'signature': signature, \
+             'parentRows': parentRows, 'names': names, \
+             'leaves': list(leaves), 'topTier': list(topTier)}
+
+    temporaryName = filename + ".tmp"
+    stateFile = open(temporaryName, 'wb')
+    cPickle.dump(state, stateFile, cPickle.HIGHEST_PROTOCOL)
+    stateFile.close()
+
+    os.rename(temporaryName, filename)
@@ -0,0 +1,454 @@
+#!/usr/bin/python
+"""Compiles the ancestor closure index of the relationships of a UMLS
+vocabulary, answering whether a CUI is an ancestor of another without
+following any relationship.
+
+Usage: closureIndex.py [indexFile]
+
+The relationships searched by NodeConnectionFinder.py, those kept by the
+connectionSources, connectionTypes and connectionSuppressed configuration
+attributes (by default the RN and CHD relationships of MTH), are read from the
+configured data source (from snapshotBackend when dataSource is snapshot) and
+the index is written to indexFile, or by default to
+<umlsRelease>-<connectionSources>.closure in snapshotDirectory.
+NodeConnectionFinder.py reads it when the closureIndexFile configuration
+attribute names it.
+
+The concepts are numbered in the order their strongly connected components
+are completed by a depth-first traversal, every component after the
+components it reaches, so that the concepts a component reaches are held in a
+few ranges of numbers. Each component keeps the sorted, merged ranges of the
+numbers it reaches, itself included, and a CUI is an ancestor of another when
+the number of the second falls in one of the ranges of the first.
+
+Index file layout (little-endian):
+    header:    magic, format version, release, relationship filter signature,
+               node count, component count, range count
+    cuis:      node count fixed width CUIs, sorted
+    numbers:   node count unsigned ints, the component number of each CUI
+    offsets:   component count + 1 unsigned ints, the start of the ranges of
+               each component
+    starts:    range count unsigned ints, the first number of each range
+    ends:      range count unsigned ints, the last number of each range
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from array import array
+from bisect import bisect_right
+import os
+import struct
+import sys
+from graphSnapshot import toLittleEndian, fromLittleEndian, \
+    checkHeaderFields, CUIWIDTH, RELEASEWIDTH, SIGNATUREWIDTH
+
+# CONSTANT DEFINITIONS
+MAGIC = 'UMLSCLOS'
+FORMATVERSION = 2
+HEADER = struct.Struct('<8sI{}s{}sIII'.format(RELEASEWIDTH, SIGNATUREWIDTH))
+CONFIGURATIONFILE = 'config.txt'
+
+
+# Returns the closure index file name for a UMLS release
+def closureIndexFileName(configs, relationSpec):
+    """Returns the name of the closure index file of the configured UMLS
+    release and the source vocabularies of the relationships indexed. Exits
+    if umlsRelease is empty, since every configuration without a release
+    would then share the same index.
+
+    Input:
+        configs: Dictionary containing the snapshotDirectory and umlsRelease
+                 configuration attributes
+        relationSpec: The relationFilter selecting the relationships indexed
+    """
+
+    if not configs.get('umlsRelease'):
+        print "\nError: umlsRelease must be provided in the configuration " \
+            "file to use a closure index."
+        sys.exit()
+
+    return os.path.join(configs['snapshotDirectory'], "{}-{}.closure".\
+                        format(configs['umlsRelease'], relationSpec.name()))
+
+
+# Builds the closure index of a set of relationships
+def buildClosureIndex(relationsDict, roots=None):
+    """Returns the closureIndex of the relationships of relationsDict, or of
+    the part of them reachable from roots. The strongly connected components
+    are found with Tarjan's algorithm, which completes every component after
+    the components it reaches, so the ranges of each component are merged
+    from those of the components it points to as soon as it is completed.
+
+    Input:
+        relationsDict: Dictionary of the children of each CUI, "holder"
+                       children being ignored
+        roots: [Optional] CUIs the traversal starts from. Every CUI with
+               children when not given.
+    """
+
+    if roots is None:
+        roots = relationsDict.keys()
+
+    index = dict() # Order in which each node was reached
+    lowLink = dict() # Lowest index reachable back from each node's subtree
+    components = [] # Nodes of the components not completed yet
+    inComponent = set()
+
+    numbers = dict() # Component number of each node
+    offsets = array('I', [0])
+    starts = array('I')
+    ends = array('I')
+
+    for root in roots:
+        if root in index:
+            continue
+
+        index[root] = lowLink[root] = len(index)
+        components.append(root)
+        inComponent.add(root)
+        stack = [(root, iter(relationsDict.get(root, ())))]
+
+        while stack:
+            node, children = stack[-1]
+
+            # Descend into the next child not reached yet
+            for child in children:
+                if child == 'holder':
+                    continue
+
+                if child not in index:
+                    index[child] = lowLink[child] = len(index)
+                    components.append(child)
+                    inComponent.add(child)
+                    stack.append((child, iter(relationsDict.get(child, ()))))
+                    break
+
+                if child in inComponent:
+                    lowLink[node] = min(lowLink[node], index[child])
+
+            # Every child visited
+            else:
+                stack.pop()
+                if stack:
+                    parent = stack[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+
+                # The node is the first reached of a completed component
+                if lowLink[node] == index[node]:
+                    number = len(offsets) - 1
+                    component = []
+                    while True:
+                        member = components.pop()
+                        inComponent.discard(member)
+                        numbers[member] = number
+                        component.append(member)
+                        if member == node:
+                            break
+
+                    addRanges(relationsDict, component, number, numbers, \
+                              offsets, starts, ends)
+
+    return closureIndex(numbers, offsets, starts, ends)
+
+
+# Adds the ranges of a completed component
+def addRanges(relationsDict, component, number, numbers, offsets, starts, \
+              ends):
+    """Appends the merged ranges of the numbers reached by a component, its
+    own number and the ranges of every component its members point to, to
+    starts and ends and their end to offsets.
+
+    Input:
+        relationsDict: Dictionary of the children of each CUI
+        component: List of the CUIs of the component
+        number: The number of the component
+        numbers: Dictionary of the component number of each completed CUI
+        offsets: Array of the start of the ranges of each component
+        starts: Array of the first number of each range
+        ends: Array of the last number of each range
+    """
+
+    reached = set()
+    for member in component:
+        for child in relationsDict.get(member, ()):
+            if child != 'holder':
+                reached.add(numbers[child])
+    reached.discard(number)
+
+    ranges = [(number, number)]
+    for other in reached:
+        ranges.extend(zip(starts[offsets[other]:offsets[other + 1]], \
+                          ends[offsets[other]:offsets[other + 1]]))
+    ranges.sort()
+
+    # Merge the overlapping and adjacent ranges
+    first, last = ranges[0]
+    for start, end in ranges:
+        if start > last + 1:
+            starts.append(first)
+            ends.append(last)
+            first = start
+        if end > last:
+            last = end
+    starts.append(first)
+    ends.append(last)
+
+    offsets.append(len(starts))
+
+
+class closureIndex:
+    """Ancestor closure of a set of relationships, answering whether a CUI is
+    an ancestor of another with a binary search of the ranges of numbers the
+    first reaches."""
+
+    # Initialize the index with the numbers and ranges of its CUIs
+    def __init__(self, numbers, offsets, starts, ends):
+        """Initialize the closure index.
+
+        Input:
+            numbers: Dictionary of the component number of each CUI
+            offsets: Array of the start of the ranges of each component
+            starts: Array of the first number of each range
+            ends: Array of the last number of each range
+        """
+
+        self.numbers = numbers
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+
+    # Checks whether a CUI is an ancestor of another
+    def reaches(self, ancestor, descendant):
+        """Returns True if descendant can be reached from ancestor by
+        following relationships down, or is ancestor itself.
+
+        Input:
+            ancestor: The CUI the relationships are followed down from
+            descendant: The CUI looked for
+        """
+
+        if ancestor == descendant:
+            return True
+
+        first = self.numbers.get(ancestor)
+        number = self.numbers.get(descendant)
+        if first is None or number is None:
+            return False
+
+        return self.reachesNumber(first, number)
+
+    # Checks whether a component reaches another
+    def reachesNumber(self, first, number):
+        """Returns True if the component numbered number can be reached from
+        the component numbered first.
+
+        Input:
+            first: The number of the component followed down from
+            number: The number of the component looked for
+        """
+
+        # Last range of the first component starting at or before number
+        position = bisect_right(self.starts, number, self.offsets[first], \
+                                self.offsets[first + 1]) - 1
+
+        return position >= self.offsets[first] and \
+            self.ends[position] >= number
+
+    # Returns the number of ranges kept
+    def rangeCount(self):
+        """Returns the number of ranges kept by the index"""
+
+        return len(self.starts)
+
+    # Writes the index to a file
+    def save(self, filename, release, relationSpec):
+        """Writes the index to the closure index file. Exits if the release
+        or the filter does not fit in the header.
+
+        Input:
+            filename: String naming the closure index file to write
+            release: String naming the UMLS release the relationships
+                     belong to
+            relationSpec: The relationFilter selecting the relationships
+        """
+
+        checkHeaderFields(release, relationSpec)
+
+        cuis = sorted(self.numbers)
+        numbers = array('I', [self.numbers[cui] for cui in cuis])
+
+        indexFile = open(filename, 'wb')
+        indexFile.write(HEADER.pack(MAGIC, FORMATVERSION, release, \
+                        relationSpec.signature(), len(cuis), \
+                        len(self.offsets) - 1, len(self.starts)))
+        indexFile.write(''.join(cui.ljust(CUIWIDTH) for cui in cuis))
+        indexFile.write(toLittleEndian(numbers).tostring())
+        indexFile.write(toLittleEndian(self.offsets).tostring())
+        indexFile.write(toLittleEndian(self.starts).tostring())
+        indexFile.write(toLittleEndian(self.ends).tostring())
+        indexFile.close()
+
+
+# Reads a closure index file
+def loadClosureIndex(filename, release, relationSpec):
+    """Returns the closureIndex read from the closure index file. Exits if the
+    index does not belong to the expected UMLS release, no release is
+    expected, or it was not compiled with the expected relationship filter.
+
+    Input:
+        filename: String naming the closure index file
+        release: String naming the expected UMLS release
+        relationSpec: The relationFilter the index was compiled with
+    """
+
+    if not release:
+        print "\nError: umlsRelease must be provided in the configuration " \
+            "file to use a closure index."
+        sys.exit()
+
+    try:
+        indexFile = open(filename, 'rb')
+    except IOError:
+        print "\nAn Error occurred while trying to open {}. Run " \
+            "closureIndex.py to compile it.".format(filename)
+        sys.exit()
+
+    data = indexFile.read()
+    indexFile.close()
+
+    magic, version, indexRelease, signature, nodeCount, componentCount, \
+        rangeCount = HEADER.unpack_from(data, 0)
+
+    if magic != MAGIC or version != FORMATVERSION:
+        print "\nError: {} is not a version {} closure index file.".format(\
+            filename, FORMATVERSION)
+        sys.exit()
+
+    if indexRelease.rstrip('\0') != release:
+        print "\nError: {} was compiled from UMLS release {}, not {}.".format(\
+            filename, indexRelease.rstrip('\0'), release)
+        sys.exit()
+
+    if signature.rstrip('\0') != relationSpec.signature():
+        print "\nError: {} was compiled with the relationship filter {}, " \
+            "not {}.".format(filename, signature.rstrip('\0'), \
+                             relationSpec.signature())
+        sys.exit()
+
+    # Read the tables one after the other
+    position = HEADER.size
+    cuiData = data[position:position + CUIWIDTH * nodeCount]
+    cuis = [cuiData[start:start + CUIWIDTH].rstrip(' ') \
+            for start in range(0, len(cuiData), CUIWIDTH)]
+    position += CUIWIDTH * nodeCount
+
+    tables = []
+    for count in (nodeCount, componentCount + 1, rangeCount, rangeCount):
+        tables.append(fromLittleEndian('I', data[position:position + 4 * count]))
+        position += 4 * count
+    numbers, offsets, starts, ends = tables
+
+    return closureIndex(dict(zip(cuis, numbers)), offsets, starts, ends)
+
+
+# Builds the closure index of the relationships of a data source
+def compileClosureIndex(dataSource, filename, release):
+    """Writes the closure index of every relationship kept by the
+    relationship filter of the data source to the closure index file.
+    Returns the number of (CUIs, components, ranges) written. Exits if the
+    release or the filter does not fit in the header.
+
+    Input:
+        dataSource: The data source to read the relationships from
+        filename: String naming the closure index file to write
+        release: String naming the UMLS release the relationships belong to
+    """
+
+    checkHeaderFields(release, dataSource.relationSpec)
+
+    # Gather each parent's children, without duplicates
+    childSets = dict()
+    for cui1, rel, cui2, sab, suppress in dataSource.allRelations():
+        childSets.setdefault(cui1, set()).add(cui2)
+
+    relationsDict = dict((cui, sorted(children)) \
+                         for cui, children in childSets.items())
+    index = buildClosureIndex(relationsDict, sorted(relationsDict))
+    index.save(filename, release, dataSource.relationSpec)
+
+    return len(index.numbers), len(index.offsets) - 1, index.rangeCount()
+
+
+# Compile the closure index when run as a script
+if __name__ == '__main__':
+    from hierarchyBuilder import readConfigFile
+    from umlsSource import openDataSource, readRelationFilter
+
+    # Print usage message
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] == '-u'):
+        print "Usage: closureIndex.py [indexFile]"
+        sys.exit()
+
+    try:
+        configFile = open(CONFIGURATIONFILE, 'r')
+    except IOError:
+        print "\nIOError when trying to open configuration file ({}).".format(\
+                                                            CONFIGURATIONFILE)
+        sys.exit()
+
+    configs = readConfigFile(configFile)
+    configFile.close()
+    configs.setdefault('snapshotDirectory', '.')
+    configs.setdefault('snapshotBackend', 'mysql')
+    connectionSpec = readRelationFilter(configs, 'connection')
+
+    if not configs.get('umlsRelease'):
+        print "\nError: umlsRelease not provided in configuration file."
+        sys.exit()
+
+    if len(sys.argv) == 2:
+        filename = sys.argv[1]
+    else:
+        filename = closureIndexFileName(configs, connectionSpec)
+
+    sys.stdout.write("Compiling {} {} closure index to {} . . . ".format(\
+        configs['umlsRelease'], connectionSpec.name(), filename))
+
+    # Snapshots only hold the relationships harvested by the subset builder,
+    # so read the snapshot backend instead
+    sourceConfigs = dict(configs)
+    if configs.get('dataSource') == 'snapshot':
+        sourceConfigs['dataSource'] = configs['snapshotBackend']
+    dataSource = openDataSource(sourceConfigs, connectionSpec)
+
+    nodeCount, componentCount, rangeCount = compileClosureIndex(dataSource, \
+        filename, configs['umlsRelease'])
+    dataSource.close()
+
+    print "Done! ({} concepts, {} components, {} ranges)".format(nodeCount, \
+        componentCount, rangeCount)
@@ -0,0 +1,351 @@
+"""Supplementary file containing the conceptGraph class holding the
+relationships gathered from the UMLS in a compact form
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from array import array
+
+
+class conceptGraph(object):
+    """Compact graph of the relationships gathered for a set of input CUIs.
+
+    While relationships are added, CUIs are interned as integer node ids and
+    the relationships are appended to two arrays of parent and child node
+    ids. The input CUIs that are top level concepts are kept in a set of node
+    ids instead of being given a "holder" child.
+
+    compact, which is called by the first lookup, packs the graph into a
+    sorted table of fixed width CUIs and two arrays holding the children of
+    every node one node after another, keeping the first of the
+    relationships added more than once, and drops the per-CUI objects.
+    Adding another relationship unpacks it again.
+
+    The graph reads like the defaultdict(list) relationsDict it replaces, so
+    the functions walking a relationsDict walk it unchanged: graph[cui] lists
+    the children of cui in the order they were added, starting with "holder"
+    for a marked CUI, and only the CUIs with children (or a holder) are keys
+    of the graph."""
+
+    __slots__ = ('ids', 'cuis', 'edgeParents', 'edgeChildren', 'holders', \
+                 'table', 'width', 'offsets', 'childIds')
+
+    # Initialize an empty graph
+    def __init__(self):
+        """Initialize an empty graph"""
+
+        self.ids = dict() # Node id of each CUI
+        self.cuis = [] # CUI of each node id
+        self.edgeParents = array('i') # Parent of each relationship added
+        self.edgeChildren = array('i') # Child of each relationship added
+        self.holders = set() # Node ids given a holder child
+
+        # Packed form, set by compact
+        self.table = None # Sorted CUIs, each padded to width characters
+        self.width = 0
+        self.offsets = None # Start of the children of each node in childIds
+        self.childIds = None # Children of every node, one node after another
+
+    # Returns the node id of a CUI, interning it if needed
+    def nodeId(self, cui):
+        """Returns the node id of the CUI, adding the CUI to the graph if it
+        is not in it yet.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        if self.table is not None:
+            self.unpack()
+
+        node = self.ids.get(cui)
+
+        if node is None:
+            node = len(self.cuis)
+            self.ids[cui] = node
+            self.cuis.append(cui)
+
+        return node
+
+    # Adds a relationship to the graph
+    def addRelation(self, parent, child):
+        """Adds child to the children of parent. A child added more than once
+        is only listed once, where it was first added.
+
+        Input:
+            parent: The CUI of the parent
+            child: The CUI of the child
+        """
+
+        parentId = self.nodeId(parent)
+        childId = self.nodeId(child)
+
+        self.edgeParents.append(parentId)
+        self.edgeChildren.append(childId)
+
+    # Marks a CUI as an input CUI that is a top level concept
+    def addHolder(self, cui):
+        """Gives the CUI a "holder" child, listed before its other children.
+
+        Input:
+            cui: The CUI to mark
+        """
+
+        self.holders.add(self.nodeId(cui))
+
+    # Packs the graph
+    def compact(self):
+        """Packs the CUIs into a sorted table of fixed width CUIs and the
+        children into the offsets and childIds arrays, renumbering the nodes
+        in CUI order and dropping the relationships added more than once and
+        the per-CUI objects."""
+
+        if self.table is not None:
+            return
+
+        # Renumber the nodes in CUI order so they can be binary searched
+        nodeCount = len(self.cuis)
+        order = sorted(range(nodeCount), key=self.cuis.__getitem__)
+        newIds = array('i', [0]) * nodeCount
+        for newId, node in enumerate(order):
+            newIds[node] = newId
+
+        self.width = max([len(cui) for cui in self.cuis] or [0])
+        self.table = ''.join(self.cuis[node].ljust(self.width) \
+                             for node in order)
+        self.ids = self.cuis = None
+
+        # Count the relationships of each node to find where they start
+        starts = array('i', [0]) * (nodeCount + 1)
+        for parent in self.edgeParents:
+            starts[newIds[parent] + 1] += 1
+        for node in range(nodeCount):
+            starts[node + 1] += starts[node]
+
+        # Group the children by parent, in the order they were added
+        grouped = array('i', [0]) * len(self.edgeChildren)
+        nextSlot = starts[:-1]
+        for parent, child in zip(self.edgeParents, self.edgeChildren):
+            parent = newIds[parent]
+            grouped[nextSlot[parent]] = newIds[child]
+            nextSlot[parent] += 1
+        self.edgeParents = self.edgeChildren = None
+
+        # Keep the first of the relationships added more than once
+        self.offsets = array('i', [0])
+        self.childIds = array('i')
+        for node in range(nodeCount):
+            seen = set()
+            for child in grouped[starts[node]:starts[node + 1]]:
+                if child not in seen:
+                    seen.add(child)
+                    self.childIds.append(child)
+            self.offsets.append(len(self.childIds))
+
+        self.holders = set(newIds[node] for node in self.holders)
+
+    # Unpacks a compacted graph so relationships can be added again
+    def unpack(self):
+        """Rebuilds the per-CUI objects and relationship arrays replaced by
+        compact"""
+
+        nodeCount = len(self.offsets) - 1
+        self.cuis = [self.cuiAt(node) for node in range(nodeCount)]
+        self.ids = dict((cui, node) for node, cui in enumerate(self.cuis))
+        self.edgeParents = array('i')
+        self.edgeChildren = self.childIds
+
+        for node in range(nodeCount):
+            self.edgeParents.extend([node] * \
+                (self.offsets[node + 1] - self.offsets[node]))
+
+        self.table = self.offsets = self.childIds = None
+        self.width = 0
+
+    # Returns the CUI of a node id
+    def cuiAt(self, node):
+        """Returns the CUI of a node id of the packed graph.
+
+        Input:
+            node: The node id
+        """
+
+        start = node * self.width
+        return self.table[start:start + self.width].rstrip(' ')
+
+    # Returns the node id of a CUI in the graph
+    def findNode(self, cui):
+        """Returns the node id of the CUI in the packed graph, or None if it
+        is not in the graph. Packs the graph if needed.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        self.compact()
+
+        # Binary search the sorted table
+        key = cui.ljust(self.width)
+        width = self.width
+        low, high = 0, len(self.offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.table[middle * width:(middle + 1) * width] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(self.offsets) - 1 and \
+                self.table[low * width:(low + 1) * width] == key:
+            return low
+
+        return None
+
+    # Checks whether a node is a key of the graph
+    def isKey(self, node):
+        """Returns True if the node of the packed graph has children or a
+        holder.
+
+        Input:
+            node: The node id
+        """
+
+        return node in self.holders or \
+            self.offsets[node] != self.offsets[node + 1]
+
+    # Returns the children of a CUI
+    def __getitem__(self, cui):
+        """Returns the list of the children of the CUI, starting with "holder"
+        when it is marked. Unlike a defaultdict, looking up a CUI without
+        children does not add it to the graph.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        node = self.findNode(cui)
+        if node is None:
+            return []
+
+        if node in self.holders:
+            childList = ["holder"]
+        else:
+            childList = []
+
+        for index in range(self.offsets[node], self.offsets[node + 1]):
+            childList.append(self.cuiAt(self.childIds[index]))
+
+        return childList
+
+    # Returns the children of a CUI, or a default if it is not a key
+    def get(self, cui, default=None):
+        """Returns graph[cui] if the CUI is a key of the graph, default
+        otherwise.
+
+        Input:
+            cui: The CUI to look up
+            default: [Optional] Value returned for CUIs without children.
+        """
+
+        if cui in self:
+            return self[cui]
+
+        return default
+
+    # Checks whether a CUI has children
+    def __contains__(self, cui):
+        """Returns True if the CUI has children or a holder.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        node = self.findNode(cui)
+
+        return node is not None and self.isKey(node)
+
+    # Same as "cui in graph"
+    def has_key(self, cui):
+        """Returns True if the CUI has children or a holder.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        return cui in self
+
+    # Returns the CUIs with children
+    def keys(self):
+        """Returns the list of the CUIs with children or a holder"""
+
+        return [cui for cui in self]
+
+    # Returns the children of every CUI
+    def items(self):
+        """Returns the list of (cui, children) pairs of the CUIs with
+        children or a holder."""
+
+        return [(cui, self[cui]) for cui in self]
+
+    # Iterates over the CUIs with children
+    def __iter__(self):
+        """Iterates over the CUIs with children or a holder, in CUI order.
+        Packs the graph if needed."""
+
+        self.compact()
+
+        for node in range(len(self.offsets) - 1):
+            if self.isKey(node):
+                yield self.cuiAt(node)
+
+    # Returns the number of CUIs with children
+    def __len__(self):
+        """Returns the number of CUIs with children or a holder"""
+
+        return sum(1 for cui in self)
+
+    # Returns the state saved when pickling the graph
+    def __getstate__(self):
+        """Returns the packed form of the graph, packing it if needed"""
+
+        self.compact()
+        return self.table, self.width, self.offsets, self.childIds, \
+            self.holders
+
+    # Restores a pickled graph
+    def __setstate__(self, state):
+        """Restores the graph from the state returned by __getstate__.
+
+        Input:
+            state: Tuple holding the packed form of the graph
+        """
+
+        self.table, self.width, self.offsets, self.childIds, self.holders = \
+            state
+        self.ids = self.cuis = None
+        self.edgeParents = self.edgeChildren = None
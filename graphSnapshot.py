@@ -0,0 +1,472 @@
+#!/usr/bin/python
+"""Compiles the filtered child->parent relationship graph of a UMLS release
+into a compact snapshot file that can be memory-mapped by later runs instead
+of querying MRREL.
+
+Usage: graphSnapshot.py [snapshotFile]
+
+The relationships kept by the relationSources, relationTypes and
+relationSuppressed configuration attributes are read from the data source
+named by the snapshotBackend configuration attribute (mysql or rrf) and
+written to snapshotFile, or by default to the file named after the umlsRelease
+and relationSources configuration attributes in snapshotDirectory.
+
+Snapshot file layout (little-endian):
+    header:  magic, format version, release, relationship filter signature,
+             node count, edge count
+    cuis:    node count fixed width CUIs, sorted (a CUI's node id is its index)
+    offsets: node count + 1 unsigned ints, the CSR row offsets of each node
+    parents: edge count unsigned ints, the node ids of each node's parents
+    rels:    edge count bytes, the REL of each edge as an index of the
+             relationship types of the filter
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+# CONSTANT DEFINITIONS
+MAGIC = 'UMLSSNAP'
+FORMATVERSION = 2
+CUIWIDTH = 8 # Width of a CUI in the cuis table
+RELEASEWIDTH = 16 # Longest UMLS release stored in a header
+SIGNATUREWIDTH = 128 # Longest relationship filter signature stored in a header
+HEADER = struct.Struct('<8sI{}s{}sII'.format(RELEASEWIDTH, SIGNATUREWIDTH))
+CONFIGURATIONFILE = 'config.txt'
+
+
+# Returns the snapshot file name for a UMLS release
+def snapshotFileName(configs, relationSpec):
+    """Returns the name of the snapshot file for the configured UMLS release
+    and the source vocabularies of the relationships. Exits if umlsRelease is
+    empty, since every configuration without a release would then share the
+    same snapshot.
+
+    Input:
+        configs: Dictionary containing the snapshotDirectory and umlsRelease
+                 configuration attributes
+        relationSpec: The relationFilter selecting the relationships
+    """
+
+    if not configs.get('umlsRelease'):
+        print "\nError: umlsRelease must be provided in the configuration " \
+            "file to use a snapshot."
+        sys.exit()
+
+    return os.path.join(configs['snapshotDirectory'], "{}-{}.snap".format(\
+                        configs['umlsRelease'], relationSpec.name()))
+
+
+# Checks that the release and filter signature fit in a file header
+def checkHeaderFields(release, relationSpec):
+    """Exits if the UMLS release or the signature of the relationship filter
+    is too long to be stored whole in the header of a snapshot or closure
+    index file, since struct.pack would silently cut it and files compiled
+    for different configurations could then be taken for each other.
+
+    Input:
+        release: String naming the UMLS release
+        relationSpec: The relationFilter selecting the relationships
+    """
+
+    if len(release) > RELEASEWIDTH:
+        print "\nError: umlsRelease {} is longer than {} characters.".format(\
+            release, RELEASEWIDTH)
+        sys.exit()
+
+    if len(relationSpec.signature()) > SIGNATUREWIDTH:
+        print "\nError: the relationship filter {} is longer than {} " \
+            "characters.".format(relationSpec.signature(), SIGNATUREWIDTH)
+        sys.exit()
+
+
+# Writes the filtered relationships of a data source to a snapshot file
+def compileSnapshot(dataSource, filename, release):
+    """Writes the relationships kept by the relationship filter of the data
+    source to a snapshot file. Returns the number of (node, edge) written.
+    Exits if the release or the filter does not fit in the header.
+
+    Input:
+        dataSource: The data source to read the relationships from
+        filename: String naming the snapshot file to write
+        release: String naming the UMLS release the relationships belong to
+    """
+
+    relationSpec = dataSource.relationSpec
+    checkHeaderFields(release, relationSpec)
+
+    # Gather each child's parents, in row order and without duplicates
+    parentsDict = defaultdict(list)
+    for cui1, rel, cui2, sab, suppress in dataSource.allRelations():
+        parents = parentsDict[cui2]
+        if not any(parent == cui1 for parent, parentRel in parents):
+            parents.append((cui1, rel))
+
+    # Intern the CUIs as the indexes of the sorted cui table
+    cuiSet = set(parentsDict)
+    for parents in parentsDict.values():
+        cuiSet.update(parent for parent, parentRel in parents)
+    cuis = sorted(cuiSet)
+    ids = dict((cui, index) for index, cui in enumerate(cuis))
+
+    # Build the CSR adjacency arrays
+    offsets = array('I', [0])
+    parentIds = array('I')
+    rels = array('B')
+    for cui in cuis:
+        for parent, rel in parentsDict.get(cui, ()):
+            parentIds.append(ids[parent])
+            rels.append(relationSpec.relationTypes.index(rel))
+        offsets.append(len(parentIds))
+
+    snapshotFile = open(filename, 'wb')
+    snapshotFile.write(HEADER.pack(MAGIC, FORMATVERSION, release, \
+                        relationSpec.signature(), len(cuis), len(parentIds)))
+    snapshotFile.write(''.join(cui.ljust(CUIWIDTH) for cui in cuis))
+    snapshotFile.write(toLittleEndian(offsets).tostring())
+    snapshotFile.write(toLittleEndian(parentIds).tostring())
+    snapshotFile.write(rels.tostring())
+    snapshotFile.close()
+
+    return len(cuis), len(parentIds)
+
+
+# Returns a copy of an array in little-endian byte order
+def toLittleEndian(values):
+    """Returns the array in little-endian byte order.
+
+    Input:
+        values: The array to convert
+    """
+
+    if sys.byteorder == 'little':
+        return values
+
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+
+# Reads an array stored in little-endian byte order
+def fromLittleEndian(typecode, data):
+    """Returns the array of the values stored in data in little-endian byte
+    order.
+
+    Input:
+        typecode: The typecode of the array
+        data: String holding the values
+    """
+
+    values = array(typecode)
+    values.fromstring(data)
+
+    if sys.byteorder != 'little':
+        values.byteswap()
+
+    return values
+
+
+class snapshotSource:
+    """Data source answering relationship lookups from a memory-mapped
+    snapshot file and name lookups from another data source. The SAB and
+    SUPPRESS values of the relationships are not stored in the snapshot, so
+    the rows hold the name of the relationship filter and 'N' instead."""
+
+    # Initialize the data source by mapping the snapshot file
+    def __init__(self, filename, release, nameSource, relationSpec):
+        """Memory-maps the snapshot file. Exits if the snapshot does not
+        belong to the expected UMLS release or was not compiled with the
+        expected relationship filter.
+
+        Input:
+            filename: String naming the snapshot file
+            release: String naming the expected UMLS release
+            nameSource: The data source used for looking up names
+            relationSpec: The relationFilter the snapshot was compiled with
+        """
+
+        try:
+            self.snapshotFile = open(filename, 'rb')
+        except IOError:
+            print "\nAn Error occurred while trying to open {}. Run " \
+                "graphSnapshot.py to compile it.".format(filename)
+            sys.exit()
+
+        self.map = mmap.mmap(self.snapshotFile.fileno(), 0, \
+                             access=mmap.ACCESS_READ)
+
+        magic, version, snapRelease, signature, self.nodeCount, \
+            self.edgeCount = HEADER.unpack_from(self.map, 0)
+        self.release = snapRelease.rstrip('\0')
+        self.relationSpec = relationSpec
+        self.sab = relationSpec.name()
+
+        if magic != MAGIC or version != FORMATVERSION:
+            print "\nError: {} is not a version {} snapshot file.".format(\
+                filename, FORMATVERSION)
+            sys.exit()
+
+        if self.release != release:
+            print "\nError: {} was compiled from UMLS release {}, not {}.".\
+                format(filename, self.release, release)
+            sys.exit()
+
+        if signature.rstrip('\0') != relationSpec.signature():
+            print "\nError: {} was compiled with the relationship filter {}, " \
+                "not {}.".format(filename, signature.rstrip('\0'), \
+                                 relationSpec.signature())
+            sys.exit()
+
+        # Offsets of the tables in the file
+        self.cuiBase = HEADER.size
+        self.offsetBase = self.cuiBase + CUIWIDTH * self.nodeCount
+        self.parentBase = self.offsetBase + 4 * (self.nodeCount + 1)
+        self.relBase = self.parentBase + 4 * self.edgeCount
+
+        self.nameSource = nameSource
+        self.queryCount = 0
+
+        # Children of each node, built the first time children are looked up
+        self.childOffsets = None
+        self.childIds = None
+        self.childRels = None
+
+    # Returns the relationships to the parents of the CUIs
+    def parentRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        parents of the CUIs in cuiList. Only the relationships kept by the
+        relationship filter are stored in the snapshot.
+
+        Input:
+            cuiList: List of the child CUIs
+        """
+
+        self.queryCount += 1
+        relationTypes = self.relationSpec.relationTypes
+
+        rows = []
+        for cui in cuiList:
+            node = self.nodeId(cui)
+            if node is None:
+                continue
+
+            start, end = struct.unpack_from('<II', self.map, \
+                                            self.offsetBase + 4 * node)
+            parents = struct.unpack_from('<{}I'.format(end - start), \
+                                         self.map, self.parentBase + 4 * start)
+            for index, parent in enumerate(parents):
+                rel = relationTypes[ord(self.map[self.relBase + start + index])]
+                rows.append((self.cuiAt(parent), rel, cui, self.sab, 'N'))
+
+        return rows
+
+    # Returns the relationships to the children of the CUIs
+    def childRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        children of the CUIs in cuiList, in CUI order for each CUI.
+
+        Input:
+            cuiList: List of the parent CUIs
+        """
+
+        if self.childOffsets is None:
+            self.loadChildren()
+
+        self.queryCount += 1
+        relationTypes = self.relationSpec.relationTypes
+
+        rows = []
+        for cui in cuiList:
+            node = self.nodeId(cui)
+            if node is None:
+                continue
+
+            for index in range(self.childOffsets[node], \
+                               self.childOffsets[node + 1]):
+                rows.append((cui, relationTypes[self.childRels[index]], \
+                             self.cuiAt(self.childIds[index]), self.sab, 'N'))
+
+        return rows
+
+    # Builds the children of every node from the parents in the snapshot
+    def loadChildren(self):
+        """Inverts the parents table of the snapshot into the childOffsets,
+        childIds and childRels arrays, holding the children of every node one
+        node after another."""
+
+        offsets = fromLittleEndian('I', \
+                                   self.map[self.offsetBase:self.parentBase])
+        parents = fromLittleEndian('I', self.map[self.parentBase:self.relBase])
+        rels = array('B', self.map[self.relBase:self.relBase + self.edgeCount])
+
+        # Count the children of each node to find where they start
+        childOffsets = array('I', [0]) * (self.nodeCount + 1)
+        for parent in parents:
+            childOffsets[parent + 1] += 1
+        for node in range(self.nodeCount):
+            childOffsets[node + 1] += childOffsets[node]
+
+        # Place each child after the previous children of its parent
+        childIds = array('I', [0]) * self.edgeCount
+        childRels = array('B', [0]) * self.edgeCount
+        nextSlot = childOffsets[:-1]
+        for child in range(self.nodeCount):
+            for index in range(offsets[child], offsets[child + 1]):
+                parent = parents[index]
+                childIds[nextSlot[parent]] = child
+                childRels[nextSlot[parent]] = rels[index]
+                nextSlot[parent] += 1
+
+        self.childOffsets = childOffsets
+        self.childIds = childIds
+        self.childRels = childRels
+
+    # Returns the names of a CUI
+    def conceptNames(self, cui):
+        """Returns the (TTY, STR, LAT) rows describing the names of a CUI,
+        looked up in the name source.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        return self.nameSource.conceptNames(cui)
+
+    # Returns the names of a chunk of CUIs
+    def conceptNamesBatch(self, cuiList):
+        """Returns a dictionary holding the (TTY, STR, LAT) rows describing
+        the names of each CUI in cuiList, looked up in the name source.
+
+        Input:
+            cuiList: List of the CUIs to look up
+        """
+
+        return self.nameSource.conceptNamesBatch(cuiList)
+
+    # Returns the node id of a CUI
+    def nodeId(self, cui):
+        """Returns the node id of the CUI by binary searching the sorted cui
+        table, or None if the CUI is not in the snapshot.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        key = cui.ljust(CUIWIDTH)
+        index = bisect_left(cuiTable(self), key)
+
+        if index < self.nodeCount and self.cuiAt(index) == cui:
+            return index
+
+        return None
+
+    # Returns the CUI of a node id
+    def cuiAt(self, node):
+        """Returns the CUI of the node id.
+
+        Input:
+            node: The node id
+        """
+
+        start = self.cuiBase + CUIWIDTH * node
+        return self.map[start:start + CUIWIDTH].rstrip(' ')
+
+    # Unmap the snapshot file and close the name source
+    def close(self):
+        """Unmaps the snapshot file and closes the name source"""
+
+        self.map.close()
+        self.snapshotFile.close()
+        self.nameSource.close()
+
+
+class cuiTable:
+    """Sequence view of the cui table of a snapshot, used for binary
+    searching it in place"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.nodeCount
+
+    def __getitem__(self, index):
+        start = self.snapshot.cuiBase + CUIWIDTH * index
+        return self.snapshot.map[start:start + CUIWIDTH]
+
+
+# Compile the snapshot when run as a script
+if __name__ == '__main__':
+    from hierarchyBuilder import readConfigFile
+    from umlsSource import openDataSource, readRelationFilter
+
+    # Print usage message
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] == '-u'):
+        print "Usage: graphSnapshot.py [snapshotFile]"
+        sys.exit()
+
+    try:
+        configFile = open(CONFIGURATIONFILE, 'r')
+    except IOError:
+        print "\nIOError when trying to open configuration file ({}).".format(\
+                                                            CONFIGURATIONFILE)
+        sys.exit()
+
+    configs = readConfigFile(configFile)
+    configFile.close()
+    configs.setdefault('snapshotDirectory', '.')
+    configs.setdefault('snapshotBackend', 'mysql')
+
+    if not configs.get('umlsRelease'):
+        print "\nError: umlsRelease not provided in configuration file."
+        sys.exit()
+
+    if len(sys.argv) == 2:
+        filename = sys.argv[1]
+    else:
+        filename = snapshotFileName(configs, readRelationFilter(configs))
+
+    sys.stdout.write("Compiling {} snapshot to {} . . . ".format(\
+        configs['umlsRelease'], filename))
+
+    # Read the relationships from the backend of the snapshot mode
+    backendConfigs = dict(configs)
+    backendConfigs['dataSource'] = configs['snapshotBackend']
+    dataSource = openDataSource(backendConfigs)
+
+    nodeCount, edgeCount = compileSnapshot(dataSource, filename, \
+                                           configs['umlsRelease'])
+    dataSource.close()
+
+    print "Done! ({} concepts, {} relationships)".format(nodeCount, edgeCount)
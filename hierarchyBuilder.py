@@ -1,7 +1,7 @@
-from owlwriter import ontology
+from owlwriter import openOntology
+from closureIndex import buildClosureIndex
 from collections import defaultdict
-import MySQLdb
-import sys
+from bisect import bisect_right
 
 """Supplementory file  containing functions to build the Hierarchy \
     and clean up the relationships
@@ -37,19 +37,45 @@ Permission to make commercial use of this software may be obtained by contacting
 
 # CONSTANT DEFINITIONS
 MAXCUILENGTH = 8
+# Maximum times to continue clean-up when # of relations removed is the same
+MAXREDUNDANT = 50
+
+# Optional configuration attributes and their default values, shared by
+# UMLSSubsetBuilder.py and batchBuilder.py
+optionalConfigs = {'harvestMode': 'batched', 'harvestChunkSize': '500',
+                   'dataSource': 'mysql', 'rrfDirectory': 'META',
+                   'snapshotBackend': 'mysql', 'snapshotDirectory': '.',
+                   'umlsRelease': '', 'nameChunkSize': '500',
+                   'nameCacheFile': '', 'nameCacheSize': '100000',
+                   'redundancyAlgorithm': 'linear', 'cleanupAlgorithm': 'loop',
+                   'cleanupTraversal': 'memoized',
+                   'loopDetection': 'paths', 'outputFormat': 'owl',
+                   'stateFile': '', 'connectionPoolSize': '4',
+                   'cursorMode': 'buffered', 'fetchSize': '1000',
+                   'relationSources': 'SNOMEDCT_US',
+                   'relationTypes': 'RN,CHD', 'relationSuppressed': 'O,Y,E',
+                   'batchProcesses': '0',
+                   'metricsFile': '', 'profileDirectory': ''}
 
 # Cleans up the passed in translated dictionary by removing unneccessary
 # Nodes in the hierarchy
 def cleanUpRelations(progressList, leaves, pValid, cleanRelations, dirtyDict, \
-                     parent, childList, loopsDict = defaultdict(list)):
+                     parent, childList, loopsDict = None, memo = None):
     """Cleans up the passed in translated dictionary by removing nodes
     violating the Two or More Children Policy. Returns the new hierarchy
-    through output dictionary parameter cleanRelations.
+    through output dictionary parameter cleanRelations, and the number of
+    nodes visited.
+
+    When a cleanUpMemo is given, the subtree of a child is only walked once
+    for each last valid parent, unless a loop can be reached from it, and the
+    relationships already added to cleanRelations are looked up in the memo
+    instead of in the children lists.
 
     Input:
         progressList: List object that keeps track of the nodes already
                       traversed. Used for loop detection.
-        leaves: List object containing the input CUIs
+        leaves: Set containing the input CUIs. Any collection works, but
+                lists are searched one CUI at a time.
         pValid: Holds the cui of the last valid parent
         cleanRelations: Dictionary object holding the new cleaned-up dictionary
         dirtyDict: Dictionary object containing the relationships and nodes
@@ -57,7 +83,85 @@ def cleanUpRelations(progressList, leaves, pValid, cleanRelations, dirtyDict, \
         parent: Holds the cui of the current parent being traversed
         childList: List object that holds the list of children for the current
                    parent
-        loopsDict: Dictionary object that saves the loops found during clean-up
+        loopsDict: [Optional] Dictionary object that saves the loops found
+                   during clean-up. Loops are skipped without being saved when
+                   not given.
+        memo: [Optional] cleanUpMemo shared by every call cleaning up dirtyDict
+              into cleanRelations.
+    """
+
+    # Path to the current node, shared by the whole traversal
+    path = list(progressList)
+    onPath = set(path)
+
+    # Relationships already in cleanRelations, when remembered by the memo
+    if memo is not None:
+        linked = memo.linked
+    else:
+        linked = None
+
+    # Each entry of the stack holds the last valid parent of a node's
+    # children and its remaining children
+    valid = connectToValidParent(leaves, pValid, cleanRelations, parent, \
+                                 childList, linked)
+    stack = [(valid, iter(childList))]
+    nodesVisited = 1
+
+    while stack:
+        valid, children = stack[-1]
+
+        # Loop through children and descend into the next one
+        for child in children:
+            # Skip any 'holder' children
+            if child == 'holder':
+                continue
+
+            # Check if child has already been traversed
+            if child in onPath:
+                if loopsDict is not None:
+                    recordLoop(loopsDict, path, child)
+                continue
+
+            # Skip the child if its subtree was already walked with the same
+            # valid parent, walking it again would add nothing
+            if memo is not None and memo.isExpanded(child, valid):
+                continue
+
+            # Add current child to the path
+            path.append(child)
+            onPath.add(child)
+
+            childList = dirtyDict[child]
+            stack.append((connectToValidParent(leaves, valid, cleanRelations, \
+                child, childList, linked), iter(childList)))
+            nodesVisited += 1
+            break
+
+        # Every child traversed, remove the node from the path
+        else:
+            stack.pop()
+            if stack:
+                onPath.discard(path.pop())
+
+    return nodesVisited
+
+
+# Connects a node of the hierarchy being cleaned up to its last valid parent
+def connectToValidParent(leaves, pValid, cleanRelations, parent, childList, \
+                         linked = None):
+    """Adds the node to the children of its last valid parent in
+    cleanRelations if it is valid or an input CUI. Returns the last valid
+    parent of its children.
+
+    Input:
+        leaves: Set containing the input CUIs
+        pValid: Holds the cui of the last valid parent
+        cleanRelations: Dictionary object holding the new cleaned-up dictionary
+        parent: Holds the cui of the node
+        childList: List object that holds the list of children of the node
+        linked: [Optional] Set of the (parent, child) relationships already
+                in cleanRelations, updated with the one added. The children
+                list of pValid is searched when not given.
     """
 
     # Save valid parent
@@ -74,70 +178,159 @@ def cleanUpRelations(progressList, leaves, pValid, cleanRelations, dirtyDict, \
     if parent in leaves:
         isValid = True
 
-    # Check if Current node is a leaf node, if so connect it to the last
-    # valid parent
-    if parent in leaves and parent not in cleanRelations[pValid] and \
-            parent != pValid:
-        cleanRelations[pValid].append(parent)
+    # If current parent is valid (input CUIs always are), add it to the
+    # cleaned dictionary if not already present.
+    if isValid and parent != pValid:
+        siblings = cleanRelations[pValid]
 
-    # If current parent is valid, add it to the cleaned dictionary if not
-    # already present.
-    if isValid and parent not in cleanRelations[pValid] and parent != pValid:
-        cleanRelations[pValid].append(parent)
-
-        # Set pValid to new valid parent (current)
-        valid = parent
+        if linked is None:
+            if parent not in siblings:
+                siblings.append(parent)
+        elif (pValid, parent) not in linked:
+            linked.add((pValid, parent))
+            siblings.append(parent)
 
     # Update valid parent
     if isValid:
         valid = parent
 
-    # Loop through children and recursively call
-    for child in childList:
-        # Skip any 'holder' children
-        if child == 'holder':
-            continue
+    return valid
 
-        # Check if child has already been traversed
-        if child in progressList:
-            loopCount = len(loopsDict["loops"])
-            badChild = "{}-BAD".format(child)
-            badChild += str(loopCount)
 
-            # Continue if already found the loop
-            if isContainedIn(loopsDict, badChild, "loops"):
-                continue
+# Saves the loop closed by a child already on the path
+def recordLoop(loopsDict, progressList, child):
+    """Saves the part of the path from child to its end in loopsDict as a new
+    loop, unless the loop was already found.
+
+    Input:
+        loopsDict: Dictionary object that saves the loops found during clean-up
+        progressList: List object holding the path to the current node
+        child: Holds the cui of the child closing the loop
+    """
 
+    loopCount = len(loopsDict["loops"])
+    badChild = "{}-BAD".format(child)
+    badChild += str(loopCount)
+
+    # Return if already found the loop
+    if isContainedIn(loopsDict, badChild, "loops"):
+        return
+
+    # Determine beginning and end of the loop
+    loopIterator = progressList.index(child) + 1
+    loopEnd = len(progressList)
+
+    # Root the child as the start of the loop
+    loopsDict["loops"].append(badChild)
+
+    # Save the remaining loop
+    while loopIterator < loopEnd:
+        loopsDict[badChild].append("{}-BAD{}".format( \
+                progressList[loopIterator], loopCount))
+
+        # Increment iterator and reassign badChild
+        badChild = "{}-BAD{}".format(progressList[loopIterator], loopCount)
+        loopIterator += 1
+
+
+class cleanUpMemo:
+    """Remembers the (node, last valid parent) pairs whose subtree
+    cleanUpRelations has walked. Walking a subtree adds the same
+    relationships every time it is reached with the same last valid parent,
+    as long as no loop can be reached from it, so later walks are skipped.
+    Subtrees reaching a loop are always walked, to record the loop found
+    along each path. The memo also remembers the relationships added to the
+    hierarchy being built, so they are not searched for in its children
+    lists."""
+
+    # Initialize the memo for the dictionary being cleaned up
+    def __init__(self, dirtyDict):
+        """Initialize the memo.
+
+        Input:
+            dirtyDict: Dictionary object containing the relationships to be
+                       cleaned up
+        """
+
+        self.acyclic = acyclicNodes(dirtyDict)
+        self.expanded = set()
+        self.linked = set() # (parent, child) relationships added so far
+        self.skipped = 0 # Number of walks skipped
+
+    # Checks whether a subtree was already walked, recording it otherwise
+    def isExpanded(self, node, pValid):
+        """Returns True if the subtree of node was already walked with pValid
+        as the last valid parent and can be skipped. Otherwise records the
+        walk about to be made and returns False.
+
+        Input:
+            node: The node whose subtree is about to be walked
+            pValid: The cui of the last valid parent
+        """
+
+        if node not in self.acyclic:
+            return False
 
-            # Determine beginning and end of the loop
-            loopIterator = progressList.index(child) + 1
-            loopEnd = len(progressList)
+        if (node, pValid) in self.expanded:
+            self.skipped += 1
+            return True
 
+        self.expanded.add((node, pValid))
+        return False
 
-            # Root the child as the start of the loop
-            loopsDict["loops"].append(badChild)
 
-            # Save the remaining loop
-            while loopIterator < loopEnd:
-                loopsDict[badChild].append("{}-BAD{}".format( \
-                        progressList[loopIterator], loopCount))
+# Returns the nodes no loop can be reached from
+def acyclicNodes(relationsDict):
+    """Returns the set of nodes of relationsDict from which no loop can be
+    reached, found with a single depth-first traversal.
 
+    Input:
+        relationsDict: Dictionary containing the relationships
+    """
 
-                # Increment iterator and reassign badChild
-                badChild = "{}-BAD{}".format(progressList[loopIterator], \
-                                             loopCount)
-                loopIterator += 1
+    acyclic = set()
+    finished = set()
+    onStack = set()
 
-            # Continue to next child
+    for root in relationsDict.keys():
+        if root in finished:
             continue
 
-        # Add current child to progresslist
-        pathSoFar = list(progressList)
-        pathSoFar.append(child)
+        # Each entry holds a node, its remaining children and whether no loop
+        # has been reached from it so far
+        onStack.add(root)
+        stack = [[root, iter(relationsDict.get(root, ())), True]]
+
+        while stack:
+            entry = stack[-1]
+
+            for child in entry[1]:
+                if child == 'holder':
+                    continue
+
+                # Descend into the next unvisited child
+                if child not in finished and child not in onStack:
+                    onStack.add(child)
+                    stack.append([child, iter(relationsDict.get(child, ())), \
+                                  True])
+                    break
+
+                # A child on the stack closes a loop
+                if child in onStack or child not in acyclic:
+                    entry[2] = False
 
-        #Recursive call
-        cleanUpRelations(pathSoFar, leaves, valid, cleanRelations, dirtyDict, \
-                         child, dirtyDict[child], loopsDict)
+            # Every child visited
+            else:
+                stack.pop()
+                onStack.discard(entry[0])
+                finished.add(entry[0])
+
+                if entry[2]:
+                    acyclic.add(entry[0])
+                elif stack:
+                    stack[-1][2] = False
+
+    return acyclic
 
 
 # Eliminates redundant relationships in the hierarchy
@@ -157,10 +350,56 @@ def reduceRedundancy(ancestorList, relationsDict, parent, childList, \
                 traversed.
         childList: List containing the cuis of the children of the current
                    parent.
-        translatedLeaves: List containing the input CUIs
+        translatedLeaves: Set containing the input CUIs
 
     """
+    # Each entry of the stack holds the ancestors of a node's children and
+    # its remaining children
+    relationsRemoved = removeAncestorRelations(ancestorList, relationsDict, \
+                                               childList)
+    stack = [(ancestorList + [parent], iter(childList))]
+
+    while stack:
+        ancestors, children = stack[-1]
+
+        # Traverse the next child
+        for child in children:
+            # Skip holder
+            if (child == 'holder'):
+                continue
+
+            childList = relationsDict[child]
+            relationsRemoved += removeAncestorRelations(ancestors, \
+                                                relationsDict, childList)
+
+            # Create a copy of ancestor list to pass on
+            newAncestors = list(ancestors)
+            newAncestors.append(child) # Add current child to ancestor list
+            stack.append((newAncestors, iter(childList)))
+            break
+
+        # Every child traversed
+        else:
+            stack.pop()
+
+    return relationsRemoved
+
+
+# Removes the direct relationships between children and their ancestors
+def removeAncestorRelations(ancestorList, relationsDict, childList):
+    """Removes the relationships directly connecting any ancestor in
+    ancestorList to a child in childList. Returns the number of relationships
+    removed.
+
+    Input:
+        ancestorList: List that contains the ancestors of the children
+        relationsDict: Dictionary containing the relationships to be
+                       cleaned-up. Directly alters this dictionary object.
+        childList: List containing the cuis of the children
+    """
+
     relationsRemoved = 0
+    childSets = dict() # Children of each ancestor looked up, as a set
 
     # Check for redundant relationships
     for child in childList:
@@ -173,16 +412,16 @@ def reduceRedundancy(ancestorList, relationsDict, parent, childList, \
             # Skip iteration if ancestor is no longer in the dict
             if ancestor not in relationsDict:
                 continue
+            if ancestor not in childSets:
+                childSets[ancestor] = set(relationsDict[ancestor])
+
             # check if child has a direct relationship to an ancestor
-            if child in relationsDict[ancestor]:
-                try:
-                    # Remove relationship between child and ancestor
-                    cToFix = relationsDict.pop(ancestor)
+            if child in childSets[ancestor]:
+                # Remove relationship between child and ancestor
+                cToFix = relationsDict.pop(ancestor)
+                childSets[ancestor].discard(child)
 
-                    relationsRemoved += 1
-                except KeyError:
-                    print ("KeyError when accessing {}".format(ancestor))
-                    return
+                relationsRemoved += 1
 
                 # Add the fixed ancestor
                 for entry in cToFix:
@@ -190,27 +429,722 @@ def reduceRedundancy(ancestorList, relationsDict, parent, childList, \
                     if entry != child:
                         relationsDict[ancestor].append(entry)
 
+    return relationsRemoved
 
 
-    # Create a copy of ancestor list to recursively pass on
-    newAncestors = list(ancestorList)
-    newAncestors.append(parent) # Add current parent to ancestor list
+# Eliminates every redundant relationship in the hierarchy in one pass
+def reduceRedundancyLinear(relationsDict, topTier, logFile=None):
+    """Eliminates redundant relationships in the hierarchy like
+    reduceRedundancy, but in a single pass over the nodes reachable from the
+    top level concepts instead of over every path. A relationship
+    parent->child is redundant when child is also a descendant of another
+    child of parent. Directly alters the passed in relationsDict and returns
+    the number of relationships removed.
 
-    # Recursively traverse children
-    for child in childList:
-        # Skip holder
-        if (child == 'holder'):
+    The nodes are visited children first (depth-first post-order), and the
+    set of proper descendants of each node is kept as a bitset of post-order
+    positions, dropped once all the node's parents have been visited.
+    Which relationship of a loop is redundant depends on the path taken, so
+    a hierarchy containing loops is reduced by walking every path with
+    reduceRedundancy instead.
+
+    Input:
+        relationsDict: Dictionary containing the relationships to be
+                       cleaned-up. Directly alters this dictionary object for
+                       implicit return.
+        topTier: List containing the top level CUIs
+        logFile: [Optional] Debug log file noting when every path is walked.
+    """
+
+    if findLoops(relationsDict, topTier):
+        return reduceRedundancyPaths(relationsDict, topTier, logFile)
+
+    order = postOrder(relationsDict, topTier)
+    position = dict((node, index) for index, node in enumerate(order))
+
+    # Children of each node that were visited before it
+    forwardChildren = dict()
+    parentCount = defaultdict(int)
+    for node in order:
+        children = []
+        seen = set()
+        for child in relationsDict.get(node, ()):
+            if child in position and position[child] < position[node] and \
+                    child not in seen:
+                seen.add(child)
+                children.append(child)
+                parentCount[child] += 1
+        forwardChildren[node] = children
+
+    relationsRemoved = 0
+    descendants = dict() # Bitset of the proper descendants of each node
+
+    for node in order:
+        children = forwardChildren[node]
+
+        # Descendants reachable through some child
+        reachable = 0
+        for child in children:
+            reachable |= descendants[child]
+
+        # A child that is also reachable through another child is redundant
+        redundant = set(child for child in children \
+                        if reachable >> position[child] & 1)
+
+        if redundant:
+            # Remove relationships between the node and redundant children
+            cToFix = relationsDict.pop(node)
+            relationsDict[node] = [entry for entry in cToFix \
+                                   if entry not in redundant]
+            relationsRemoved += len(redundant)
+
+        for child in children:
+            reachable |= 1 << position[child]
+
+            # Release the bitset once every parent has used it
+            parentCount[child] -= 1
+            if parentCount[child] == 0:
+                del descendants[child]
+
+        descendants[node] = reachable
+
+    return relationsRemoved
+
+
+# Eliminates redundant relationships by walking every path of a hierarchy
+def reduceRedundancyPaths(relationsDict, topTier, logFile=None):
+    """Eliminates redundant relationships with reduceRedundancy from every top
+    level concept, for the hierarchies containing loops that the single pass
+    algorithms cannot reduce the same way. Walking every path may take time
+    exponential in the size of the hierarchy, so the fallback is noted in the
+    debug log. Returns the number of relationships removed.
+
+    Input:
+        relationsDict: Dictionary containing the relationships to be
+                       cleaned-up. Directly alters this dictionary object for
+                       implicit return.
+        topTier: List containing the top level CUIs
+        logFile: [Optional] Debug log file the fallback is noted in.
+    """
+
+    # Debug message describing the fallback
+    if logFile is not None:
+        logFile.write("The hierarchy contains loops, so its redundant " \
+            "relations are removed by walking every path\n")
+
+    relationsRemoved = 0
+    for cui in topTier:
+        relationsRemoved += reduceRedundancy([], relationsDict, cui, \
+                                             relationsDict[cui], [])
+
+    return relationsRemoved
+
+
+# Eliminates every redundant relationship using an ancestor closure index
+def reduceRedundancyClosure(relationsDict, topTier, logFile=None):
+    """Eliminates redundant relationships in the hierarchy like
+    reduceRedundancyLinear, but looks up whether a child is a descendant of
+    another child of the same parent in a closureIndex of the hierarchy
+    instead of in bitsets of the descendants of each node. The index keeps
+    the ranges of post-order numbers each node reaches, which stay few when
+    the hierarchy is mostly a tree. A hierarchy containing loops is reduced
+    by walking every path with reduceRedundancy instead. Directly alters the
+    passed in relationsDict and returns the number of relationships removed.
+
+    Input:
+        relationsDict: Dictionary containing the relationships to be
+                       cleaned-up. Directly alters this dictionary object for
+                       implicit return.
+        topTier: List containing the top level CUIs
+        logFile: [Optional] Debug log file noting when every path is walked.
+    """
+
+    if findLoops(relationsDict, topTier):
+        return reduceRedundancyPaths(relationsDict, topTier, logFile)
+
+    index = buildClosureIndex(relationsDict, topTier)
+    numbers = index.numbers
+    relationsRemoved = 0
+
+    for node in numbers:
+        # Number of each child, without duplicates
+        childNumbers = dict()
+        for child in relationsDict.get(node, ()):
+            if child != 'holder':
+                childNumbers[child] = numbers[child]
+
+        if len(childNumbers) < 2:
             continue
-        relationsRemoved += reduceRedundancy (newAncestors, relationsDict, child, \
-                        relationsDict[child], translatedLeaves)
+
+        # A child can only be reached from children numbered after it
+        ordered = sorted(childNumbers.values())
+        redundant = set()
+        for child, number in childNumbers.items():
+            for other in ordered[bisect_right(ordered, number):]:
+                if index.reachesNumber(other, number):
+                    redundant.add(child)
+                    break
+
+        if redundant:
+            # Remove relationships between the node and redundant children
+            cToFix = relationsDict.pop(node)
+            relationsDict[node] = [entry for entry in cToFix \
+                                   if entry not in redundant]
+            relationsRemoved += len(redundant)
 
     return relationsRemoved
 
 
+# Applies both hierarchy policies in a single bottom-up pass
+def contractHierarchy(dirtyDict, topTier, leaves, countLegacy=False, \
+                      maxIterations=50):
+    """Applies the Two or More Children Policy and the No Redundancy Policy
+    together and returns (finishedHier, report). dirtyDict is not altered.
+
+    The nodes reachable from the top level concepts are visited children
+    first. When a node is visited its children have already been settled,
+    so its children are those of its dirty children that were kept, plus
+    the children of the ones that were removed. Redundant children are
+    dropped using bitsets of the descendants kept below each child, and the
+    node is then kept if it is a top level concept, an input CUI, or has two
+    or more children. The result is the hierarchy satisfying both policies.
+    It can differ from the output of the legacy clean-up loop even on
+    hierarchies without loops: a rebuild keeps a node having two or more
+    children before redundant relationships are removed below it, and the
+    loop stops once a round removes no redundant relationship, so it may
+    leave nodes with a single child that contraction removes.
+    Relationships closing a loop are ignored, so cleanHierarchy only uses it
+    on hierarchies without loops.
+
+    Input:
+        dirtyDict: Dictionary containing the relationships to be cleaned up
+        topTier: List containing the top level CUIs
+        leaves: Set containing the input CUIs
+        countLegacy: [Optional] When True, also simulates the legacy
+                     clean-up loop to report its number of iterations.
+        maxIterations: [Optional] Maximum number of legacy iterations
+                       simulated.
+
+    The report is a dictionary holding the number of passes made, the number
+    of redundant relationships removed, the number of nodes contracted and,
+    when countLegacy is True, the legacyIterations, an estimate of the
+    number of iterations the legacy clean-up loop would make.
+    """
+
+    order = postOrder(dirtyDict, topTier)
+    position = dict((node, index) for index, node in enumerate(order))
+    roots = frozenset(topTier)
+    leafSet = frozenset(leaves)
+
+    keptChildren = dict() # Final children of each kept node
+    represent = dict()    # Nodes taking the place of each node for its parents
+    descendants = dict()  # Bitset of the kept descendants of each kept node
+    edgesRemoved = 0
+    nodesContracted = 0
+
+    for node in order:
+        # Children of the kept dirty children and of the removed ones, in
+        # order and without duplicates. Relationships closing a loop are
+        # ignored.
+        children = []
+        seen = set()
+        for child in dirtyDict.get(node, ()):
+            if child == 'holder' or position[child] >= position[node]:
+                continue
+            for kept in represent[child]:
+                if kept not in seen:
+                    seen.add(kept)
+                    children.append(kept)
+
+        # Drop the children also reachable through another child
+        reachable = 0
+        for child in children:
+            reachable |= descendants[child]
+
+        keptList = [child for child in children \
+                    if not reachable >> position[child] & 1]
+        edgesRemoved += len(children) - len(keptList)
+
+        # Keep the node or let its children take its place
+        if node in roots or node in leafSet or len(keptList) > 1:
+            for child in keptList:
+                reachable |= 1 << position[child]
+            descendants[node] = reachable
+            keptChildren[node] = keptList
+            represent[node] = [node]
+        else:
+            represent[node] = keptList
+            nodesContracted += 1
+
+    # Build the finished hierarchy from the top level concepts down
+    finishedHier = defaultdict(list)
+    for cui in topTier:
+        if cui not in finishedHier:
+            finishedHier[cui].append("holder")
+
+    stack = [cui for cui in reversed(topTier) if cui in keptChildren]
+    visited = set(stack)
+    while stack:
+        node = stack.pop()
+        finishedHier[node].extend(keptChildren[node])
+
+        for child in reversed(keptChildren[node]):
+            if child not in visited:
+                visited.add(child)
+                stack.append(child)
+
+    report = {'passes': 1, 'edgesRemoved': edgesRemoved, \
+              'nodesContracted': nodesContracted}
+
+    if countLegacy:
+        report['legacyIterations'] = countLegacyIterations(dirtyDict, \
+                                        topTier, leaves, maxIterations)
+
+    return finishedHier, report
+
+
+# Counts the iterations of the legacy clean-up loop
+def countLegacyIterations(dirtyDict, topTier, leaves, maxIterations=50):
+    """Returns the number of iterations the legacy clean-up loop (eliminate
+    redundant relationships, then rebuild with cleanUpRelations, until no
+    relationship was eliminated) makes on the hierarchy, up to
+    maxIterations. Each iteration is simulated in near-linear time with
+    reduceRedundancyLinear and sweepHierarchy.
+
+    Input:
+        dirtyDict: Dictionary containing the relationships to be cleaned up
+        topTier: List containing the top level CUIs
+        leaves: Set containing the input CUIs
+        maxIterations: [Optional] Maximum number of iterations simulated.
+    """
+
+    hierarchy = defaultdict(list, ((node, list(children)) \
+                     for node, children in dirtyDict.items()))
+    iterations = 0
+
+    while iterations < maxIterations:
+        iterations += 1
+        redundantRelations = reduceRedundancyLinear(hierarchy, topTier)
+        hierarchy = sweepHierarchy(hierarchy, topTier, leaves)
+
+        if redundantRelations == 0:
+            break
+
+    return iterations
+
+
+# Rebuilds the hierarchy like one round of cleanUpRelations calls
+def sweepHierarchy(dirtyDict, topTier, leaves):
+    """Returns the relationships that calling cleanUpRelations from every top
+    level concept on dirtyDict adds to a new hierarchy, without walking every
+    path. A node is valid when it has two or more entries in dirtyDict or is
+    an input CUI. Each valid node is connected to the nearest valid node (or
+    top level concept) above it on every path reaching it, which are
+    propagated from parents to children in topological order.
+
+    Input:
+        dirtyDict: Dictionary containing the relationships to be cleaned up
+        topTier: List containing the top level CUIs
+        leaves: Set containing the input CUIs
+    """
+
+    order = postOrder(dirtyDict, topTier)
+    position = dict((node, index) for index, node in enumerate(order))
+    roots = frozenset(topTier)
+    leafSet = frozenset(leaves)
+
+    cleanRelations = defaultdict(list)
+    for cui in topTier:
+        if cui not in cleanRelations:
+            cleanRelations[cui].append("holder")
+
+    validParents = defaultdict(list) # Nearest valid nodes above each node
+    linked = set() # (parent, node) pairs already in validParents
+
+    for node in reversed(order):
+        isValid = len(dirtyDict.get(node, ())) > 1 or node in leafSet
+
+        # Connect a valid node to the nearest valid nodes above it
+        if isValid:
+            for parent in validParents[node]:
+                if parent != node:
+                    cleanRelations[parent].append(node)
+            passedDown = [node]
+        else:
+            passedDown = list(validParents[node])
+
+        # A top level concept is the valid parent of its own traversal
+        if node in roots and node not in passedDown:
+            passedDown.append(node)
+
+        for child in dirtyDict.get(node, ()):
+            if child == 'holder' or position[child] >= position[node]:
+                continue
+            for parent in passedDown:
+                if (parent, child) not in linked:
+                    linked.add((parent, child))
+                    validParents[child].append(parent)
+
+    return cleanRelations
+
+
+# Finds the loops reachable from the top level concepts
+def findLoops(relationsDict, topTier):
+    """Returns the loops of relationsDict reachable from the top level CUIs,
+    found in a single traversal with Tarjan's strongly connected components
+    algorithm. Each loop is the list of CUIs of a component (or of a CUI
+    related to itself), in the order they were reached. Loops are listed in
+    the order they were reached.
+
+    Input:
+        relationsDict: Dictionary containing the relationships
+        topTier: List containing the top level CUIs
+    """
+
+    index = dict() # Order in which each node was reached
+    lowLink = dict() # Lowest index reachable back from each node's subtree
+    components = [] # Nodes of the components not completed yet
+    inComponent = set()
+    loops = []
+
+    for root in topTier:
+        if root in index:
+            continue
+
+        index[root] = lowLink[root] = len(index)
+        components.append(root)
+        inComponent.add(root)
+        stack = [(root, iter(relationsDict.get(root, ())))]
+
+        while stack:
+            node, children = stack[-1]
+
+            # Descend into the next child not reached yet
+            for child in children:
+                if child == 'holder':
+                    continue
+
+                if child not in index:
+                    index[child] = lowLink[child] = len(index)
+                    components.append(child)
+                    inComponent.add(child)
+                    stack.append((child, iter(relationsDict.get(child, ()))))
+                    break
+
+                if child in inComponent:
+                    lowLink[node] = min(lowLink[node], index[child])
+
+            # Every child visited
+            else:
+                stack.pop()
+                if stack:
+                    parent = stack[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+
+                # The node is the first reached of a completed component
+                if lowLink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = components.pop()
+                        inComponent.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    component.reverse()
+
+                    if len(component) > 1 or \
+                            node in relationsDict.get(node, ()):
+                        loops.append(component)
+
+    loops.sort(key=lambda loop: index[loop[0]])
+    return loops
+
+
+# Builds the loops category of the hierarchy from the loops found
+def loopsDictionary(loops):
+    """Returns the loops dictionary describing the loops, for use with
+    writeToFile. The first CUI of each loop is listed under "loops" and each
+    following CUI under the previous one, as cui-loop# combinations.
+
+    Input:
+        loops: List of loops, as returned by findLoops
+    """
+
+    loopsDict = defaultdict(list)
+
+    for loopCount, loop in enumerate(loops):
+        names = ["{}-BAD{}".format(cui, loopCount) for cui in loop]
+        loopsDict["loops"].append(names[0])
+
+        for previous, name in zip(names, names[1:]):
+            loopsDict[previous].append(name)
+
+    return loopsDict
+
+
+# Returns the nodes reachable from the top level concepts, children first
+def postOrder(relationsDict, topTier):
+    """Returns the nodes reachable from the top level CUIs in depth-first
+    post-order (every node after the children it does not loop back to).
+
+    Input:
+        relationsDict: Dictionary containing the relationships
+        topTier: List containing the top level CUIs
+    """
+
+    order = []
+    visited = set()
+
+    for root in topTier:
+        if root in visited:
+            continue
+
+        visited.add(root)
+        stack = [(root, iter(relationsDict.get(root, ())))]
+
+        while stack:
+            node, children = stack[-1]
+
+            # Descend into the next unvisited child
+            for child in children:
+                if child != 'holder' and child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(relationsDict.get(child, ()))))
+                    break
+
+            # Every child visited
+            else:
+                stack.pop()
+                order.append(node)
+
+    return order
+
+
+# Builds the initial hierarchy by following pathways from the top level CUIs
+def buildInitialHierarchy(relationsDict, topTier, leaves, configs):
+    """Builds the initial hierarchy by following the pathways from the top
+    level CUIs, removing the nodes violating the Two or More Children Policy
+    along the way. Returns (inProgressHier, loopsDict, report), where the
+    report holds the loops found by findLoops ('loops', None when the loops
+    are recorded along the pathways), the number of walks skipped by the
+    cleanUpMemo ('skippedWalks', None when every pathway is walked) and the
+    number of nodes visited ('nodesVisited').
+
+    Input:
+        relationsDict: Dictionary containing the relationships gathered
+        topTier: Collection containing the top level CUIs
+        leaves: Collection containing the input CUIs, looked up as a
+                frozenset
+        configs: Dictionary containing the loopDetection and cleanupTraversal
+                 configuration attributes
+    """
+
+    # Will hold the hierarchy while being built and cleaned up
+    inProgressHier = defaultdict(list)
+    leaves = frozenset(leaves)
+
+    # Keeps tracks of loops encountered, either found at once as the strongly
+    # connected components of the relationships or along the paths traversed
+    if configs['loopDetection'] == 'paths':
+        loopsDict = defaultdict(list)
+        pathLoopsDict = loopsDict
+    else:
+        loops = findLoops(relationsDict, topTier)
+        loopsDict = loopsDictionary(loops)
+        pathLoopsDict = None
+
+    # Remembers the subtrees already walked, unless every path is to be walked
+    if configs['cleanupTraversal'] == 'paths':
+        traversalMemo = None
+    else:
+        traversalMemo = cleanUpMemo(relationsDict)
+
+    nodesVisited = 0
+
+    # Create the initial hierarchy, by following pathways from topTier CUIs
+    for parentCui in topTier:
+        # Save parent and child for traversal
+        if (relationsDict.has_key(parentCui)):
+            childList = relationsDict[parentCui]
+        else:
+            continue
+
+        # Add the Top Level Concept to the dictionary
+        inProgressHier[parentCui].append("holder")
+        pathSoFar = [parentCui]
+        nodesVisited += cleanUpRelations(pathSoFar, leaves, parentCui, \
+                          inProgressHier, relationsDict, parentCui, childList, \
+                          pathLoopsDict, traversalMemo)
+
+    report = {'loops': None, 'skippedWalks': None, \
+              'nodesVisited': nodesVisited}
+    if pathLoopsDict is None:
+        report['loops'] = loops
+    if traversalMemo is not None:
+        report['skippedWalks'] = traversalMemo.skipped
+
+    return inProgressHier, loopsDict, report
+
+
+# Cleans up the initial hierarchy
+def cleanHierarchy(inProgressHier, topTier, leaves, configs, \
+                   maxRedundant=MAXREDUNDANT, \
+                   logFile=None, report=None):
+    """Applies the Two or More Children and No Redundancy Policies to the
+    initial hierarchy and returns the finished hierarchy. The initial
+    hierarchy may be altered.
+
+    When a report dictionary is given, the number of redundant relationships
+    removed by each round of the clean-up is saved in it as 'edgesRemoved'
+    and the number of nodes visited by the rebuilds as 'nodesVisited', along
+    with the report of contractHierarchy when it cleans the hierarchy up.
+
+    The 'loop' cleanupAlgorithm stops once a round removes no redundant
+    relationship, while 'contraction' always removes every node left with
+    fewer than two children, so their outputs can differ even on
+    hierarchies without loops.
+
+    Input:
+        inProgressHier: Dictionary containing the initial hierarchy
+        topTier: Collection containing the top level CUIs
+        leaves: Collection containing the input CUIs, looked up as a
+                frozenset
+        configs: Dictionary containing the cleanupAlgorithm,
+                 redundancyAlgorithm and cleanupTraversal configuration
+                 attributes
+        maxRedundant: [Optional] Number of clean-ups removing the same number
+                      of relationships after which an error is reported.
+        logFile: [Optional] Debug log file the clean-up is described in.
+        report: [Optional] Dictionary describing the clean-up. Output
+                parameter.
+    """
+
+    leaves = frozenset(leaves)
+    if report is None:
+        report = dict()
+
+    # Which relationships of a loop are kept depends on the paths walked by
+    # the rebuilds, so a hierarchy containing loops is cleaned up by the
+    # clean-up loop even when contraction is selected
+    contract = configs['cleanupAlgorithm'] == 'contraction'
+    if contract and findLoops(inProgressHier, topTier):
+        contract = False
+
+        # Debug message describing the fallback
+        if logFile is not None:
+            logFile.write("The hierarchy contains loops, so it is cleaned " \
+                "up by the clean-up loop instead of by contraction\n")
+
+    # Apply both policies in a single bottom-up pass over the hierarchy
+    if contract:
+        finishedHier, cleanupReport = contractHierarchy(inProgressHier, \
+                        list(topTier), leaves, logFile is not None, maxRedundant)
+
+        # Debug message describing the clean-up
+        if logFile is not None:
+            logFile.write("Contraction made {passes} pass(es), removed " \
+                "{edgesRemoved} redundant relations and contracted " \
+                "{nodesContracted} nodes; the legacy loop would have taken " \
+                "an estimated {legacyIterations} iteration(s)\n".format(\
+                **cleanupReport))
+
+        report.update(cleanupReport)
+        report['edgesRemoved'] = [cleanupReport['edgesRemoved']]
+
+    # Otherwise alternate redundancy elimination and rebuilds of the hierarchy
+    else:
+        #Tracks the number of time hierarchy cleanup has yielded the same cleanup
+        #count
+        redundantCleanUpCount = 1
+        previousCleanUp = -1 # Tracks last cleanup count
+        report['edgesRemoved'] = []
+        report['nodesVisited'] = 0
+
+        # Loop through and eliminate the redundant relationships then reclean
+        # until # of relationships eliminated due to redundancy is 0, automatically
+        # ends after maxRedundant loop iterations yield the same # of redundant
+        # relations cleaned up to account for situations causing an endless loop
+        while True:
+            redundantRelations = 0
+
+            # Eliminate redundant relationships in the hierarchy, either in a
+            # single pass or by walking every path from the top level concepts
+            if configs['redundancyAlgorithm'] == 'legacy':
+                for cui in topTier:
+                    ancestorList = []
+                    redundantRelations += reduceRedundancy(ancestorList, \
+                                inProgressHier, cui, inProgressHier[cui], leaves)
+            elif configs['redundancyAlgorithm'] == 'closure':
+                redundantRelations = reduceRedundancyClosure(inProgressHier, \
+                                                             topTier, logFile)
+            else:
+                redundantRelations = reduceRedundancyLinear(inProgressHier, \
+                                                            topTier, logFile)
+            report['edgesRemoved'].append(redundantRelations)
+
+            finishedHier = defaultdict(list) # will hold the final hierarchy
+
+            if configs['cleanupTraversal'] == 'paths':
+                traversalMemo = None
+            else:
+                traversalMemo = cleanUpMemo(inProgressHier)
+
+            # Re clean up relationships
+            for cui in topTier:
+                # Add holder entry to top tier concept
+                if cui not in finishedHier:
+                    finishedHier[cui].append("holder")
+
+                pathSoFar = [cui]
+
+                report['nodesVisited'] += cleanUpRelations(pathSoFar, \
+                                 leaves, cui, finishedHier, inProgressHier, \
+                                 cui, inProgressHier[cui], memo=traversalMemo)
+
+            inProgressHier = finishedHier
+
+
+            # Break when no redudnant relations have been removed
+            if redundantRelations is 0:
+                break
+
+            # Debug message that prints the number of relationships cleaned up due
+            # to redundancy for each loop iteration
+            if logFile is not None:
+                logFile.write("Clean-up {} yielded {} redundant relations\n".\
+                    format(redundantCleanUpCount, redundantRelations))
+
+            # Keeps track of number of cleanups yielding the same # of relationships
+            # cleaned up.
+            if redundantRelations == previousCleanUp:
+                redundantCleanUpCount += 1
+            else:
+                redundantRelations = 0 # Reset redundant relations count
+
+            # Break out of the loop after maxRedundant clean ups yielded same # of
+            # removed relations
+            if redundantCleanUpCount >= maxRedundant:
+                # Print error message
+                print "Error: Last {} clean-ups of the hierarchy removed the same\
+                    number of relationships. This most likely occurred due to a \
+                    problem with the inherent relationships in the database being \
+                    used. There\
+                    is a chance that forward progress was being made during\
+                    these cleanUps; the limit can be increased by changing the\
+                    value of the MAXREDUNDANT variable in hierarchyBuilder.py.".\
+                    format(maxRedundant)
+
+            # Update previousCleanUp count
+            previousCleanUp = redundantRelations
+
+    return finishedHier
+
+
 # Writes the hierarchy in XML format for protege
-def writeToFile (translatedLeaves, relationsDict, filename, topHier, loopDict):
+def writeToFile (translatedLeaves, relationsDict, filename, topHier, loopDict, \
+                 outputFormat = 'owl'):
     """Writes the hierarchy in OWL format to the specified file for use with
-    Protege.
+    Protege, or in another of the output formats of owlwriter.
 
     Input:
         translatedLeaves: List containing the input CUIs (in cui-name format)
@@ -220,10 +1154,11 @@ def writeToFile (translatedLeaves, relationsDict, filename, topHier, loopDict):
                   hierarchy.
         topHier: List containing the top level CUIs (in cui-name format)
         loopDict: Dictionary containing the loops found
+        outputFormat: [Optional] Name of the output format. Default is owl.
 
     """
     # Create an ontology object
-    hierarchy = ontology(filename)
+    hierarchy = openOntology(filename, outputFormat)
 
     # Write XML version
     hierarchy.version("1.0")
@@ -284,14 +1219,41 @@ def reorganize (newDict, oldRelationsDict, parent):
         parent: String containing the current parent's name.
     """
 
+    # Nodes already reorganized. Reaching one again adds nothing new.
+    visited = set([parent])
+    stack = [iter(addToChildren(newDict, oldRelationsDict, parent))]
+
+    while stack:
+        # Traverse the hierarchy below the next child
+        for child in stack[-1]:
+            if child not in visited:
+                visited.add(child)
+                stack.append(iter(addToChildren(newDict, oldRelationsDict, \
+                                                child)))
+                break
+
+        # Every child traversed
+        else:
+            stack.pop()
+
+
+# Adds a parent to each of its children's entries
+def addToChildren(newDict, oldRelationsDict, parent):
+    """Adds the parent to the entries of each of its children in the
+    child-based dictionary newDict. Returns the children of the parent.
+
+    Input:
+        newDict: Child-based dictionary. Output parameter.
+        oldRelationsDict: Parent-based relations dictionary being reorganized.
+        parent: String containing the current parent's name.
+    """
+
     # Add current parent to each of its children's entries
     for child in oldRelationsDict[parent]:
         if parent not in newDict[child] and child != 'holder':
             newDict[child].append(parent)
 
-    # Recursive call to traverse hierarchy
-    for child in oldRelationsDict[parent]:
-        reorganize (newDict, oldRelationsDict, child)
+    return oldRelationsDict[parent]
 
 
 # Traverses a pathway to check for the presence of a node
@@ -299,7 +1261,7 @@ def isContainedIn (loopsDict, toFind, parent):
     """Traverses a pathway to check for the presence of a node. Returns True
     if found, false otherwise.
 
-    IOnput:
+    Input:
         loopsDict: Dictionary to check against for the presence of the node
                    toFind.
         toFind: String naming the cui of the node to check for in the
@@ -308,15 +1270,17 @@ def isContainedIn (loopsDict, toFind, parent):
                 traversed while checking for the toFind node.
     """
 
-    # Check if found the node
-    for node in loopsDict[parent]:
-        if matches (toFind, node):
-            return True
+    stack = [parent]
+    while stack:
+        parent = stack.pop()
 
-    # Check if the node toFind is contained in any of the children's hierarchies
-    for child in loopsDict[parent]:
-        if (isContainedIn (loopsDict, toFind, child)):
-            return True
+        # Check if found the node
+        for node in loopsDict[parent]:
+            if matches (toFind, node):
+                return True
+
+        # Check the children's hierarchies next, in order
+        stack.extend(reversed(loopsDict[parent]))
 
     return False
 
@@ -400,6 +1364,56 @@ def areValidArguments(arguments):
         else:
             return False
 
+# Separates the --name=value options from the commandline arguments
+def extractOptions(arguments):
+    """Returns the commandline arguments without the --name=value options,
+    and a dictionary of the value of each option.
+
+    Input:
+        arguments: The commandline arguments passed in to the main script"""
+
+    positional = []
+    options = dict()
+
+    for argument in arguments:
+        if argument.startswith('--') and '=' in argument:
+            name, value = argument[2:].split('=', 1)
+            options[name] = value
+        else:
+            positional.append(argument)
+
+    return positional, options
+
+# Reads the configuration attributes from the configuration file
+def readConfigFile (configFile):
+    """Returns a dictionary of the attribute=value pairs contained in the
+    configuration file. Lines starting with '#' and lines without a '=' are
+    ignored.
+
+    Input:
+        configFile: The opened configuration file"""
+
+    configs = dict()
+
+    for configLine in configFile:
+        # Continue when found a comment beginning with '#'
+        if configLine.startswith('#'):
+            continue
+
+        # Find delimiter
+        delimIndex = configLine.find('=')
+
+        # Continue if no configuration attribute is given on this line, -1
+        # indicates that '=' was not found in the line
+        if delimIndex == -1:
+            continue
+
+        # Add the configuration attribute to the config dictionary
+        configs[configLine[:delimIndex].lstrip(' ')] = configLine[delimIndex+1:].\
+            rstrip('\n')
+
+    return configs
+
 def removeIllegalChars (cuiName):
     """Removes any illegal characters that would cause Protege read errors
     from the cui-name. Returns the fixed cui-name.
@@ -416,49 +1430,35 @@ def removeIllegalChars (cuiName):
 
     return cuiName
 
-def translateDictionary (untranslatedDict, dbCursor, isLoopsDict = False):
+def translateDictionary (untranslatedDict, resolver, isLoopsDict = False):
     """Translates a dictionary passed in by adding the Preferred Term or
     English term to the end of the CUI. Returns the translated dictionary
 
     Input:
         untranslatedDict - the dictionary to be translated
-        dbCursor - the database cursor used for querying
+        resolver - the nameResolver shared by the translations of the run
         isLoopsDict - default is false, when true it only uses the CUI of the
                       cui-loop# combination"""
 
     translatedDict = defaultdict(list)
 
-    # Translate the untranslatedDict from concepts to descriptions
-    stringQuery = "SELECT TTY, STR, LAT from MRCONSO where CUI = '{}' "
-    for parent, childList in untranslatedDict.items():
-        # Format the parent if from loopsDict
-        if isLoopsDict:
-            queryParent = parent[:8] # Removes loop count
-        else:
-            queryParent = parent
-        # Add the parent concept to the dictionary with string name
-        try:
-            dbCursor.execute(stringQuery.format(queryParent))
-
-        except MySQLdb.Error, e:
-            try:
-                # Prints the error
-                print "MySQL Error [{}]: {} --- while querying {}".format(\
-                                                e.args[0], e.args[1], parent)
-
-            except IndexError:
-                # Prints the 1 argument error
-                print "MySQL Error: {} --- while querying {}".format(\
-                                                str(e), parent)
-
-            sys.exit()
-
-
-
-        # Fetch parent's name
-        pRows = dbCursor.fetchall()
+    # Length of the part of a node naming its CUI
+    if isLoopsDict:
+        cuiLength = MAXCUILENGTH # Removes loop count
+    else:
+        cuiLength = None
 
+    # Resolve every distinct CUI of the dictionary at once
+    cuis = set()
+    for parent, childList in untranslatedDict.items():
+        if parent != 'loops':
+            cuis.add(parent[:cuiLength])
+        cuis.update(child[:cuiLength] for child in childList \
+                    if child != 'holder')
+    resolver.prefetch(cuis)
 
+    # Translate the untranslatedDict from concepts to descriptions
+    for parent, childList in untranslatedDict.items():
         # Handle misc case
         if parent == 'misc':
             pName = 'misc'
@@ -466,39 +1466,16 @@ def translateDictionary (untranslatedDict, dbCursor, isLoopsDict = False):
             pName = 'loops'
         else:
             # Save Parent's Name
-            pName = "{}".format(determinePreferred (pRows))
+            pName = "{}".format(resolver.preferredName(parent[:cuiLength]))
             pName = "{}-".format(parent) + pName
 
         # Fetch Children names and add to the translated dict
         for child in childList:
-            # Format child names if it is a loops dictionary
-            if isLoopsDict:
-                queryChild = child[:8]
-            else:
-                queryChild = child
-
-            try:
-                dbCursor.execute(stringQuery.format(queryChild))
-
-            except MySQLdb.Error, e:
-                try:
-                    # Prints the error
-                    print "MySQL Error [{}]: {} --- while querying {}".format(\
-                                        e.args[0], e.args[1], child)
-
-                except IndexError:
-                    # Prints the 1 argument error
-                    print "MySQL Error: {} --- while querying {}".format(str(e),\
-                                                                        child)
-
-            # Fetch child's names
-            cRows = dbCursor.fetchall()
-
             # Save the name
             if child == 'holder':
                 cName = 'holder'
             else:
-                cName = "{}".format(determinePreferred(cRows))
+                cName = "{}".format(resolver.preferredName(child[:cuiLength]))
                 cName = "{}-".format(child) + cName
 
             # Add child too dictionary
@@ -506,40 +1483,23 @@ def translateDictionary (untranslatedDict, dbCursor, isLoopsDict = False):
 
     return translatedDict
 
-def translateList (untranslatedList, dbCursor):
+def translateList (untranslatedList, resolver):
     """Translates an inputted list by adding the Preferred Term or English
     term to the end of the CUI. Returns the translated list.
 
     Input:
         untranslatedList: the list to be translated
-        dbCursor: the database cursor for querying"""
+        resolver: the nameResolver shared by the translations of the run"""
 
     translatedLeaves = []
 
+    # Resolve every CUI of the list at once
+    resolver.prefetch(untranslatedList)
+
     # Translate the leaves from concepts to descriptions
-    stringQuery = "SELECT TTY, STR, LAT from MRCONSO where CUI = '{}' "
     for cui in untranslatedList:
-        # Add the parent concept to the dictionary with string name
-        try:
-            dbCursor.execute(stringQuery.format(cui))
-
-        except MySQLdb.Error, e:
-            try:
-                # Prints the error
-                print "MySQL Error [{}]: {} --- while querying {}".format(\
-                                                    e.args[0], e.args[1], cui)
-
-            except IndexError:
-                # Prints the 1 argument error
-                print "MySQL Error: {} --- while querying {}".format(str(e), cui)
-
-
-
-        # Fetch leaf's name
-        lRows = dbCursor.fetchall()
-
         # Save Parent's Name
-        lName = "{}".format(determinePreferred(lRows))
+        lName = "{}".format(resolver.preferredName(cui))
         lName = "{}-".format(cui) + lName
 
         # Add child too dictionary
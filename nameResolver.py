@@ -0,0 +1,232 @@
+"""Supplementary file containing the nameResolver class used for translating
+CUIs into their preferred names
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from hierarchyBuilder import determinePreferred
+import sqlite3
+import sys
+
+# CONSTANT DEFINITIONS
+DEFAULTCHUNKSIZE = 500 # Number of CUIs placed in a single CUI IN (...) query
+DEFAULTCACHESIZE = 100000 # Number of names kept by the persistent name cache
+
+
+# Creates the name resolver selected by the configuration
+def openNameResolver(dataSource, configs):
+    """Returns a nameResolver for the data source, backed by a
+    persistentNameCache when the nameCacheFile configuration attribute names
+    a cache file. Exits if umlsRelease is not set alongside nameCacheFile,
+    since the cached names are keyed by release.
+
+    Input:
+        dataSource: The data source used for looking up names
+        configs: Dictionary containing the configuration attributes
+    """
+
+    cache = None
+    if configs.get('nameCacheFile'):
+        if not configs.get('umlsRelease'):
+            print "\nError: umlsRelease must be provided in the configuration " \
+                "file to use the name cache {}.".format(configs['nameCacheFile'])
+            sys.exit()
+
+        cache = persistentNameCache(configs['nameCacheFile'], \
+                configs['umlsRelease'], \
+                int(configs.get('nameCacheSize', DEFAULTCACHESIZE)))
+
+    return nameResolver(dataSource, \
+            int(configs.get('nameChunkSize', DEFAULTCHUNKSIZE)), cache)
+
+
+class nameResolver:
+    """Resolves CUIs to their preferred names. Each CUI's names are looked up
+    at most once, in batches of up to chunkSize CUIs, and the preferred name
+    is remembered for every later translation sharing the resolver."""
+
+    # Initialize the resolver with the data source to look names up in
+    def __init__(self, dataSource, chunkSize=DEFAULTCHUNKSIZE, cache=None):
+        """Initialize the name resolver.
+
+        Input:
+            dataSource: The data source used for looking up names
+            chunkSize: [Optional] Maximum number of CUIs per lookup.
+            cache: [Optional] persistentNameCache consulted before the data
+                   source and updated with the names looked up in it.
+        """
+
+        self.dataSource = dataSource
+        self.chunkSize = chunkSize
+        self.cache = cache
+        self.names = dict() # Preferred name of each resolved CUI
+
+    # Resolves the names of all the CUIs not resolved yet
+    def prefetch(self, cuis):
+        """Looks up the names of every CUI in cuis that has not been resolved
+        yet, chunkSize CUIs at a time.
+
+        Input:
+            cuis: Iterable of the CUIs to resolve
+        """
+
+        missing = []
+        seen = set()
+        for cui in cuis:
+            if cui not in self.names and cui not in seen:
+                seen.add(cui)
+                missing.append(cui)
+
+        # Take the names known from previous runs from the cache
+        if self.cache is not None and missing:
+            cached = self.cache.lookup(missing)
+            self.names.update(cached)
+            missing = [cui for cui in missing if cui not in cached]
+
+        for start in range(0, len(missing), self.chunkSize):
+            chunk = missing[start:start + self.chunkSize]
+            rowsByCui = self.dataSource.conceptNamesBatch(chunk)
+
+            for cui in chunk:
+                self.names[cui] = determinePreferred(rowsByCui.get(cui, ()))
+
+            if self.cache is not None:
+                self.cache.store(dict((cui, self.names[cui]) for cui in chunk))
+
+    # Returns the preferred name of a CUI
+    def preferredName(self, cui):
+        """Returns the preferred term, or first English term, of the CUI.
+
+        Input:
+            cui: The CUI to resolve
+        """
+
+        if cui not in self.names:
+            self.prefetch([cui])
+
+        return self.names[cui]
+
+    # Save the cache of the resolver
+    def close(self):
+        """Closes the persistent name cache, if any"""
+
+        if self.cache is not None:
+            self.cache.close()
+
+
+class persistentNameCache:
+    """Size-bounded cache of preferred names kept in a SQLite file across
+    runs, keyed by UMLS release and CUI. When it holds more than maxEntries
+    names, the least recently used ones are evicted on close."""
+
+    # Initialize the cache by opening the cache file
+    def __init__(self, filename, release, maxEntries=DEFAULTCACHESIZE):
+        """Opens, creating it if needed, the cache file.
+
+        Input:
+            filename: String naming the cache file
+            release: String naming the UMLS release the names belong to
+            maxEntries: [Optional] Maximum number of names kept in the file.
+        """
+
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS names (release " \
+            "TEXT, cui TEXT, name BLOB, lastUsed INTEGER, PRIMARY KEY " \
+            "(release, cui))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS namesLastUsed " \
+            "ON names (lastUsed)")
+
+        self.release = release
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+
+        # Every lookup or store advances the clock used to order the entries
+        # by recency
+        self.clock = self.connection.execute(\
+            "SELECT MAX(lastUsed) FROM names").fetchone()[0] or 0
+
+    # Returns the cached names of the CUIs
+    def lookup(self, cuis):
+        """Returns a dictionary of the cached names of the CUIs found in the
+        cache and marks them as recently used.
+
+        Input:
+            cuis: List of the CUIs to look up
+        """
+
+        self.clock += 1
+        found = dict()
+
+        # SQLite limits the number of parameters of a query
+        for start in range(0, len(cuis), DEFAULTCHUNKSIZE):
+            chunk = cuis[start:start + DEFAULTCHUNKSIZE]
+            marks = ", ".join("?" for cui in chunk)
+
+            for cui, name in self.connection.execute("SELECT cui, name " \
+                    "FROM names WHERE release = ? AND cui IN ({})".format(\
+                    marks), [self.release] + chunk):
+                found[str(cui)] = str(name)
+
+            self.connection.execute("UPDATE names SET lastUsed = ? WHERE " \
+                "release = ? AND cui IN ({})".format(marks), \
+                [self.clock, self.release] + chunk)
+
+        self.hits += len(found)
+        self.misses += len(cuis) - len(found)
+
+        return found
+
+    # Adds names to the cache
+    def store(self, names):
+        """Adds the names to the cache as recently used.
+
+        Input:
+            names: Dictionary of the preferred name of each CUI
+        """
+
+        self.clock += 1
+        self.connection.executemany("INSERT OR REPLACE INTO names VALUES " \
+            "(?, ?, ?, ?)", [(self.release, cui, sqlite3.Binary(name), \
+            self.clock) for cui, name in names.items()])
+
+    # Evict the least recently used names and save the cache file
+    def close(self):
+        """Evicts the least recently used names beyond maxEntries, then
+        commits and closes the cache file."""
+
+        entries = self.connection.execute(\
+            "SELECT COUNT(*) FROM names").fetchone()[0]
+
+        if entries > self.maxEntries:
+            self.connection.execute("DELETE FROM names WHERE rowid IN " \
+                "(SELECT rowid FROM names ORDER BY lastUsed LIMIT ?)", \
+                (entries - self.maxEntries,))
+
+        self.connection.commit()
+        self.connection.close()
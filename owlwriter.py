@@ -1,4 +1,4 @@
-"""Module containing the ontology class for writing hierarchies in OWL format
+"""Module containing the ontology classes for writing hierarchies in OWL format
 
 This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
 
@@ -28,6 +28,20 @@ Permission to make commercial use of this software may be obtained by contacting
     PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
     MODIFICATIONS.
 """
+from json.encoder import encode_basestring_ascii
+import gzip
+import json
+import urllib
+
+# CONSTANT DEFINITIONS
+CHUNKSIZE = 1 << 20 # Number of characters collected before writing to file
+COMPRESSIONLEVEL = 6 # gzip compression level of compressed output formats
+RDFTYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+OWLONTOLOGY = "http://www.w3.org/2002/07/owl#Ontology"
+OWLCLASS = "http://www.w3.org/2002/07/owl#Class"
+SUBCLASSOF = "http://www.w3.org/2000/01/rdf-schema#subClassOf"
+IRISAFE = "-._~!$&'()*+,;=:@/?" # Characters left unencoded in IRI fragments
+
 class ontology:
     """Class for creating the OWL file for use with Protege"""
 
@@ -163,3 +177,293 @@ class ontology:
         while count > 0:
             self.outfile.write(" ")
             count = count-1
+
+
+class streamingOntology(ontology):
+    """Class for creating the OWL file for use with Protege, producing the
+    same file as ontology. Each class entry is built as a single string and
+    the output is collected into large chunks before being written."""
+
+    # Initialize the ontology object with the file to write to
+    def __init__(self, filename, chunkSize=CHUNKSIZE, compressed=False):
+        """Initialize the ontology object. Opens the file to write the hierarchy
+        to.
+
+        Input:
+            filename: String naming the file to be used for saving the final
+                      hierarchy to.
+            chunkSize: [Optional] Number of characters collected before
+                       writing to the file.
+            compressed: [Optional] When True, the file is written gzip
+                        compressed.
+        """
+        if compressed:
+            outfile = gzip.open(filename, 'wb', COMPRESSIONLEVEL)
+        else:
+            outfile = open(filename, 'w')
+
+        self.outfile = chunkedSink(outfile, chunkSize)
+
+    # Adds all the classes contained in the dictionary to the file
+    def addClass (self, child, parentList):
+        """Writes all the classes contained in the dictionary to the file
+
+        Input:
+            child: The cui-name of the current child being written to the file
+            parentList: List of parents of the child passed in
+        """
+
+        # Add comment header and Class entry
+        entry = ['    <!-- {0}#{1} -->\n\n' \
+                 '    <owl:Class rdf:about="{0}#{1}">\n'.format(self.iri, \
+                                                                child)]
+
+        # Add each parent to the child class
+        for parent in parentList:
+            if parent == 'none':
+                continue
+            entry.append('        <rdfs:subClassOf rdf:resource="{}#{}"/>\n'.\
+                         format(self.iri, parent))
+
+        # End class definition
+        entry.append('    </owl:Class>\n\n\n\n')
+
+        self.outfile.write(''.join(entry))
+
+    # Indents either a passed number of spaces, or 4 as default
+    def indent(self, count=4):
+        """Indents either a passed in number of spaces, or 4 as default
+
+        Input:
+            count: [Optional] Number of spaces to indent by. Default is 4.
+
+        """
+
+        self.outfile.write(" " * count)
+
+
+# Returns a cui-name encoded for use as the fragment of an IRI
+def iriFragment(name):
+    """Returns the name with every character that may not appear in an IRI
+    fragment (such as '>', '"', '\\', spaces or non-ASCII characters)
+    percent-encoded as UTF-8, as N-Triples and Turtle IRIs require.
+
+    Input:
+        name: The cui-name to encode
+    """
+
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+
+    return urllib.quote(name, IRISAFE)
+
+
+class nTriplesOntology(streamingOntology):
+    """Class for writing the hierarchy as N-Triples, one rdf:type owl:Class
+    triple per class and one rdfs:subClassOf triple per relationship"""
+
+    # Headers not used by N-Triples
+    def version(self, version):
+        pass
+
+    def doctype(self):
+        pass
+
+    def classes(self):
+        pass
+
+    # Write the ontology declaration
+    def rdfHeader(self, ontologyIRI):
+        """Writes the triple declaring the ontology.
+
+        Input:
+            ontologyIRI: The IRI of the ontology being constructed
+        """
+
+        self.iri = ontologyIRI
+        self.outfile.write("<{}> <{}> <{}> .\n".format(ontologyIRI, RDFTYPE, \
+                                                      OWLONTOLOGY))
+
+    # Adds a class and its relationships to the file
+    def addClass(self, child, parentList):
+        """Writes the triples describing a class and its parents
+
+        Input:
+            child: The cui-name of the current child being written to the file
+            parentList: List of parents of the child passed in
+        """
+
+        child = iriFragment(child)
+        entry = ["<{}#{}> <{}> <{}> .\n".format(self.iri, child, RDFTYPE, \
+                                               OWLCLASS)]
+
+        for parent in parentList:
+            if parent == 'none':
+                continue
+            entry.append("<{}#{}> <{}> <{}#{}> .\n".format(self.iri, child, \
+                         SUBCLASSOF, self.iri, iriFragment(parent)))
+
+        self.outfile.write(''.join(entry))
+
+    # Close the output file
+    def end(self):
+        """Closes the output file"""
+
+        self.outfile.close()
+
+
+class turtleOntology(nTriplesOntology):
+    """Class for writing the hierarchy as Turtle, one statement per class
+    listing all of its parents"""
+
+    # Write the prefixes and the ontology declaration
+    def rdfHeader(self, ontologyIRI):
+        """Writes the prefixes and the statement declaring the ontology.
+
+        Input:
+            ontologyIRI: The IRI of the ontology being constructed
+        """
+
+        self.iri = ontologyIRI
+        self.outfile.write(
+            '@prefix owl: <http://www.w3.org/2002/07/owl#> .\n' \
+            '@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n\n' \
+            '<{}> a owl:Ontology .\n\n'.format(ontologyIRI))
+
+    # Adds a class and its relationships to the file
+    def addClass(self, child, parentList):
+        """Writes the statement describing a class and its parents
+
+        Input:
+            child: The cui-name of the current child being written to the file
+            parentList: List of parents of the child passed in
+        """
+
+        child = iriFragment(child)
+        parents = ["<{}#{}>".format(self.iri, iriFragment(parent)) \
+                   for parent in parentList if parent != 'none']
+
+        if parents:
+            self.outfile.write("<{}#{}> a owl:Class ;\n    rdfs:subClassOf " \
+                "{} .\n".format(self.iri, child, " ,\n        ".join(parents)))
+        else:
+            self.outfile.write("<{}#{}> a owl:Class .\n".format(self.iri, \
+                                                                 child))
+
+
+class jsonLinesOntology(nTriplesOntology):
+    """Class for writing the hierarchy as JSON lines, one {"class", "parents"}
+    object per class"""
+
+    # Write the ontology declaration
+    def rdfHeader(self, ontologyIRI):
+        """Writes the object naming the ontology.
+
+        Input:
+            ontologyIRI: The IRI of the ontology being constructed
+        """
+
+        self.iri = ontologyIRI
+        self.outfile.write(json.dumps({"ontology": ontologyIRI}) + "\n")
+
+    # Adds a class and its relationships to the file
+    def addClass(self, child, parentList):
+        """Writes the object describing a class and its parents
+
+        Input:
+            child: The cui-name of the current child being written to the file
+            parentList: List of parents of the child passed in
+        """
+
+        # Same as json.dumps with sorted keys, without building the object
+        self.outfile.write('{{"class": {}, "parents": [{}]}}\n'.format(\
+            encode_basestring_ascii(child), ", ".join(\
+            encode_basestring_ascii(parent) for parent in parentList \
+            if parent != 'none')))
+
+
+# Output formats and the classes writing them. Each can also be written gzip
+# compressed by adding .gz to its name.
+OUTPUTFORMATS = {'owl': streamingOntology, 'nt': nTriplesOntology, \
+                 'ttl': turtleOntology, 'jsonl': jsonLinesOntology}
+
+
+# Returns the ontology object writing the output format
+def openOntology(filename, outputFormat='owl'):
+    """Returns an ontology object writing the hierarchy to filename in the
+    output format, one of OUTPUTFORMATS optionally followed by .gz.
+
+    Input:
+        filename: String naming the file to be used for saving the final
+                  hierarchy to.
+        outputFormat: [Optional] Name of the output format. Default is owl.
+    """
+
+    compressed = outputFormat.endswith('.gz')
+    if compressed:
+        outputFormat = outputFormat[:-len('.gz')]
+
+    return OUTPUTFORMATS[outputFormat](filename, compressed=compressed)
+
+
+# Returns whether an output format is supported
+def isOutputFormat(outputFormat):
+    """Returns True if outputFormat names a supported output format.
+
+    Input:
+        outputFormat: Name of the output format
+    """
+
+    if outputFormat.endswith('.gz'):
+        outputFormat = outputFormat[:-len('.gz')]
+
+    return outputFormat in OUTPUTFORMATS
+
+
+class chunkedSink:
+    """File-like object collecting the strings written to it and writing
+    them to the underlying file in chunks of at least chunkSize characters"""
+
+    # Initialize the sink with the file to write to
+    def __init__(self, outfile, chunkSize=CHUNKSIZE):
+        """Initialize the sink.
+
+        Input:
+            outfile: The open file the chunks are written to
+            chunkSize: [Optional] Number of characters collected before
+                       writing to the file.
+        """
+
+        self.outfile = outfile
+        self.chunkSize = chunkSize
+        self.pending = []
+        self.pendingSize = 0
+
+    # Collects a string, writing the collected strings once a chunk is full
+    def write(self, text):
+        """Collects the string to be written.
+
+        Input:
+            text: The string to write
+        """
+
+        self.pending.append(text)
+        self.pendingSize += len(text)
+
+        if self.pendingSize >= self.chunkSize:
+            self.flush()
+
+    # Writes the collected strings to the file
+    def flush(self):
+        """Writes the collected strings to the file as a single chunk"""
+
+        self.outfile.write(''.join(self.pending))
+        self.pending = []
+        self.pendingSize = 0
+
+    # Writes the remaining strings and closes the file
+    def close(self):
+        """Writes the remaining strings and closes the file"""
+
+        self.flush()
+        self.outfile.close()
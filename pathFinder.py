@@ -0,0 +1,377 @@
+"""Supplementary file containing the functions finding the shortest pathway
+between two CUIs of the UMLS, or every pathway between them in an ancestor
+graph gathered once and searched in memory
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from collections import defaultdict, deque
+from heapq import heappush, heappop
+from relationHarvester import chunked, DEFAULTCHUNKSIZE
+
+# CONSTANT DEFINITIONS
+DEFAULTMAXDEPTH = 50 # Most relationships a pathway found may hold
+DEFAULTMAXPATHS = 100 # Most pathways enumerated
+
+
+# Finds the shortest pathway from a CUI up to one of its ancestors
+def findShortestPath(leafCui, rootCui, dataSource, maxDepth=DEFAULTMAXDEPTH, \
+                     chunkSize=DEFAULTCHUNKSIZE, logFile=None):
+    """Returns the shortest list of CUIs leading from leafCui up to rootCui,
+    each CUI being a child of the next one, or None if rootCui is not an
+    ancestor of leafCui within maxDepth relationships.
+
+    The search is a breadth first search run from both ends at once: upward
+    from leafCui through the parents of each CUI and downward from rootCui
+    through its children. Each step expands the smaller of the two frontiers
+    by a whole level, looking up the relationships of the frontier a chunk of
+    CUIs at a time, and the search ends on the first level reaching a CUI the
+    other side has already reached.
+
+    Input:
+        leafCui: The CUI the pathway starts from
+        rootCui: The CUI the pathway leads up to
+        dataSource: Data source answering parentRelations and childRelations
+        maxDepth: [Optional] Most relationships the pathway may hold
+        chunkSize: [Optional] Maximum number of CUIs per query
+        logFile: [Optional] File the size of each level is written to
+    """
+
+    if leafCui == rootCui:
+        return [leafCui]
+
+    # CUI each reached CUI was reached from, on either side
+    upward = {leafCui: None}
+    downward = {rootCui: None}
+    upFrontier = [leafCui]
+    downFrontier = [rootCui]
+    depth = 0
+
+    while upFrontier and downFrontier and depth < maxDepth:
+        if len(upFrontier) <= len(downFrontier):
+            upFrontier = expandFrontier(upFrontier, upward, \
+                dataSource.parentRelations, 2, 0, chunkSize)
+            frontier, reached = upFrontier, downward
+            direction = "up"
+        else:
+            downFrontier = expandFrontier(downFrontier, downward, \
+                dataSource.childRelations, 0, 2, chunkSize)
+            frontier, reached = downFrontier, upward
+            direction = "down"
+
+        depth += 1
+
+        if logFile is not None:
+            logFile.write("Level {} ({}): {} CUI(s) reached\n".format(depth, \
+                          direction, len(frontier)))
+
+        # Every CUI met on the first level the sides meet is on a shortest
+        # pathway, since the sides did not meet on the level before
+        for cui in frontier:
+            if cui in reached:
+                return joinPath(cui, upward, downward)
+
+    return None
+
+
+# Expands a frontier of the search by one level
+def expandFrontier(frontier, reached, lookup, fromColumn, toColumn, \
+                   chunkSize):
+    """Looks up the relationships of the CUIs of the frontier, records the
+    CUIs they lead to that were not reached before in reached and returns the
+    list of those CUIs, the next frontier.
+
+    Input:
+        frontier: List of the CUIs reached on the last level
+        reached: Dictionary of the CUI each reached CUI was reached from
+        lookup: Function returning the rows describing the relationships of
+                a list of CUIs
+        fromColumn: Column of the rows holding the CUI of the frontier
+        toColumn: Column of the rows holding the CUI it leads to
+        chunkSize: Maximum number of CUIs per query
+    """
+
+    nextFrontier = []
+
+    # The rows of each query are read in full before the next query is made
+    for chunk in chunked(frontier, chunkSize):
+        for row in lookup(chunk):
+            cui = row[toColumn]
+            if cui not in reached:
+                reached[cui] = row[fromColumn]
+                nextFrontier.append(cui)
+
+    return nextFrontier
+
+
+# Joins the two halves of a pathway
+def joinPath(meeting, upward, downward):
+    """Returns the pathway from the leaf CUI up to the root CUI going through
+    the CUI where both sides of the search met.
+
+    Input:
+        meeting: The CUI reached from both sides
+        upward: Dictionary of the child each CUI was reached from
+        downward: Dictionary of the parent each CUI was reached from
+    """
+
+    path = []
+    cui = meeting
+    while cui is not None:
+        path.append(cui)
+        cui = upward[cui]
+    path.reverse()
+
+    cui = downward[meeting]
+    while cui is not None:
+        path.append(cui)
+        cui = downward[cui]
+
+    return path
+
+
+# Gathers the ancestors of a CUI once, for searching in memory
+def fetchAncestorGraph(leafCui, rootCui, dataSource, maxDepth=DEFAULTMAXDEPTH, \
+                       chunkSize=DEFAULTCHUNKSIZE):
+    """Returns (parents, queryCount), where parents is the dictionary of the
+    list of parents of each ancestor of leafCui up to maxDepth levels above
+    it, and queryCount is the number of queries made. The ancestors are
+    looked up a level at a time, chunkSize CUIs per query, and the parents of
+    rootCui are not looked up since no pathway goes past it.
+
+    Input:
+        leafCui: The CUI the pathways start from
+        rootCui: The CUI the pathways lead up to
+        dataSource: Data source answering parentRelations
+        maxDepth: [Optional] Number of levels of ancestors gathered
+        chunkSize: [Optional] Maximum number of CUIs per query
+    """
+
+    parents = dict()
+    reached = set([leafCui])
+    frontier = [leafCui]
+    queryCount = 0
+    depth = 0
+
+    while frontier and depth < maxDepth and leafCui != rootCui:
+        nextFrontier = []
+
+        for chunk in chunked(frontier, chunkSize):
+            queryCount += 1
+
+            for row in dataSource.parentRelations(chunk):
+                parent = row[0]
+                cuiParents = parents.setdefault(row[2], [])
+                if parent not in cuiParents:
+                    cuiParents.append(parent)
+
+                if parent not in reached and parent != rootCui:
+                    reached.add(parent)
+                    nextFrontier.append(parent)
+
+        frontier = nextFrontier
+        depth += 1
+
+    return parents, queryCount
+
+
+# Keeps the part of an ancestor graph leading up to a CUI
+def pruneToRoot(parents, rootCui):
+    """Returns the dictionary of the list of parents of each CUI of parents
+    from which rootCui can be reached, keeping only those parents from which
+    it can be reached too, so searches never enter a dead end.
+
+    Input:
+        parents: Dictionary of the list of parents of each CUI
+        rootCui: The CUI the pathways lead up to
+    """
+
+    children = defaultdict(list)
+    for cui, cuiParents in parents.items():
+        for parent in cuiParents:
+            children[parent].append(cui)
+
+    # Walk down from the root to every CUI it is an ancestor of
+    reaching = set([rootCui])
+    queue = [rootCui]
+    for cui in queue:
+        for child in children.get(cui, ()):
+            if child not in reaching:
+                reaching.add(child)
+                queue.append(child)
+
+    return dict((cui, [parent for parent in cuiParents \
+                       if parent in reaching]) \
+                for cui, cuiParents in parents.items() \
+                if cui in reaching and cui != rootCui)
+
+
+# Enumerates the pathways between two CUIs of an ancestor graph
+def findAllPaths(parents, leafCui, rootCui, maxPaths=DEFAULTMAXPATHS):
+    """Returns the list of the pathways from leafCui up to rootCui that do
+    not go through a CUI twice, shortest first. When there are maxPaths
+    pathways or more, the maxPaths shortest are returned, found with
+    findShortestPaths.
+
+    Input:
+        parents: Dictionary of the list of parents of each CUI, as returned
+                 by pruneToRoot
+        leafCui: The CUI the pathways start from
+        rootCui: The CUI the pathways lead up to
+        maxPaths: [Optional] Most pathways returned
+    """
+
+    if leafCui == rootCui:
+        return [[leafCui]]
+
+    paths = []
+    path = [leafCui]
+    onPath = set(path)
+
+    # Each entry of the stack holds the parents of a CUI of the pathway left
+    # to search
+    stack = [iter(parents.get(leafCui, ()))]
+
+    while stack and len(paths) < maxPaths:
+        for parent in stack[-1]:
+            if parent in onPath:
+                continue
+
+            if parent == rootCui:
+                paths.append(path + [parent])
+                if len(paths) == maxPaths:
+                    break
+                continue
+
+            path.append(parent)
+            onPath.add(parent)
+            stack.append(iter(parents.get(parent, ())))
+            break
+
+        # Every parent searched
+        else:
+            stack.pop()
+            onPath.discard(path.pop())
+
+    # The search stopped at the first maxPaths pathways it reached, which
+    # need not be the shortest
+    if len(paths) == maxPaths:
+        return findShortestPaths(parents, leafCui, rootCui, maxPaths)
+
+    paths.sort(key=len)
+
+    return paths
+
+
+# Finds the k shortest pathways between two CUIs of an ancestor graph
+def findShortestPaths(parents, leafCui, rootCui, k):
+    """Returns the list of the k shortest pathways from leafCui up to rootCui
+    that do not go through a CUI twice, shortest first, using Yen's
+    algorithm. Fewer are returned when there are fewer pathways.
+
+    Input:
+        parents: Dictionary of the list of parents of each CUI, as returned
+                 by pruneToRoot
+        leafCui: The CUI the pathways start from
+        rootCui: The CUI the pathways lead up to
+        k: Number of pathways wanted
+    """
+
+    first = searchGraph(parents, leafCui, rootCui, set(), set())
+    if first is None or k < 1:
+        return []
+
+    paths = [first]
+    candidates = [] # Heap of the (length, pathway) of the pathways in reserve
+    seen = set([tuple(first)])
+
+    while len(paths) < k:
+        previous = paths[-1]
+
+        # Branch off the last pathway found at each of its CUIs in turn
+        for index in range(len(previous) - 1):
+            spurCui = previous[index]
+            rootPath = previous[:index + 1]
+
+            removedEdges = set((path[index], path[index + 1]) \
+                               for path in paths \
+                               if path[:index + 1] == rootPath)
+            removedCuis = set(rootPath[:-1])
+
+            spurPath = searchGraph(parents, spurCui, rootCui, removedCuis, \
+                                   removedEdges)
+            if spurPath is None:
+                continue
+
+            candidate = rootPath[:-1] + spurPath
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heappush(candidates, (len(candidate), candidate))
+
+        if not candidates:
+            break
+
+        paths.append(heappop(candidates)[1])
+
+    return paths
+
+
+# Finds the shortest pathway in an ancestor graph
+def searchGraph(parents, leafCui, rootCui, removedCuis, removedEdges):
+    """Returns the shortest pathway from leafCui up to rootCui in the
+    ancestor graph that avoids the removed CUIs and relationships, or None.
+
+    Input:
+        parents: Dictionary of the list of parents of each CUI
+        leafCui: The CUI the pathway starts from
+        rootCui: The CUI the pathway leads up to
+        removedCuis: Set of the CUIs the pathway may not go through
+        removedEdges: Set of the (child, parent) relationships the pathway
+                      may not hold
+    """
+
+    upward = {leafCui: None}
+    queue = deque([leafCui])
+
+    while queue:
+        cui = queue.popleft()
+        if cui == rootCui:
+            path = []
+            while cui is not None:
+                path.append(cui)
+                cui = upward[cui]
+            path.reverse()
+            return path
+
+        for parent in parents.get(cui, ()):
+            if parent not in upward and parent not in removedCuis and \
+                    (cui, parent) not in removedEdges:
+                upward[parent] = cui
+                queue.append(parent)
+
+    return None
@@ -0,0 +1,342 @@
+"""Supplementary file containing functions for gathering the relationships
+relevant to a set of input CUIs from the UMLS
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+import Queue
+import sys
+
+# CONSTANT DEFINITIONS
+DEFAULTCHUNKSIZE = 500 # Number of CUIs placed in a single CUI2 IN (...) query
+HARVESTMODES = ('serial', 'batched', 'concurrent') # Values of harvestMode
+
+
+# Gathers relationships by querying one CUI at a time
+def harvestRelations(parentList, topTier, relationsDict, dataSource):
+    """Gathers the relationships relevant to the CUIs in parentList by
+    querying the parents of one CUI at a time until the top level concepts are
+    reached. Returns the number of queries issued.
+
+    Input:
+        parentList: List of CUIs to gather the parents of. Consumed while
+                    harvesting.
+        topTier: Set containing the top level CUIs. Their parents are not
+                 gathered.
+        relationsDict: conceptGraph to save the relationships in. Output
+                       parameter.
+        dataSource: The data source used for looking up relationships
+    """
+
+    # Tracks the parent CUIs processed (considered to be children
+    # post-processing). Prevents processing CUIs already handled
+    childrenSet = set()
+    queryCount = 0
+
+    while parentList:
+        # Obtain CUI of poppedParent to query parents
+        pParent = parentList.pop(0)
+
+        rows = dataSource.parentRelations([pParent])
+        queryCount += 1
+
+        # Add popped Parent (now a child) to the Child set
+        childrenSet.add(pParent)
+
+        addRelations(rows, topTier, relationsDict, childrenSet, parentList)
+
+    return queryCount
+
+
+# Gathers relationships by querying a whole level of CUIs at a time
+def harvestRelationsBatched(parentList, topTier, relationsDict, dataSource, \
+                            chunkSize=DEFAULTCHUNKSIZE):
+    """Gathers the relationships relevant to the CUIs in parentList by
+    querying the parents of every CUI in the current frontier with CUI2 IN
+    (...) queries of up to chunkSize CUIs. Produces the same relationsDict as
+    harvestRelations. Returns the number of queries issued.
+
+    Input:
+        parentList: List of CUIs to gather the parents of.
+        topTier: Set containing the top level CUIs. Their parents are not
+                 gathered.
+        relationsDict: conceptGraph to save the relationships in. Output
+                       parameter.
+        dataSource: The data source used for looking up relationships
+        chunkSize: [Optional] Maximum number of CUIs per query.
+    """
+
+    # Query the chunks of the frontier one after the other, each query's rows
+    # being consumed before the next one is issued
+    def queryFrontier(frontier):
+        for chunk in chunked(frontier, chunkSize):
+            yield dataSource.parentRelations(chunk)
+
+    return harvestLevels(parentList, topTier, relationsDict, queryFrontier)
+
+
+# Gathers relationships by querying the chunks of a level concurrently
+def harvestRelationsConcurrent(parentList, topTier, relationsDict, \
+                               dataSources, chunkSize=DEFAULTCHUNKSIZE):
+    """Gathers the relationships relevant to the CUIs in parentList like
+    harvestRelationsBatched, but splits each frontier into at least one chunk
+    per data source and queries the chunks concurrently, each thread using
+    one of the data sources at a time. The rows are merged in frontier order,
+    so the same relationsDict as harvestRelations is produced. Returns the
+    number of queries issued.
+
+    Input:
+        parentList: List of CUIs to gather the parents of.
+        topTier: Set containing the top level CUIs. Their parents are not
+                 gathered.
+        relationsDict: conceptGraph to save the relationships in. Output
+                       parameter.
+        dataSources: List of the data sources used for looking up
+                     relationships, usually separate database connections
+        chunkSize: [Optional] Maximum number of CUIs per query.
+    """
+
+    # Data sources not in use by a thread
+    idleSources = Queue.Queue()
+    for dataSource in dataSources:
+        idleSources.put(dataSource)
+
+    # Query a chunk with the first idle data source. A data source exiting on
+    # a failed query is reported as None since the pool only passes
+    # exceptions on
+    def queryChunk(chunk):
+        dataSource = idleSources.get()
+        try:
+            return list(dataSource.parentRelations(chunk))
+        except SystemExit:
+            return None
+        finally:
+            idleSources.put(dataSource)
+
+    # Query the chunks of the frontier concurrently, keeping them in order
+    def queryFrontier(frontier):
+        size = min(chunkSize, -(-len(frontier) // len(dataSources)))
+        results = threadPool.map(queryChunk, chunked(frontier, size))
+
+        if None in results:
+            sys.exit()
+
+        return results
+
+    threadPool = ThreadPool(len(dataSources))
+    try:
+        return harvestLevels(parentList, topTier, relationsDict, queryFrontier)
+    finally:
+        threadPool.close()
+        threadPool.join()
+
+
+# Gathers relationships one level of CUIs at a time
+def harvestLevels(parentList, topTier, relationsDict, queryFrontier):
+    """Gathers the relationships relevant to the CUIs in parentList one
+    frontier of unprocessed CUIs at a time, processing the rows of the
+    frontier in queue order so the children lists are built in the same order
+    as the serial harvest. Returns the number of queries issued.
+
+    Input:
+        parentList: List of CUIs to gather the parents of.
+        topTier: Set containing the top level CUIs
+        relationsDict: conceptGraph to save the relationships in. Output
+                       parameter.
+        queryFrontier: Function returning, or yielding, the rows of each
+                       query issued for the parents of a frontier
+    """
+
+    childrenSet = set()
+    queryCount = 0
+
+    frontier = unprocessed(parentList, childrenSet)
+
+    while frontier:
+        # Gather the rows of the whole frontier, grouped by child CUI
+        rowsByChild = defaultdict(list)
+        for rows in queryFrontier(frontier):
+            queryCount += 1
+            for row in rows:
+                rowsByChild[row[2]].append(row)
+
+        childrenSet.update(frontier)
+
+        # Process the frontier in queue order
+        nextLevel = []
+        for cui in frontier:
+            addRelations(rowsByChild[cui], topTier, relationsDict, \
+                         childrenSet, nextLevel)
+
+        frontier = unprocessed(nextLevel, childrenSet)
+
+    return queryCount
+
+
+# Splits a list of CUIs into chunks
+def chunked(cuiList, chunkSize):
+    """Returns the list of the consecutive chunks of up to chunkSize CUIs of
+    cuiList.
+
+    Input:
+        cuiList: List of CUIs to split
+        chunkSize: Maximum number of CUIs per chunk
+    """
+
+    return [cuiList[start:start + chunkSize] \
+            for start in range(0, len(cuiList), chunkSize)]
+
+
+# Adds the relationships in the query results to the relationsDict
+def addRelations(rows, topTier, relationsDict, childrenSet, parentList):
+    """Adds the relationships contained in the MRREL rows to the relationsDict
+    and queues the parents that still need to be processed. The inactive
+    relationships are already discarded by the relationship filter of the
+    data source.
+
+    Input:
+        rows: List of (CUI1, REL, CUI2, SAB, SUPPRESS) tuples
+        topTier: Set containing the top level CUIs
+        relationsDict: conceptGraph to save the relationships in
+        childrenSet: Set of the CUIs already processed
+        parentList: List of the CUIs left to process. Output parameter.
+    """
+
+    for cui1, rel, cui2, sab, suppress in rows:
+        # Add the relationship to the Relationship Graph
+        relationsDict.addRelation(cui1, cui2)
+
+        # Check if the parent is a top level concept, if it is continue to the
+        # next row
+        if cui1 in topTier:
+            continue
+
+        # Queue the potential parent if it is not already in the forest
+        if cui1 not in childrenSet:
+            parentList.append(cui1)
+
+
+# Returns the CUIs of a queue that have not been processed yet
+def unprocessed(parentList, childrenSet):
+    """Returns the CUIs in parentList that are not in childrenSet, in queue
+    order and without duplicates.
+
+    Input:
+        parentList: List of queued CUIs
+        childrenSet: Set of the CUIs already processed
+    """
+
+    seen = set()
+    frontier = []
+
+    for cui in parentList:
+        if cui not in seen and cui not in childrenSet:
+            seen.add(cui)
+            frontier.append(cui)
+
+    return frontier
+
+
+class harvestCache:
+    """Data source remembering the parent relationships of every CUI looked
+    up, so that later harvests only query the CUIs not looked up before.
+    Harvesting through it produces the same relationsDict as harvesting from
+    the data source directly. The child relationships looked up through it
+    are remembered the same way."""
+
+    # Initialize the cache with the data source and the rows already known
+    def __init__(self, dataSource, parentRows=None):
+        """Initialize the harvest cache.
+
+        Input:
+            dataSource: The data source used for looking up relationships
+            parentRows: [Optional] Dictionary of the rows describing the
+                        parents of each CUI already looked up.
+        """
+
+        self.dataSource = dataSource
+        if parentRows is None:
+            parentRows = dict()
+        self.parentRows = parentRows
+        self.childRows = dict() # Rows describing the children of each CUI
+        self.queryCount = 0 # Number of queries passed on to the data source
+        self.hits = 0 # Number of CUIs answered from the cache
+
+    # Returns the relationships to the parents of the CUIs
+    def parentRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        parents of the CUIs in cuiList, querying the data source for the CUIs
+        not looked up before.
+
+        Input:
+            cuiList: List of the child CUIs
+        """
+
+        missing = [cui for cui in cuiList if cui not in self.parentRows]
+        self.hits += len(cuiList) - len(missing)
+
+        if missing:
+            fetched = dict((cui, []) for cui in missing)
+            for row in self.dataSource.parentRelations(missing):
+                fetched[row[2]].append(tuple(row))
+            self.queryCount += 1
+            self.parentRows.update(fetched)
+
+        rows = []
+        for cui in cuiList:
+            rows.extend(self.parentRows[cui])
+
+        return rows
+
+    # Returns the relationships to the children of the CUIs
+    def childRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        children of the CUIs in cuiList, querying the data source for the CUIs
+        not looked up before.
+
+        Input:
+            cuiList: List of the parent CUIs
+        """
+
+        missing = [cui for cui in cuiList if cui not in self.childRows]
+        self.hits += len(cuiList) - len(missing)
+
+        if missing:
+            fetched = dict((cui, []) for cui in missing)
+            for row in self.dataSource.childRelations(missing):
+                fetched[row[0]].append(tuple(row))
+            self.queryCount += 1
+            self.childRows.update(fetched)
+
+        rows = []
+        for cui in cuiList:
+            rows.extend(self.childRows[cui])
+
+        return rows
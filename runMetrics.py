@@ -0,0 +1,300 @@
+"""Supplementary file containing the runMetrics class recording the time,
+memory and work of each stage of a run
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from datetime import datetime
+import cProfile
+import json
+import os
+import sys
+import threading
+
+# resource is only available on Unix systems
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Returns the peak resident set size of the process
+def peakMemory():
+    """Returns the largest resident set size of the process so far in bytes,
+    or None when the system does not report it."""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on Mac OS X and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak
+
+    return peak * 1024
+
+
+class runMetrics:
+    """Records the time taken and peak memory of each stage of a run, along
+    with counters and values describing the work done, and writes them to a
+    JSON metrics file. When a profile directory is given, each stage is also
+    run under cProfile and its statistics are dumped to <stage>.prof in the
+    directory."""
+
+    # Initialize the metrics of a run
+    def __init__(self, metricsFile='', profileDirectory=''):
+        """Initialize the metrics.
+
+        Input:
+            metricsFile: [Optional] String naming the JSON file the metrics
+                         are written to. Nothing is written when empty.
+            profileDirectory: [Optional] String naming the directory the
+                              cProfile statistics of each stage are dumped
+                              to, created if it does not exist. Stages are
+                              not profiled when empty.
+        """
+
+        self.metricsFile = metricsFile
+        self.profileDirectory = profileDirectory
+
+        if profileDirectory and not os.path.isdir(profileDirectory):
+            os.makedirs(profileDirectory)
+        self.started = datetime.now()
+
+        self.stages = [] # Name, time taken and peak memory of each stage
+        self.counters = dict() # Counts added to while the run progresses
+        self.values = dict() # Values describing the run
+        self.lock = threading.Lock() # Counters are added to by threads
+
+        self.stage = None # Name of the stage in progress
+        self.stageStart = None
+        self.profile = None
+
+    # Checks whether the metrics are written
+    def isEnabled(self):
+        """Returns True if the metrics are written to a metrics file"""
+
+        return bool(self.metricsFile)
+
+    # Starts the next stage of the run
+    def beginStage(self, name):
+        """Ends the stage in progress, if any, and starts timing (and
+        profiling) the stage called name.
+
+        Input:
+            name: The name of the stage
+        """
+
+        self.endStage()
+
+        self.stage = name
+        self.stageStart = datetime.now()
+
+        if self.profileDirectory:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    # Ends the stage in progress
+    def endStage(self):
+        """Records the time taken by the stage in progress and the peak memory
+        reached so far, and dumps its profile statistics."""
+
+        if self.stage is None:
+            return
+
+        elapsed = datetime.now() - self.stageStart
+
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(os.path.join(self.profileDirectory, \
+                                                 self.stage + ".prof"))
+            self.profile = None
+
+        self.stages.append({'name': self.stage, \
+                            'seconds': elapsed.total_seconds(), \
+                            'peakMemoryBytes': peakMemory()})
+        self.stage = None
+
+    # Adds to a counter
+    def count(self, name, amount=1):
+        """Adds amount to the counter called name.
+
+        Input:
+            name: The name of the counter
+            amount: [Optional] The amount to add
+        """
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Records a value describing the run
+    def record(self, name, value):
+        """Records a value describing the run, replacing any value recorded
+        with the same name. The value must be serializable as JSON.
+
+        Input:
+            name: The name of the value
+            value: The value
+        """
+
+        self.values[name] = value
+
+    # Wraps a data source to count its lookups
+    def meter(self, dataSource):
+        """Returns a meteredSource counting the lookups of the data source
+        when the metrics are written, the data source itself otherwise.
+
+        Input:
+            dataSource: The data source to count the lookups of
+        """
+
+        if not self.isEnabled():
+            return dataSource
+
+        return meteredSource(dataSource, self)
+
+    # Writes the metrics file
+    def write(self):
+        """Ends the stage in progress and writes the metrics to the metrics
+        file, if any. Returns the dictionary of metrics."""
+
+        self.endStage()
+
+        metrics = {'started': self.started.isoformat(), \
+                   'totalSeconds': \
+                        (datetime.now() - self.started).total_seconds(), \
+                   'peakMemoryBytes': peakMemory(), \
+                   'stages': self.stages, \
+                   'counters': self.counters, \
+                   'values': self.values}
+
+        if self.metricsFile:
+            metricsFile = open(self.metricsFile, 'w')
+            json.dump(metrics, metricsFile, indent=2, sort_keys=True, \
+                      separators=(',', ': '))
+            metricsFile.write("\n")
+            metricsFile.close()
+
+        return metrics
+
+
+class meteredSource:
+    """Data source passing lookups on to another data source, counting the
+    queries made and rows returned in a runMetrics. Relationship rows are
+    counted as they are consumed, so streamed rows stay streamed."""
+
+    # Initialize the data source with the data source it passes lookups to
+    def __init__(self, dataSource, metrics):
+        """Initialize the metered data source.
+
+        Input:
+            dataSource: The data source answering the lookups
+            metrics: The runMetrics counting the lookups
+        """
+
+        self.dataSource = dataSource
+        self.metrics = metrics
+
+    # Returns the relationships to the parents of the CUIs
+    def parentRelations(self, cuiList):
+        """Returns the rows describing the parents of the CUIs in cuiList,
+        counting the query and the rows.
+
+        Input:
+            cuiList: List of the child CUIs
+        """
+
+        self.metrics.count('parentQueries')
+        return self.countRows(self.dataSource.parentRelations(cuiList), \
+                              'parentRows')
+
+    # Returns the relationships to the children of the CUIs
+    def childRelations(self, cuiList):
+        """Returns the rows describing the children of the CUIs in cuiList,
+        counting the query and the rows.
+
+        Input:
+            cuiList: List of the parent CUIs
+        """
+
+        self.metrics.count('childQueries')
+        return self.countRows(self.dataSource.childRelations(cuiList), \
+                              'childRows')
+
+    # Returns the names of a CUI
+    def conceptNames(self, cui):
+        """Returns the rows describing the names of a CUI, counting the query
+        and the rows.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        rows = self.dataSource.conceptNames(cui)
+        self.metrics.count('nameQueries')
+        self.metrics.count('nameRows', len(rows))
+
+        return rows
+
+    # Returns the names of a chunk of CUIs
+    def conceptNamesBatch(self, cuiList):
+        """Returns the dictionary of the rows describing the names of each
+        CUI in cuiList, counting the query and the rows.
+
+        Input:
+            cuiList: List of the CUIs to look up
+        """
+
+        rowsByCui = self.dataSource.conceptNamesBatch(cuiList)
+        self.metrics.count('nameQueries')
+        self.metrics.count('nameRows', \
+                           sum(len(rows) for rows in rowsByCui.values()))
+
+        return rowsByCui
+
+    # Yields rows while counting them
+    def countRows(self, rows, name):
+        """Yields the rows, adding each one to the counter called name.
+
+        Input:
+            rows: Iterable of rows
+            name: The name of the counter
+        """
+
+        count = 0
+        try:
+            for row in rows:
+                count += 1
+                yield row
+        finally:
+            self.metrics.count(name, count)
+
+    # Pass any other attribute on to the data source
+    def __getattr__(self, name):
+        return getattr(self.dataSource, name)
@@ -0,0 +1,302 @@
+#!/usr/bin/python
+"""Generates a synthetic, SNOMED-like UMLS release that the program can be
+run and benchmarked on without a licensed UMLS installation.
+
+Usage: syntheticUMLS.py directory [--concepts=N] [--depth=N] [--branching=N]
+                        [--multiParentRate=R] [--cycleRate=R] [--inputRate=R]
+                        [--seed=N]
+
+Writes to directory:
+    MRREL.RRF:   The CHD and RN relationships of the hierarchy along with
+                 their PAR and RB inverses, inactive relationships and
+                 relationships of another vocabulary, in the MRREL columns
+                 read by the rrf data source (dataSource=rrf).
+    MRCONSO.RRF: The names of every concept, in the MRCONSO columns read by
+                 the rrf data source.
+    in.txt:      The input CUIs, a random inputRate of the concepts.
+    top.txt:     The top level CUI, the root of the hierarchy.
+
+The hierarchy grows breadth first from a single root. Every concept is given
+one to 2 * branching - 1 children (branching on average) until there are
+--concepts concepts or the concepts reach depth levels below the root. A
+multiParentRate of the concepts get a second parent on a level above theirs
+and a cycleRate of them become a parent of their own parent, closing a loop.
+The same options and seed always generate the same files.
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from collections import deque
+from random import Random
+import os
+import sys
+
+# CONSTANT DEFINITIONS
+SAB = 'SNOMEDCT_US'
+OTHERSAB = 'MTH' # Vocabulary of the relationships the program ignores
+NARROWERRATE = 0.1 # Part of the relationships given as RN instead of CHD
+INACTIVERATE = 0.01 # Inactive relationships added, per concept
+FOREIGNRATE = 0.2 # Part of the concepts given a Spanish name first
+SUPPRESSVALUES = ('O', 'Y', 'E') # SUPPRESS values of inactive relationships
+
+# Default value of each generator option
+DEFAULTOPTIONS = {'concepts': 10000, 'depth': 12, 'branching': 4,
+                  'multiParentRate': 0.3, 'cycleRate': 0.001,
+                  'inputRate': 0.1, 'seed': 1}
+
+
+# Returns the CUI of a concept number
+def cuiName(index):
+    """Returns the CUI of the concept number index.
+
+    Input:
+        index: The concept number, 0 being the root
+    """
+
+    return "C{:07d}".format(index + 1)
+
+
+# Generates the relationships of a synthetic hierarchy
+def generateHierarchy(concepts, depth, branching, multiParentRate, cycleRate, \
+                      random):
+    """Returns (conceptCount, relationships), where relationships is the list
+    of (parent, child) concept numbers of a hierarchy grown breadth first from
+    concept 0. The hierarchy may hold fewer than concepts concepts when depth
+    is reached first.
+
+    Input:
+        concepts: Maximum number of concepts
+        depth: Maximum number of levels below the root
+        branching: Average number of children of a concept
+        multiParentRate: Part of the concepts given a second parent
+        cycleRate: Part of the concepts made a parent of their parent
+        random: The Random generating the hierarchy
+    """
+
+    levels = [0] # Level of each concept
+    parents = [None] # First parent of each concept
+    relationships = []
+    queue = deque([0])
+
+    while queue and len(levels) < concepts:
+        parent = queue.popleft()
+        if levels[parent] >= depth:
+            continue
+
+        for count in range(random.randint(1, 2 * branching - 1)):
+            if len(levels) >= concepts:
+                break
+
+            child = len(levels)
+            levels.append(levels[parent] + 1)
+            parents.append(parent)
+            relationships.append((parent, child))
+            queue.append(child)
+
+    # Second parents, taken among the concepts on the levels above
+    for child in range(2, len(levels)):
+        if random.random() >= multiParentRate:
+            continue
+
+        other = random.randrange(child)
+        if levels[other] < levels[child] and other != parents[child]:
+            relationships.append((other, child))
+
+    # Loops closed by a concept being a parent of its own parent
+    for child in range(1, len(levels)):
+        if parents[child] != 0 and random.random() < cycleRate:
+            relationships.append((child, parents[child]))
+
+    return len(levels), relationships
+
+
+# Writes the relationships in MRREL.RRF format
+def writeMRREL(filename, conceptCount, relationships, random):
+    """Writes every relationship as a CHD (or RN) row and its PAR (or RB)
+    inverse, and adds inactive rows and rows of another vocabulary that the
+    program must ignore. Returns the number of rows written.
+
+    Input:
+        filename: String naming the file to write
+        conceptCount: Number of concepts
+        relationships: List of (parent, child) concept numbers
+        random: The Random choosing the relationship types and extra rows
+    """
+
+    rrfFile = open(filename, 'w')
+    rows = 0
+
+    # Writes a row relating CUI2 to CUI1 (CHD: CUI2 is a child of CUI1)
+    def writeRow(cui1, rel, cui2, sab, suppress):
+        rrfFile.write("{0}|A{1}|SCUI|{2}|{3}|A{4}|SCUI||R{5:08d}||{6}|{6}|0|" \
+            "Y|{7}||\n".format(cui1, cui1[1:], rel, cui2, cui2[1:], rows, \
+                                sab, suppress))
+
+    for parent, child in relationships:
+        if random.random() < NARROWERRATE:
+            rel, inverse = 'RN', 'RB'
+        else:
+            rel, inverse = 'CHD', 'PAR'
+
+        writeRow(cuiName(parent), rel, cuiName(child), SAB, 'N')
+        writeRow(cuiName(child), inverse, cuiName(parent), SAB, 'N')
+        rows += 2
+
+    # Relationships the program ignores
+    for count in range(int(conceptCount * INACTIVERATE)):
+        child = random.randrange(1, conceptCount)
+        parent = random.randrange(conceptCount)
+        writeRow(cuiName(parent), 'CHD', cuiName(child), SAB, \
+                 random.choice(SUPPRESSVALUES))
+        writeRow(cuiName(parent), 'CHD', cuiName(child), OTHERSAB, 'N')
+        rows += 2
+
+    rrfFile.close()
+    return rows
+
+
+# Writes the names of the concepts in MRCONSO.RRF format
+def writeMRCONSO(filename, conceptCount, random):
+    """Writes a fully specified name and a preferred term for every concept,
+    some of them preceded by a Spanish synonym. Returns the number of rows
+    written.
+
+    Input:
+        filename: String naming the file to write
+        conceptCount: Number of concepts
+        random: The Random choosing the concepts with a Spanish name
+    """
+
+    rrfFile = open(filename, 'w')
+    rows = 0
+
+    # Writes a name of a CUI
+    def writeRow(cui, language, tty, string):
+        rrfFile.write("{0}|{1}|P|L{2}|PF|S{2}|Y|A{2}||{3}||{4}|{5}|{3}|{6}|0|" \
+            "N||\n".format(cui, language, cui[1:], cui[1:], SAB, tty, string))
+
+    for index in range(conceptCount):
+        cui = cuiName(index)
+
+        if random.random() < FOREIGNRATE:
+            writeRow(cui, 'SPA', 'SY', "Concepto sintetico {}".format(index))
+            rows += 1
+
+        writeRow(cui, 'ENG', 'FN', "Synthetic concept {} (finding)".format(\
+            index))
+        writeRow(cui, 'ENG', 'PT', "Synthetic concept {}".format(index))
+        rows += 2
+
+    rrfFile.close()
+    return rows
+
+
+# Writes a file of CUIs, one per line
+def writeCuiFile(filename, cuis):
+    """Writes the CUIs to filename, one per line, like the input CUI and top
+    level tier files.
+
+    Input:
+        filename: String naming the file to write
+        cuis: List of CUIs
+    """
+
+    cuiFile = open(filename, 'w')
+    for cui in cuis:
+        cuiFile.write(cui + "\n")
+    cuiFile.close()
+
+
+# Generates a synthetic UMLS release in a directory
+def writeSyntheticUMLS(directory, options=None):
+    """Writes MRREL.RRF, MRCONSO.RRF, in.txt and top.txt to the directory
+    and returns a dictionary describing what was generated: the number of
+    concepts, relationships and rows and the input and top level CUIs.
+
+    Input:
+        directory: String naming the directory to write the files to
+        options: [Optional] Dictionary overriding the DEFAULTOPTIONS of the
+                 generator.
+    """
+
+    settings = dict(DEFAULTOPTIONS)
+    settings.update(options or {})
+    random = Random(int(settings['seed']))
+
+    conceptCount, relationships = generateHierarchy(\
+        int(settings['concepts']), int(settings['depth']), \
+        int(settings['branching']), float(settings['multiParentRate']), \
+        float(settings['cycleRate']), random)
+
+    relationRows = writeMRREL(os.path.join(directory, 'MRREL.RRF'), \
+                              conceptCount, relationships, random)
+    nameRows = writeMRCONSO(os.path.join(directory, 'MRCONSO.RRF'), \
+                            conceptCount, random)
+
+    inputCount = max(1, int(conceptCount * float(settings['inputRate'])))
+    leaves = [cuiName(index) for index in \
+              sorted(random.sample(range(1, conceptCount), \
+                                   min(inputCount, conceptCount - 1)))]
+    topTier = [cuiName(0)]
+
+    writeCuiFile(os.path.join(directory, 'in.txt'), leaves)
+    writeCuiFile(os.path.join(directory, 'top.txt'), topTier)
+
+    return {'concepts': conceptCount, 'relationships': len(relationships), \
+            'relationRows': relationRows, 'nameRows': nameRows, \
+            'leaves': leaves, 'topTier': topTier}
+
+
+# Generate the release when run as a script
+if __name__ == '__main__':
+    from hierarchyBuilder import extractOptions
+
+    arguments, options = extractOptions(sys.argv)
+
+    # Print usage message
+    if len(arguments) != 2 or arguments[1] == '-u':
+        print "Usage: syntheticUMLS.py directory [--concepts=N] [--depth=N] " \
+            "[--branching=N] [--multiParentRate=R] [--cycleRate=R] " \
+            "[--inputRate=R] [--seed=N]"
+        sys.exit()
+
+    for name in options:
+        if name not in DEFAULTOPTIONS:
+            print "\nError: unknown option --{}.".format(name)
+            sys.exit()
+
+    if not os.path.isdir(arguments[1]):
+        os.makedirs(arguments[1])
+
+    sys.stdout.write("Generating synthetic UMLS release in {} . . . ".format(\
+        arguments[1]))
+    generated = writeSyntheticUMLS(arguments[1], options)
+
+    print "Done! ({} concepts, {} relationships, {} input CUIs)".format(\
+        generated['concepts'], generated['relationships'], \
+        len(generated['leaves']))
@@ -0,0 +1,667 @@
+"""Supplementary file containing the data sources used for looking up
+relationships and concept names in the UMLS, either from a MySQL UMLS database
+or directly from the RRF files of a UMLS release
+
+This software is Copyright (c) 2014 The Regents of the University of California. All Rights Reserved.
+
+Permission to copy, modify, and distribute this software and its documentation for educational, research and non-profit purposes, without fee, and without a written agreement is hereby granted, provided that the above copyright notice, this paragraph and the following three paragraphs appear in all copies.
+
+Permission to make commercial use of this software may be obtained by contacting:
+
+    Technology Transfer Office
+    9500 Gilman Drive, Mail Code 0910
+    University of California
+    La Jolla, CA 92093-0910
+    (858) 534-5815
+    invent@ucsd.edu
+
+    This software program and documentation are copyrighted by The Regents of the University of California. The software program and documentation are supplied "as is", without any accompanying services from The Regents. The Regents does not warrant that the operation of the program will be uninterrupted or error-free. The end-user understands that the program was developed for research purposes and is advised not to rely exclusively on the program for any reason.
+
+    IN NO EVENT SHALL THE UNIVERSITY OF CALIFORNIA BE LIABLE TO
+    ANY PARTY FOR DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR
+    CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING
+    OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+    EVEN IF THE UNIVERSITY OF CALIFORNIA HAS BEEN ADVISED OF
+    THE POSSIBILITY OF SUCH DAMAGE. THE UNIVERSITY OF
+    CALIFORNIA SPECIFICALLY DISCLAIMS ANY WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+    MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE.
+    THE SOFTWARE PROVIDED HEREUNDER IS ON AN "AS IS" BASIS, AND THE UNIVERSITY OF CALIFORNIA HAS NO OBLIGATIONS TO
+    PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+    MODIFICATIONS.
+"""
+from collections import defaultdict
+from graphSnapshot import snapshotSource, snapshotFileName
+import os
+import sys
+
+# MySQLdb is only required when reading from a MySQL UMLS database
+try:
+    import MySQLdb
+except ImportError:
+    MySQLdb = None
+
+# CONSTANT DEFINITIONS
+RELATIONTYPES = ('RN', 'CHD') # Relationship types connecting a child to a parent
+DEFAULTFETCHSIZE = 1000 # Number of rows fetched at a time by streaming cursors
+
+# Column positions in MRREL.RRF
+MRREL_CUI1 = 0
+MRREL_REL = 3
+MRREL_CUI2 = 4
+MRREL_SAB = 10
+MRREL_SUPPRESS = 14
+
+# Column positions in MRCONSO.RRF
+MRCONSO_CUI = 0
+MRCONSO_LAT = 1
+MRCONSO_TTY = 12
+MRCONSO_STR = 14
+
+# Query gathering the relationships meeting the conditions
+RELATIONQUERY = "SELECT CUI1, REL, CUI2, SAB, SUPPRESS from MRREL where {}"
+
+# Query gathering the names of a CUI
+NAMEQUERY = "SELECT TTY, STR, LAT from MRCONSO where CUI = %s"
+
+# Query gathering the names of a chunk of CUIs
+BATCHNAMEQUERY = "SELECT CUI, TTY, STR, LAT from MRCONSO where {}"
+
+# Default sources, types and suppressed values of the relationship filters
+FILTERDEFAULTS = {'relation': ('SNOMEDCT_US', 'RN,CHD', 'O,Y,E'),
+                  'connection': ('MTH', 'RN,CHD', '')}
+
+
+class relationFilter:
+    """Selects the MRREL relationships looked up by a data source: those of
+    one of the source vocabularies, with one of the relationship types and a
+    SUPPRESS value that is not one of the suppressed values. The relationship
+    types must relate a child (CUI2) to a parent (CUI1), like RN and CHD. The
+    filter is compiled into the conditions of the relationship queries, so
+    that the database discards the other rows."""
+
+    # Initialize the filter with the values of the rows kept
+    def __init__(self, sources, relationTypes=RELATIONTYPES, suppressed=()):
+        """Initialize the relationship filter.
+
+        Input:
+            sources: List of the source vocabularies (SAB) kept
+            relationTypes: [Optional] List of the relationship types (REL)
+                           kept.
+            suppressed: [Optional] List of the SUPPRESS values discarded.
+        """
+
+        self.sources = tuple(sources)
+        self.relationTypes = tuple(relationTypes)
+        self.suppressed = tuple(suppressed)
+
+    # Returns the name of the relationships kept
+    def name(self):
+        """Returns the source vocabularies joined by '+', naming the
+        relationships kept in file names and messages"""
+
+        return '+'.join(self.sources)
+
+    # Returns a description of every setting of the filter
+    def signature(self):
+        """Returns a string describing the sources, relationship types and
+        suppressed values of the filter, stored in the files compiled from
+        the relationships it keeps"""
+
+        return ';'.join(','.join(values) for values in \
+                        (self.sources, self.relationTypes, self.suppressed))
+
+    # Checks whether a relationship is kept
+    def accepts(self, sab, rel, suppress):
+        """Returns True if the filter keeps the relationship.
+
+        Input:
+            sab: The source vocabulary of the relationship
+            rel: The relationship type
+            suppress: The SUPPRESS value of the relationship
+        """
+
+        return sab in self.sources and rel in self.relationTypes and \
+            suppress not in self.suppressed
+
+    # Returns the query gathering the relationships of CUIs
+    def query(self, column=None, cuiList=()):
+        """Returns (query, parameters), the parameterized query gathering the
+        relationships kept by the filter whose column is one of the CUIs of
+        cuiList, or every relationship kept when column is None. The CUI
+        condition comes first so that the index of the column is used.
+
+        Input:
+            column: [Optional] 'CUI2' to look up parents, 'CUI1' children.
+            cuiList: [Optional] List of the CUIs to look up
+        """
+
+        conditions = []
+        parameters = []
+
+        if column is not None:
+            conditions.append(membershipCondition(column, cuiList))
+            parameters.extend(cuiList)
+
+        conditions.append(membershipCondition('SAB', self.sources))
+        parameters.extend(self.sources)
+        conditions.append(membershipCondition('REL', self.relationTypes))
+        parameters.extend(self.relationTypes)
+
+        if self.suppressed:
+            conditions.append(membershipCondition('SUPPRESS', \
+                                                  self.suppressed, True))
+            parameters.extend(self.suppressed)
+
+        return RELATIONQUERY.format(" AND ".join(conditions)), \
+            tuple(parameters)
+
+
+# Returns the SQL condition matching a column against a list of values
+def membershipCondition(column, values, negated=False):
+    """Returns the parameterized condition comparing the column to one value
+    with = (or <>), to several with IN (or NOT IN).
+
+    Input:
+        column: The name of the column
+        values: List of the values, passed as query parameters
+        negated: [Optional] True to match the rows holding none of the
+                 values.
+    """
+
+    if len(values) == 1:
+        return "{} {} %s".format(column, "<>" if negated else "=")
+
+    return "{} {}IN ({})".format(column, "NOT " if negated else "", \
+                                 ", ".join(["%s"] * len(values)))
+
+
+# Reads a relationship filter from the configuration
+def readRelationFilter(configs, prefix='relation'):
+    """Returns the relationFilter described by the <prefix>Sources,
+    <prefix>Types and <prefix>Suppressed configuration attributes, each a
+    comma separated list, using the FILTERDEFAULTS of the prefix for the
+    attributes not given. Exits if no source or relationship type is given.
+
+    Input:
+        configs: Dictionary containing the configuration attributes
+        prefix: [Optional] 'relation' for the relationships harvested by the
+                subset builder, 'connection' for those searched by
+                NodeConnectionFinder.py.
+    """
+
+    values = []
+    for suffix, default in zip(('Sources', 'Types', 'Suppressed'), \
+                               FILTERDEFAULTS[prefix]):
+        value = configs.get(prefix + suffix, default)
+        values.append([item.strip() for item in value.split(',') \
+                       if item.strip()])
+
+    sources, relationTypes, suppressed = values
+
+    if not sources or not relationTypes:
+        print "\nError: {0}Sources and {0}Types must name at least one " \
+            "source vocabulary and relationship type.".format(prefix)
+        sys.exit()
+
+    return relationFilter(sources, relationTypes, suppressed)
+
+
+# Opens the data source selected by the configuration
+def openDataSource(configs, relationSpec=None):
+    """Returns the data source selected by the dataSource configuration
+    attribute: an rrfSource when it is 'rrf', a snapshotSource backed by the
+    snapshotBackend data source for names when it is 'snapshot', a
+    mysqlSource otherwise.
+
+    Input:
+        configs: Dictionary containing the configuration attributes
+        relationSpec: [Optional] relationFilter selecting the relationships
+                      to look up. By default, the one read from the
+                      relationSources, relationTypes and relationSuppressed
+                      configuration attributes.
+    """
+
+    if relationSpec is None:
+        relationSpec = readRelationFilter(configs)
+
+    if configs.get('dataSource') == 'snapshot':
+        backendConfigs = dict(configs)
+        backendConfigs['dataSource'] = configs['snapshotBackend']
+        return snapshotSource(snapshotFileName(configs, relationSpec), \
+                configs['umlsRelease'], \
+                openDataSource(backendConfigs, relationSpec), relationSpec)
+
+    if configs.get('dataSource') == 'rrf':
+        return rrfSource(configs['rrfDirectory'], relationSpec)
+
+    return mysqlSource(configs, relationSpec)
+
+
+# Opens the data sources used by concurrent lookups
+def openConnectionPool(dataSource, configs, size):
+    """Returns a list of up to size data sources answering lookups like
+    dataSource: dataSource and size - 1 further connections to the database
+    when it is a mysqlSource, dataSource alone otherwise since the other data
+    sources answer from memory.
+
+    Input:
+        dataSource: The data source opened by openDataSource
+        configs: Dictionary containing the configuration attributes
+        size: Number of connections wanted
+    """
+
+    dataSources = [dataSource]
+
+    if isinstance(dataSource, mysqlSource):
+        while len(dataSources) < size:
+            dataSources.append(mysqlSource(configs, dataSource.relationSpec))
+
+    return dataSources
+
+
+class mysqlSource:
+    """Data source answering relationship and name lookups by querying a
+    MySQL UMLS database. When the cursorMode configuration attribute is
+    'streaming', the rows are read with a server-side cursor fetchSize rows
+    at a time while they are consumed, instead of being copied to the client
+    at once; the rows of a lookup must then be consumed before the next
+    lookup is made."""
+
+    # Initialize the data source with a connection to the database
+    def __init__(self, configs, relationSpec=None):
+        """Establishes a connection and cursor to the MySQL UMLS database.
+
+        Input:
+            configs: Dictionary containing the hostname, username, port,
+                     password and databasename configuration attributes, and
+                     optionally the cursorMode and fetchSize ones
+            relationSpec: [Optional] relationFilter selecting the
+                          relationships to look up. By default, the
+                          SNOMEDCT_US RN and CHD relationships that are not
+                          suppressed.
+        """
+
+        if MySQLdb is None:
+            print "\nError: MySQLdb is required to query a MySQL UMLS " \
+                "database. Install python-mysqldb or use dataSource=rrf."
+            sys.exit()
+
+        # Connect to MySQL server
+        try:
+            self.cnx = MySQLdb.connect (host=configs['hostname'], \
+                    user=configs['username'], port=int(configs['port']), \
+                    passwd=configs['password'], db=configs['databasename'])
+
+        # Catch errors from MySQL
+        except MySQLdb.Error, e:
+            try:
+                # Prints the error
+                print "MySQL Error [{}]: {}".format(e.args[0], e.args[1])
+
+            except IndexError:
+                # Prints the 1 argument error
+                print "MySQL Error: {}".format(str(e))
+
+            sys.exit()
+
+        # Establish cursor for queries, unbuffered when streaming
+        self.streaming = configs.get('cursorMode') == 'streaming'
+        self.fetchSize = int(configs.get('fetchSize', DEFAULTFETCHSIZE))
+        if self.streaming:
+            self.cursor = self.cnx.cursor(MySQLdb.cursors.SSCursor)
+        else:
+            self.cursor = self.cnx.cursor()
+        if relationSpec is None:
+            relationSpec = readRelationFilter(dict())
+        self.relationSpec = relationSpec
+        self.queryCount = 0
+
+    # Returns the relationships to the parents of the CUIs
+    def parentRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        parents of the CUIs in cuiList. A single CUI is looked up with
+        CUI2 = %s, several with CUI2 IN (...).
+
+        Input:
+            cuiList: List of the child CUIs
+        """
+
+        query, parameters = self.relationSpec.query('CUI2', cuiList)
+        self.execute(query, cuiList[0], parameters)
+
+        return self.rows()
+
+    # Returns the relationships to the children of the CUIs
+    def childRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        children of the CUIs in cuiList. A single CUI is looked up with
+        CUI1 = %s, several with CUI1 IN (...).
+
+        Input:
+            cuiList: List of the parent CUIs
+        """
+
+        query, parameters = self.relationSpec.query('CUI1', cuiList)
+        self.execute(query, cuiList[0], parameters)
+
+        return self.rows()
+
+    # Returns every relationship kept by the relationship filter
+    def allRelations(self):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows of every
+        relationship kept by the relationship filter."""
+
+        query, parameters = self.relationSpec.query()
+        self.execute(query, self.relationSpec.name(), parameters)
+
+        return self.rows()
+
+    # Returns the names of a CUI
+    def conceptNames(self, cui):
+        """Returns the (TTY, STR, LAT) rows describing the names of a CUI.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        self.execute(NAMEQUERY, cui, (cui,))
+
+        # determinePreferred stops at the preferred term, so the few names of
+        # a CUI are always read at once
+        return list(self.rows())
+
+    # Returns the names of a chunk of CUIs
+    def conceptNamesBatch(self, cuiList):
+        """Returns a dictionary holding the (TTY, STR, LAT) rows describing
+        the names of each CUI in cuiList, in row order.
+
+        Input:
+            cuiList: List of the CUIs to look up
+        """
+
+        self.execute(BATCHNAMEQUERY.format(membershipCondition('CUI', \
+                                        cuiList)), cuiList[0], tuple(cuiList))
+
+        rowsByCui = defaultdict(list)
+        for cui, tty, string, language in self.rows():
+            rowsByCui[cui].append((tty, string, language))
+
+        return rowsByCui
+
+    # Returns the rows of the last query
+    def rows(self):
+        """Returns the rows of the last query executed, either fetched at
+        once or, when streaming, as an iterator fetching fetchSize rows at a
+        time from the server."""
+
+        if not self.streaming:
+            return self.cursor.fetchall()
+
+        return self.streamRows()
+
+    # Yields the rows of the last query, fetchSize rows at a time
+    def streamRows(self):
+        """Yields the rows of the last query executed, fetching fetchSize
+        rows at a time from the server-side cursor."""
+
+        while True:
+            rows = self.cursor.fetchmany(self.fetchSize)
+            if not rows:
+                break
+
+            for row in rows:
+                yield row
+
+    # Executes a query, exiting with an error message on failure
+    def execute(self, query, cui, parameters):
+        """Executes the query, printing the MySQL error and exiting on
+        failure.
+
+        Input:
+            query: String containing the query to execute, with a %s
+                   placeholder for each parameter
+            cui: The CUI being queried, used in the error message
+            parameters: Tuple of the values of the placeholders, escaped by
+                        the driver
+        """
+
+        try:
+            self.cursor.execute(query, parameters)
+
+        # Catch errors from MySQL
+        except MySQLdb.Error, e:
+            try:
+                # Prints the error
+                print "MySQL Error [{}]: {} --- while querying {}".format(\
+                                                e.args[0], e.args[1], cui)
+
+            except IndexError:
+                # Prints the 1 argument error
+                print "MySQL Error: {} --- while querying {}".format(str(e),\
+                                                                    cui)
+
+            sys.exit()
+
+        self.queryCount += 1
+
+    # Close the cursor and connection
+    def close(self):
+        """Closes the cursor and the connection to the database"""
+
+        self.cursor.close()
+        self.cnx.close()
+
+
+class rrfSource:
+    """Data source answering relationship and name lookups from in-memory
+    indexes built by streaming the MRREL.RRF and MRCONSO.RRF files of a UMLS
+    release. Each file is only read the first time it is needed, and
+    MRREL.RRF once more the first time children are looked up."""
+
+    # Initialize the data source with the directory holding the RRF files
+    def __init__(self, directory, relationSpec=None):
+        """Initialize the data source.
+
+        Input:
+            directory: String naming the directory containing MRREL.RRF and
+                       MRCONSO.RRF (usually the META directory of a release)
+            relationSpec: [Optional] relationFilter selecting the
+                          relationships to look up. By default, the
+                          SNOMEDCT_US RN and CHD relationships that are not
+                          suppressed.
+        """
+
+        self.directory = directory
+        if relationSpec is None:
+            relationSpec = readRelationFilter(dict())
+        self.relationSpec = relationSpec
+        self.queryCount = 0
+        self.parentIndex = None
+        self.childIndex = None
+        self.nameIndex = None
+
+    # Returns the relationships to the parents of the CUIs
+    def parentRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        parents of the CUIs in cuiList, in file order for each CUI.
+
+        Input:
+            cuiList: List of the child CUIs
+        """
+
+        if self.parentIndex is None:
+            self.loadRelations()
+
+        self.queryCount += 1
+
+        rows = []
+        for cui in cuiList:
+            rows.extend(self.parentIndex.get(cui, ()))
+
+        return rows
+
+    # Returns the relationships to the children of the CUIs
+    def childRelations(self, cuiList):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows describing the
+        children of the CUIs in cuiList, in file order for each CUI.
+
+        Input:
+            cuiList: List of the parent CUIs
+        """
+
+        if self.childIndex is None:
+            self.loadChildren()
+
+        self.queryCount += 1
+
+        rows = []
+        for cui in cuiList:
+            rows.extend(self.childIndex.get(cui, ()))
+
+        return rows
+
+    # Returns every relationship kept by the relationship filter
+    def allRelations(self):
+        """Returns the (CUI1, REL, CUI2, SAB, SUPPRESS) rows of every
+        relationship kept by the relationship filter."""
+
+        if self.parentIndex is None:
+            self.loadRelations()
+
+        self.queryCount += 1
+
+        rows = []
+        for childRows in self.parentIndex.values():
+            rows.extend(childRows)
+
+        return rows
+
+    # Returns the names of a CUI
+    def conceptNames(self, cui):
+        """Returns the (TTY, STR, LAT) rows describing the names of a CUI.
+
+        Input:
+            cui: The CUI to look up
+        """
+
+        if self.nameIndex is None:
+            self.loadNames()
+
+        self.queryCount += 1
+
+        return self.nameIndex.get(cui, ())
+
+    # Returns the names of a chunk of CUIs
+    def conceptNamesBatch(self, cuiList):
+        """Returns a dictionary holding the (TTY, STR, LAT) rows describing
+        the names of each CUI in cuiList.
+
+        Input:
+            cuiList: List of the CUIs to look up
+        """
+
+        if self.nameIndex is None:
+            self.loadNames()
+
+        self.queryCount += 1
+
+        return dict((cui, self.nameIndex[cui]) for cui in cuiList \
+                    if cui in self.nameIndex)
+
+    # Builds the index of parent relationships from MRREL.RRF
+    def loadRelations(self):
+        """Streams MRREL.RRF, keeping the rows kept by the relationship filter
+        indexed by child CUI (CUI2)."""
+
+        index = defaultdict(list)
+
+        for row in self.relationRows():
+            index[row[2]].append(row)
+
+        self.parentIndex = dict(index)
+
+    # Builds the index of child relationships from MRREL.RRF
+    def loadChildren(self):
+        """Streams MRREL.RRF, keeping the rows kept by the relationship filter
+        indexed by parent CUI (CUI1)."""
+
+        index = defaultdict(list)
+
+        for row in self.relationRows():
+            index[row[0]].append(row)
+
+        self.childIndex = dict(index)
+
+    # Streams the relationships kept by the relationship filter from MRREL.RRF
+    def relationRows(self):
+        """Yields the (CUI1, REL, CUI2, SAB, SUPPRESS) row of every
+        relationship of MRREL.RRF kept by the relationship filter, in file
+        order."""
+
+        accepts = self.relationSpec.accepts
+
+        for fields in readRRF(os.path.join(self.directory, 'MRREL.RRF')):
+            if not accepts(fields[MRREL_SAB], fields[MRREL_REL], \
+                           fields[MRREL_SUPPRESS]):
+                continue
+
+            yield (intern(fields[MRREL_CUI1]), intern(fields[MRREL_REL]), \
+                   intern(fields[MRREL_CUI2]), intern(fields[MRREL_SAB]), \
+                   intern(fields[MRREL_SUPPRESS]))
+
+    # Builds the index of concept names from MRCONSO.RRF
+    def loadNames(self):
+        """Streams MRCONSO.RRF, keeping for each CUI only the rows that can
+        decide its preferred term: the first row with a TTY of 'PT' and the
+        first English row before it, in file order."""
+
+        index = dict()
+
+        for fields in readRRF(os.path.join(self.directory, 'MRCONSO.RRF')):
+            cui = fields[MRCONSO_CUI]
+            tty = fields[MRCONSO_TTY]
+            language = fields[MRCONSO_LAT]
+            rows = index.get(cui)
+
+            if rows is None:
+                rows = index[intern(cui)] = []
+
+            # Nothing after the preferred term changes the chosen name
+            elif rows and rows[-1][0] == 'PT':
+                continue
+
+            if tty == 'PT' or (language == 'ENG' and \
+                    not any(row[2] == 'ENG' for row in rows)):
+                rows.append((intern(tty), fields[MRCONSO_STR], \
+                             intern(language)))
+
+        self.nameIndex = index
+
+    # Releases the indexes
+    def close(self):
+        """Releases the in-memory indexes"""
+
+        self.parentIndex = None
+        self.childIndex = None
+        self.nameIndex = None
+
+
+# Streams the rows of an RRF file
+def readRRF(filename):
+    """Yields the list of fields of each row of a '|' delimited RRF file.
+
+    Input:
+        filename: String naming the RRF file to read
+    """
+
+    try:
+        rrfFile = open(filename, 'r')
+    except IOError:
+        print "\nAn Error occurred while trying to open {}".format(filename)
+        sys.exit()
+
+    for line in rrfFile:
+        yield line.rstrip('\n').split('|')
+
+    rrfFile.close()